@@ -0,0 +1,217 @@
+import math
+from datetime import datetime, timezone
+from sqlalchemy.exc import IntegrityError
+from .. import db
+from ..models import Attendance, Employee
+from ..versioning import bump_table_versions
+
+DEFAULT_MAX_RECORDS = 5000
+
+TRANSACTION_TYPES = ('Income', 'Expense', 'Transfer')
+ATTENDANCE_STATUSES = ('Present', 'Absent', 'Late', 'Half-day')
+
+class BulkConflict(Exception):
+    """A concurrent write claimed a key the batch was about to insert"""
+
+    def __init__(self, errors):
+        super().__init__('Records conflict with rows written concurrently')
+        self.errors = errors
+
+class RecordErrors:
+    """Collects validation errors for a single record"""
+
+    def __init__(self, record):
+        self.record = record
+        self.errors = []
+
+    def required(self, name):
+        value = self.record.get(name)
+        if value in (None, ''):
+            self.errors.append(f'{name} is required')
+        return value
+
+    def string(self, name, required=False):
+        value = self.required(name) if required else self.record.get(name)
+        if value in (None, ''):
+            return None
+        if not isinstance(value, str):
+            self.errors.append(f'{name} must be a string')
+            return None
+        return value
+
+    def date(self, name, required=False):
+        value = self.required(name) if required else self.record.get(name)
+        if value in (None, ''):
+            return None
+        try:
+            return datetime.strptime(value, '%Y-%m-%d').date()
+        except (TypeError, ValueError):
+            self.errors.append(f'{name} must be formatted as YYYY-MM-DD')
+
+    def datetime(self, name):
+        value = self.record.get(name)
+        if value in (None, ''):
+            return None
+        try:
+            value = datetime.fromisoformat(value)
+        except (TypeError, ValueError):
+            self.errors.append(f'{name} must be an ISO 8601 timestamp')
+            return None
+        # Timestamps are stored as naive UTC
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+
+    def number(self, name, required=False):
+        value = self.required(name) if required else self.record.get(name)
+        if value in (None, ''):
+            return None
+        try:
+            # bool is an int subclass; true is not an amount
+            if isinstance(value, bool):
+                raise TypeError(value)
+            value = float(value)
+        except (TypeError, ValueError):
+            self.errors.append(f'{name} must be a number')
+            return None
+        if not math.isfinite(value):
+            self.errors.append(f'{name} must be a finite number')
+            return None
+        return value
+
+    def integer(self, name, required=False):
+        value = self.number(name, required=required)
+        if value is None:
+            return None
+        if not value.is_integer():
+            self.errors.append(f'{name} must be a whole number')
+            return None
+        return int(value)
+
+    def choice(self, name, choices, default=None):
+        value = self.record.get(name) or default
+        if value not in choices:
+            self.errors.append(f'{name} must be one of {", ".join(choices)}')
+        return value
+
+def validate_transaction(record, user_id):
+    """Validate one financial transaction record"""
+    check = RecordErrors(record)
+    row = {
+        'transaction_date': check.date('transaction_date', required=True),
+        'amount': check.number('amount', required=True),
+        'transaction_type': check.choice('transaction_type', TRANSACTION_TYPES),
+        'category': check.string('category', required=True),
+        'description': check.string('description'),
+        'reference_number': check.string('reference_number'),
+        'created_by_id': user_id,
+    }
+    return row, check.errors
+
+def validate_attendance(record, user_id):
+    """Validate one attendance record"""
+    check = RecordErrors(record)
+    row = {
+        'employee_id': check.integer('employee_id', required=True),
+        'date': check.date('date', required=True),
+        'check_in': check.datetime('check_in'),
+        'check_out': check.datetime('check_out'),
+        'status': check.choice('status', ATTENDANCE_STATUSES, default='Present'),
+        'notes': check.string('notes'),
+    }
+    if row['check_in'] and row['check_out'] and row['check_out'] < row['check_in']:
+        check.errors.append('check_out is before check_in')
+    return row, check.errors
+
+def validate_resource(record, user_id):
+    """Validate one resource record"""
+    check = RecordErrors(record)
+    quantity = check.integer('quantity', required=True)
+    status = 'Available'
+    if quantity is not None:
+        if quantity <= 0:
+            status = 'Out of Stock'
+        elif quantity < 5:
+            status = 'Low Stock'
+    row = {
+        'name': check.string('name', required=True),
+        'category': check.string('category'),
+        'quantity': quantity,
+        'status': status,
+        'purchase_date': check.date('purchase_date'),
+        'purchase_cost': check.number('purchase_cost'),
+        'supplier': check.string('supplier'),
+        'notes': check.string('notes'),
+    }
+    return row, check.errors
+
+def check_attendance_keys(rows, errors):
+    """Reject attendance rows for unknown employees or already-recorded days"""
+    candidates = [i for i, row in enumerate(rows) if not errors[i]]
+    employee_ids = {rows[i]['employee_id'] for i in candidates}
+    if not employee_ids:
+        return
+
+    known = set(db.session.scalars(
+        db.select(Employee.id).where(Employee.id.in_(employee_ids))
+    ))
+    dates = {rows[i]['date'] for i in candidates}
+    recorded = set(db.session.execute(
+        db.select(Attendance.employee_id, Attendance.date).where(
+            Attendance.employee_id.in_(employee_ids),
+            Attendance.date.between(min(dates), max(dates))
+        )
+    ).tuples())
+
+    seen = set()
+    for i in candidates:
+        key = (rows[i]['employee_id'], rows[i]['date'])
+        if key[0] not in known:
+            errors[i].append('employee_id does not exist')
+        elif key in recorded or key in seen:
+            errors[i].append('attendance already recorded for this day')
+        seen.add(key)
+
+def bulk_insert(model, records, validate, user_id, atomic=False, check_keys=None,
+                on_insert=None):
+    """Validate a batch of records and insert the valid ones in one statement.
+
+    Returns (inserted, errors) where errors lists the offending records by
+    index. With atomic set nothing is written if any record is invalid.
+    on_insert(connection, rows) runs in the same transaction, standing in for
+    the flush listeners a Core insert bypasses. Raises BulkConflict, with
+    nothing written, when a concurrent write takes a key first.
+    """
+    rows, errors = [], []
+    for record in records:
+        if not isinstance(record, dict):
+            rows.append(None)
+            errors.append(['record must be an object'])
+            continue
+        row, row_errors = validate(record, user_id)
+        rows.append(row)
+        errors.append(row_errors)
+
+    if check_keys:
+        check_keys(rows, errors)
+
+    report = [{'index': i, 'errors': e} for i, e in enumerate(errors) if e]
+    valid = [row for row, e in zip(rows, errors) if not e]
+    if not valid or (atomic and report):
+        return 0, report
+
+    # One executemany / insertmanyvalues round trip for the whole batch
+    try:
+        db.session.execute(db.insert(model), valid)
+        bump_table_versions(db.session.connection(), [model.__tablename__])
+        if on_insert:
+            on_insert(db.session.connection(), valid)
+        db.session.commit()
+    except IntegrityError:
+        # Another request inserted a key between the check and the insert;
+        # checking again now names the records that lost the race
+        db.session.rollback()
+        if check_keys:
+            check_keys(rows, errors)
+        raise BulkConflict([{'index': i, 'errors': e} for i, e in enumerate(errors) if e])
+    return len(valid), report
@@ -0,0 +1,82 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+from flask import Response, current_app, request
+from flask_login import current_user
+from ..versioning import get_table_versions
+
+DEFAULT_CACHE_SIZE = 256
+
+class ResponseCache:
+    """Small thread-safe LRU of serialized JSON payloads"""
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+            return body
+
+    def set(self, key, body, max_entries):
+        with self._lock:
+            self._entries[key] = body
+            self._entries.move_to_end(key)
+            while len(self._entries) > max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+response_cache = ResponseCache()
+
+def role_scope():
+    """Cache scope for responses that only depend on the caller's role"""
+    return current_user.role.value
+
+def versioned_response(*tables, scope=role_scope):
+    """Decorator adding ETag handling and a version-keyed cache to a JSON view.
+
+    The fingerprint is the write counter of every table the view reads, so an
+    unchanged poll costs one lookup on table_versions: a matching
+    If-None-Match gets a 304, anything else is served from the cache.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            versions = get_table_versions(tables)
+            fingerprint = '|'.join(
+                [request.full_path, scope()] +
+                [f'{name}:{versions[name][0]}' for name in sorted(tables)]
+            )
+            etag = hashlib.sha1(fingerprint.encode()).hexdigest()
+            modified = [ts for _, ts in versions.values() if ts is not None]
+            last_modified = max(modified) if modified else None
+
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+            else:
+                body = response_cache.get(etag)
+                if body is not None:
+                    response = Response(body, mimetype='application/json')
+                else:
+                    response = current_app.make_response(f(*args, **kwargs))
+                    # Only complete, successful payloads are worth keeping
+                    if response.status_code == 200 and not response.is_streamed:
+                        max_entries = current_app.config.get('API_CACHE_SIZE', DEFAULT_CACHE_SIZE)
+                        response_cache.set(etag, response.get_data(), max_entries)
+
+            if response.status_code in (200, 304):
+                response.set_etag(etag)
+                if last_modified:
+                    response.last_modified = last_modified
+                response.cache_control.private = True
+                response.cache_control.no_cache = True
+            return response
+        return decorated_function
+    return decorator
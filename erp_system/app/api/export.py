@@ -0,0 +1,57 @@
+import csv
+import io
+import json
+from datetime import datetime
+from flask import Response, current_app, request, stream_with_context
+from .. import db
+
+EXPORT_MIMETYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+def get_date_arg(name):
+    """Parse an optional YYYY-MM-DD query parameter"""
+    value = request.args.get(name)
+    return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+
+def _json_value(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if hasattr(value, 'value'):
+        return value.value
+    return value
+
+def stream_export(statement, fmt, filename):
+    """Stream the rows of a Core select as CSV or NDJSON.
+
+    Rows come from a server-side cursor in yield_per sized batches as plain
+    tuples, so no ORM objects or identity-map entries are created and memory
+    stays bounded by the batch size whatever the row count.
+    """
+    chunk_size = current_app.config.get('API_STREAM_CHUNK_SIZE', 1000)
+    result = db.session.execute(statement.execution_options(yield_per=chunk_size))
+    columns = list(result.keys())
+
+    def generate_csv():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        for partition in result.partitions():
+            writer.writerows(partition)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+
+    def generate_ndjson():
+        for partition in result.partitions():
+            yield ''.join(
+                json.dumps({k: _json_value(v) for k, v in zip(columns, row)}) + '\n'
+                for row in partition
+            )
+
+    generate = generate_csv if fmt == 'csv' else generate_ndjson
+    response = Response(stream_with_context(generate()), mimetype=EXPORT_MIMETYPES[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}.{fmt}'
+    return response
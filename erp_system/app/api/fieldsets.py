@@ -0,0 +1,74 @@
+import enum
+from datetime import date, datetime
+from flask import request
+
+class Field:
+    """A field of a sparse fieldset, projected from one or more columns.
+
+    Fields spanning several columns (full names, pay periods) are combined
+    in Python so the projected output matches the full serializers exactly.
+    joins lists the (target, onclause) outer joins the columns need.
+    """
+
+    def __init__(self, *columns, combine=None, joins=()):
+        self.columns = columns
+        self.combine = combine
+        self.joins = joins
+
+    def labels(self, name):
+        return [f'{name}__{i}' for i in range(len(self.columns))]
+
+def format_value(value):
+    """Format a raw column value the way the API serializers do"""
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, date):
+        return value.strftime('%Y-%m-%d')
+    if isinstance(value, enum.Enum):
+        return value.value
+    return value
+
+def get_fields(fieldset):
+    """Return the field names requested with fields=, or None for all fields"""
+    value = request.args.get('fields')
+    if not value:
+        return None
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in names if name not in fieldset]
+    if unknown or not names:
+        raise ValueError(f'Unknown fields: {", ".join(unknown)}')
+    return names
+
+def project(query, fieldset, names, extra_columns=()):
+    """Turn an entity query into a column-only query for the given fields.
+
+    extra_columns (keyset and tombstone columns) are selected under their own
+    key so pagination can read them off the returned rows.
+    """
+    joined = set()
+    entities = []
+    for name in names:
+        field = fieldset[name]
+        for target, onclause in field.joins:
+            if target not in joined:
+                query = query.outerjoin(target, onclause)
+                joined.add(target)
+        entities.extend(column.label(label) for column, label in zip(field.columns, field.labels(name)))
+
+    seen = set()
+    for column in extra_columns:
+        if column.key not in seen:
+            entities.append(column.label(column.key))
+            seen.add(column.key)
+    return query.with_entities(*entities)
+
+def row_serializer(fieldset, names):
+    """Serializer for rows produced by project()"""
+    def serialize(row):
+        data = {}
+        for name in names:
+            field = fieldset[name]
+            values = [getattr(row, label) for label in field.labels(name)]
+            data[name] = format_value(field.combine(*values) if field.combine else values[0])
+        return data
+    return serialize
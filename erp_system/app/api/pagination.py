@@ -0,0 +1,162 @@
+import base64
+import json
+from datetime import date, datetime, timezone
+from flask import Response, current_app, jsonify, request, stream_with_context
+from sqlalchemy import Date, DateTime, tuple_
+from .fieldsets import get_fields, project, row_serializer
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+STREAM_CHUNK_SIZE = 1000
+
+def encode_cursor(values):
+    """Encode the key values of the last row into an opaque cursor"""
+    raw = json.dumps([v.isoformat() if isinstance(v, (date, datetime)) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor, key_columns):
+    """Decode a cursor back into typed key values for the given columns"""
+    values = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    if not isinstance(values, list) or len(values) != len(key_columns):
+        raise ValueError('Cursor does not match the collection key')
+
+    decoded = []
+    for column, value in zip(key_columns, values):
+        if isinstance(column.type, DateTime):
+            value = datetime.fromisoformat(value)
+        elif isinstance(column.type, Date):
+            value = date.fromisoformat(value)
+        decoded.append(value)
+    return decoded
+
+def get_page_size():
+    """Read the requested page size, clamped to the configured maximum"""
+    default = current_app.config.get('API_PAGE_SIZE', DEFAULT_PAGE_SIZE)
+    maximum = current_app.config.get('API_MAX_PAGE_SIZE', MAX_PAGE_SIZE)
+    limit = request.args.get('limit', default, type=int)
+    return max(1, min(limit, maximum))
+
+def wants_stream():
+    """Check whether the client asked for a streamed response"""
+    return request.args.get('stream', '').lower() in ('1', 'true', 'yes')
+
+def get_updated_since():
+    """Parse the updated_since parameter into a naive UTC datetime"""
+    value = request.args.get('updated_since')
+    if not value:
+        return None
+    since = datetime.fromisoformat(value)
+    if since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    return since
+
+def delta_serializer(serialize, tombstone=None):
+    """Wrap a serializer for delta sync: stamp updated_at and emit tombstones.
+
+    tombstone is a (column, predicate) pair; the predicate is called with the
+    column's value for the entity or projected row.
+    """
+    def serialize_delta(item):
+        if tombstone is not None and tombstone[1](getattr(item, tombstone[0].key)):
+            data = {'id': item.id, 'deleted': True}
+        else:
+            data = serialize(item)
+        data['updated_at'] = item.updated_at.isoformat()
+        return data
+    return serialize_delta
+
+def _key_values(item, key_columns):
+    return [getattr(item, column.key) for column in key_columns]
+
+def keyset_page(query, key_columns, limit, cursor=None, descending=False):
+    """Fetch one page of a query ordered by key_columns, starting after cursor"""
+    if cursor:
+        values = decode_cursor(cursor, key_columns)
+        if len(key_columns) == 1:
+            key, value = key_columns[0], values[0]
+        else:
+            key, value = tuple_(*key_columns), tuple_(*values)
+        query = query.filter(key < value if descending else key > value)
+
+    # Fetch one extra row to know whether another page exists
+    order = [column.desc() for column in key_columns] if descending else key_columns
+    items = query.order_by(*order).limit(limit + 1).all()
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor(_key_values(items[-1], key_columns))
+    return items, next_cursor
+
+def stream_json(collection, query, key_columns, serialize):
+    """Stream a query as a JSON document using a server-side cursor"""
+    chunk_size = current_app.config.get('API_STREAM_CHUNK_SIZE', STREAM_CHUNK_SIZE)
+    rows = query.order_by(*key_columns).yield_per(chunk_size)
+
+    def generate():
+        yield '{"%s": [' % collection
+        buffer = []
+        first = True
+        for item in rows:
+            buffer.append(json.dumps(serialize(item), default=str))
+            if len(buffer) >= chunk_size:
+                yield ('' if first else ',') + ','.join(buffer)
+                buffer = []
+                first = False
+        if buffer:
+            yield ('' if first else ',') + ','.join(buffer)
+        yield ']}'
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+def list_response(collection, query, key_columns, serialize, tombstone=None,
+                  options=(), fieldset=None):
+    """Build a paginated or streamed JSON response for a collection query.
+
+    With updated_since only rows changed after that time are returned,
+    ordered by (updated_at, id) so a sync can resume from its cursor. Rows
+    matching tombstone are reduced to their id and a deleted flag.
+
+    With fields= and a fieldset the query is projected to just those columns
+    and returns plain rows; otherwise full entities are loaded with options.
+    """
+    try:
+        since = get_updated_since()
+    except ValueError:
+        return jsonify({'error': 'Invalid updated_since timestamp'}), 400
+
+    model = query.column_descriptions[0]['entity']
+    if since is not None:
+        query = query.filter(model.updated_at > since)
+        key_columns = [model.updated_at, model.id]
+
+    try:
+        names = get_fields(fieldset) if fieldset else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if names:
+        extra_columns = list(key_columns)
+        if since is not None and tombstone is not None:
+            extra_columns.append(tombstone[0])
+        query = project(query, fieldset, names, extra_columns)
+        serialize = row_serializer(fieldset, names)
+    else:
+        query = query.options(*options)
+
+    if since is not None:
+        serialize = delta_serializer(serialize, tombstone)
+
+    if wants_stream():
+        return stream_json(collection, query, key_columns, serialize)
+
+    try:
+        items, next_cursor = keyset_page(
+            query, key_columns, get_page_size(), request.args.get('cursor')
+        )
+    except (ValueError, TypeError):
+        return jsonify({'error': 'Invalid cursor'}), 400
+
+    return jsonify({
+        collection: [serialize(item) for item in items],
+        'next_cursor': next_cursor
+    })
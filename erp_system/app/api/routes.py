@@ -1,11 +1,21 @@
-from flask import jsonify, request
+from flask import current_app, jsonify, request
 from flask_login import login_required, current_user
+from sqlalchemy.orm import aliased
 from functools import wraps
 from . import api_bp
 from .. import db
+from .bulk import (DEFAULT_MAX_RECORDS, BulkConflict, bulk_insert, check_attendance_keys,
+                   validate_attendance, validate_resource, validate_transaction)
+from .cache import versioned_response
+from .export import EXPORT_MIMETYPES, get_date_arg, stream_export
+from .fieldsets import Field
+from .pagination import list_response
+from ..employee.summary import summarize_rows
+from ..finance.rollup import rollup_rows
 from ..models import (User, UserRole, Employee, Department, Attendance, 
                      PerformanceReview, Payroll, Resource, ResourceAllocation,
-                     Workflow, LeaveRequest, ExpenseClaim, FinancialTransaction)
+                     Workflow, WorkflowStatus, LeaveRequest, ExpenseClaim, TravelRequest,
+                     FinancialTransaction, loader_profile, PolymorphicWorkflow)
 
 def admin_required(f):
     """Decorator to require admin privileges"""
@@ -16,26 +26,200 @@ def admin_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def payroll_scope():
+    """Cache scope for payroll: privileged roles share, others see their own"""
+    if current_user.role in [UserRole.ADMIN, UserRole.FINANCE, UserRole.HR]:
+        return current_user.role.value
+    return f'user:{current_user.id}'
+
+def workflow_scope():
+    """Cache scope for workflows: privileged roles share, others see their own"""
+    if current_user.role in [UserRole.ADMIN, UserRole.MANAGER, UserRole.HR]:
+        return current_user.role.value
+    return f'user:{current_user.id}'
+
+# Serializers shared by the paginated and streamed list responses
+def serialize_user(user):
+    return {
+        'id': user.id,
+        'username': user.username,
+        'email': user.email,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'role': user.role.value,
+        'is_active': user.is_active
+    }
+
+def serialize_employee(emp):
+    return {
+        'id': emp.id,
+        'user_id': emp.user_id,
+        'name': f"{emp.user.first_name} {emp.user.last_name}",
+        'department': emp.department.name if emp.department else None,
+        'position': emp.position,
+        'hire_date': emp.hire_date.strftime('%Y-%m-%d') if emp.hire_date else None,
+        'status': emp.employment_status
+    }
+
+def serialize_payroll(payroll):
+    return {
+        'id': payroll.id,
+        'employee': f"{payroll.user.first_name} {payroll.user.last_name}",
+        'period': f"{payroll.pay_period_start.strftime('%Y-%m-%d')} to {payroll.pay_period_end.strftime('%Y-%m-%d')}",
+        'base_salary': payroll.base_salary,
+        'overtime': payroll.overtime_pay,
+        'bonus': payroll.bonus,
+        'deductions': payroll.tax_deduction + payroll.insurance_deduction + payroll.other_deductions,
+        'net_pay': payroll.net_pay,
+        'status': payroll.payment_status
+    }
+
+def serialize_resource(resource):
+    return {
+        'id': resource.id,
+        'name': resource.name,
+        'category': resource.category,
+        'quantity': resource.quantity,
+        'status': resource.status
+    }
+
+def workflow_details(workflow):
+    """The columns specific to a workflow's type"""
+    if isinstance(workflow, LeaveRequest):
+        return {
+            'leave_type': workflow.leave_type,
+            'start_date': workflow.start_date.isoformat() if workflow.start_date else None,
+            'end_date': workflow.end_date.isoformat() if workflow.end_date else None,
+        }
+    if isinstance(workflow, ExpenseClaim):
+        return {
+            'amount': workflow.amount,
+            'category': workflow.category,
+            'expense_date': workflow.expense_date.isoformat() if workflow.expense_date else None,
+            'reimbursed': workflow.reimbursed,
+        }
+    if isinstance(workflow, TravelRequest):
+        return {
+            'destination': workflow.destination,
+            'start_date': workflow.start_date.isoformat() if workflow.start_date else None,
+            'end_date': workflow.end_date.isoformat() if workflow.end_date else None,
+            'estimated_cost': workflow.estimated_cost,
+        }
+    return {}
+
+def serialize_workflow(workflow):
+    return {
+        'id': workflow.id,
+        'type': workflow.workflow_type.value,
+        'title': workflow.title,
+        'requester': f"{workflow.requester.first_name} {workflow.requester.last_name}",
+        'assignee': f"{workflow.assigned_to.first_name} {workflow.assigned_to.last_name}" if workflow.assigned_to else None,
+        'status': workflow.status.value,
+        'created_at': workflow.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+        'current_step': workflow.current_step,
+        'details': workflow_details(workflow)
+    }
+
+def serialize_transaction(tx):
+    return {
+        'id': tx.id,
+        'date': tx.transaction_date.strftime('%Y-%m-%d'),
+        'amount': tx.amount,
+        'type': tx.transaction_type,
+        'category': tx.category,
+        'description': tx.description,
+        'reference': tx.reference_number,
+        'created_by': f"{tx.created_by.first_name} {tx.created_by.last_name}"
+    }
+
+# Sparse fieldsets: the same fields as the serializers, projected from columns
+def full_name(first_name, last_name):
+    return f"{first_name} {last_name}" if first_name is not None else None
+
+def pay_period(start, end):
+    return f"{start.strftime('%Y-%m-%d')} to {end.strftime('%Y-%m-%d')}"
+
+Requester = aliased(User)
+Assignee = aliased(User)
+
+USER_FIELDS = {
+    'id': Field(User.id),
+    'username': Field(User.username),
+    'email': Field(User.email),
+    'first_name': Field(User.first_name),
+    'last_name': Field(User.last_name),
+    'role': Field(User.role),
+    'is_active': Field(User.is_active),
+}
+
+EMPLOYEE_FIELDS = {
+    'id': Field(Employee.id),
+    'user_id': Field(Employee.user_id),
+    'name': Field(User.first_name, User.last_name, combine=full_name,
+                  joins=[(User, User.id == Employee.user_id)]),
+    'department': Field(Department.name,
+                        joins=[(Department, Department.id == Employee.department_id)]),
+    'position': Field(Employee.position),
+    'hire_date': Field(Employee.hire_date),
+    'status': Field(Employee.employment_status),
+}
+
+PAYROLL_FIELDS = {
+    'id': Field(Payroll.id),
+    'employee': Field(User.first_name, User.last_name, combine=full_name,
+                      joins=[(User, User.id == Payroll.user_id)]),
+    'period': Field(Payroll.pay_period_start, Payroll.pay_period_end, combine=pay_period),
+    'base_salary': Field(Payroll.base_salary),
+    'overtime': Field(Payroll.overtime_pay),
+    'bonus': Field(Payroll.bonus),
+    'deductions': Field(Payroll.tax_deduction, Payroll.insurance_deduction,
+                        Payroll.other_deductions, combine=lambda *d: sum(d)),
+    'net_pay': Field(Payroll.net_pay),
+    'status': Field(Payroll.payment_status),
+}
+
+RESOURCE_FIELDS = {
+    'id': Field(Resource.id),
+    'name': Field(Resource.name),
+    'category': Field(Resource.category),
+    'quantity': Field(Resource.quantity),
+    'status': Field(Resource.status),
+}
+
+WORKFLOW_FIELDS = {
+    'id': Field(Workflow.id),
+    'type': Field(Workflow.workflow_type),
+    'title': Field(Workflow.title),
+    'requester': Field(Requester.first_name, Requester.last_name, combine=full_name,
+                       joins=[(Requester, Requester.id == Workflow.requester_id)]),
+    'assignee': Field(Assignee.first_name, Assignee.last_name, combine=full_name,
+                      joins=[(Assignee, Assignee.id == Workflow.assignee_id)]),
+    'status': Field(Workflow.status),
+    'created_at': Field(Workflow.created_at),
+}
+
+TRANSACTION_FIELDS = {
+    'id': Field(FinancialTransaction.id),
+    'date': Field(FinancialTransaction.transaction_date),
+    'amount': Field(FinancialTransaction.amount),
+    'type': Field(FinancialTransaction.transaction_type),
+    'category': Field(FinancialTransaction.category),
+    'description': Field(FinancialTransaction.description),
+    'reference': Field(FinancialTransaction.reference_number),
+    'created_by': Field(User.first_name, User.last_name, combine=full_name,
+                        joins=[(User, User.id == FinancialTransaction.created_by_id)]),
+}
+
 # User API endpoints
 @api_bp.route('/users', methods=['GET'])
 @login_required
 @admin_required
+@versioned_response('users')
 def get_users():
     """Get all users"""
-    users = User.query.all()
-    return jsonify({
-        'users': [
-            {
-                'id': user.id,
-                'username': user.username,
-                'email': user.email,
-                'first_name': user.first_name,
-                'last_name': user.last_name,
-                'role': user.role.value,
-                'is_active': user.is_active
-            } for user in users
-        ]
-    })
+    return list_response('users', User.query, [User.id], serialize_user,
+                         tombstone=(User.is_active, lambda active: not active),
+                         fieldset=USER_FIELDS)
 
 @api_bp.route('/users/<int:user_id>', methods=['GET'])
 @login_required
@@ -46,41 +230,23 @@ def get_user(user_id):
         return jsonify({'error': 'Permission denied'}), 403
         
     user = User.query.get_or_404(user_id)
-    return jsonify({
-        'id': user.id,
-        'username': user.username,
-        'email': user.email,
-        'first_name': user.first_name,
-        'last_name': user.last_name,
-        'role': user.role.value,
-        'is_active': user.is_active
-    })
+    return jsonify(serialize_user(user))
 
 # Employee API endpoints
 @api_bp.route('/employees', methods=['GET'])
 @login_required
+@versioned_response('employees', 'users', 'departments')
 def get_employees():
     """Get all employees"""
-    employees = Employee.query.all()
-    return jsonify({
-        'employees': [
-            {
-                'id': emp.id,
-                'user_id': emp.user_id,
-                'name': f"{emp.user.first_name} {emp.user.last_name}",
-                'department': emp.department.name if emp.department else None,
-                'position': emp.position,
-                'hire_date': emp.hire_date.strftime('%Y-%m-%d') if emp.hire_date else None,
-                'status': emp.employment_status
-            } for emp in employees
-        ]
-    })
+    return list_response('employees', Employee.query, [Employee.id], serialize_employee,
+                         options=loader_profile('employee_list'),
+                         fieldset=EMPLOYEE_FIELDS)
 
 @api_bp.route('/employees/<int:employee_id>', methods=['GET'])
 @login_required
 def get_employee(employee_id):
     """Get specific employee"""
-    emp = Employee.query.get_or_404(employee_id)
+    emp = Employee.query.options(*loader_profile('employee_detail')).get_or_404(employee_id)
     
     # Check permissions
     if (current_user.id != emp.user_id and 
@@ -103,76 +269,47 @@ def get_employee(employee_id):
 # Payroll API endpoints
 @api_bp.route('/payroll', methods=['GET'])
 @login_required
+@versioned_response('payrolls', 'users', scope=payroll_scope)
 def get_payroll():
     """Get payroll records"""
     # Check permissions
     if current_user.role not in [UserRole.ADMIN, UserRole.FINANCE, UserRole.HR]:
         # Users can only see their own payroll
-        payrolls = Payroll.query.filter_by(user_id=current_user.id).all()
+        payrolls = Payroll.query.filter_by(user_id=current_user.id)
     else:
-        payrolls = Payroll.query.all()
+        payrolls = Payroll.query
     
-    return jsonify({
-        'payrolls': [
-            {
-                'id': payroll.id,
-                'employee': f"{payroll.user.first_name} {payroll.user.last_name}",
-                'period': f"{payroll.pay_period_start.strftime('%Y-%m-%d')} to {payroll.pay_period_end.strftime('%Y-%m-%d')}",
-                'base_salary': payroll.base_salary,
-                'overtime': payroll.overtime_pay,
-                'bonus': payroll.bonus,
-                'deductions': payroll.tax_deduction + payroll.insurance_deduction + payroll.other_deductions,
-                'net_pay': payroll.net_pay,
-                'status': payroll.payment_status
-            } for payroll in payrolls
-        ]
-    })
+    return list_response('payrolls', payrolls, [Payroll.id], serialize_payroll,
+                         options=loader_profile('payroll'),
+                         fieldset=PAYROLL_FIELDS)
 
 # Resources API endpoints
 @api_bp.route('/resources', methods=['GET'])
 @login_required
+@versioned_response('resources')
 def get_resources():
     """Get all resources"""
-    resources = Resource.query.all()
-    return jsonify({
-        'resources': [
-            {
-                'id': resource.id,
-                'name': resource.name,
-                'category': resource.category,
-                'quantity': resource.quantity,
-                'status': resource.status
-            } for resource in resources
-        ]
-    })
+    return list_response('resources', Resource.query, [Resource.id], serialize_resource,
+                         fieldset=RESOURCE_FIELDS)
 
 # Workflow API endpoints
 @api_bp.route('/workflows', methods=['GET'])
 @login_required
+@versioned_response('workflows', 'users', scope=workflow_scope)
 def get_workflows():
     """Get workflows"""
     # Users can see workflows they requested or are assigned to them
+    workflows = db.session.query(PolymorphicWorkflow)
     if current_user.role not in [UserRole.ADMIN, UserRole.MANAGER, UserRole.HR]:
-        workflows = Workflow.query.filter(
+        workflows = workflows.filter(
             (Workflow.requester_id == current_user.id) | 
             (Workflow.assignee_id == current_user.id)
-        ).all()
-    else:
-        workflows = Workflow.query.all()
+        )
     
-    return jsonify({
-        'workflows': [
-            {
-                'id': workflow.id,
-                'type': workflow.workflow_type.value,
-                'title': workflow.title,
-                'requester': f"{workflow.requester.first_name} {workflow.requester.last_name}",
-                'assignee': f"{workflow.assigned_to.first_name} {workflow.assigned_to.last_name}" if workflow.assigned_to else None,
-                'status': workflow.status.value,
-                'created_at': workflow.created_at.strftime('%Y-%m-%d %H:%M:%S')
-            } for workflow in workflows
-        ]
-    })
+    return list_response('workflows', workflows, [Workflow.id], serialize_workflow,
+                         tombstone=(Workflow.status, lambda status: status == WorkflowStatus.CANCELLED),
+                         options=loader_profile('workflow'),
+                         fieldset=WORKFLOW_FIELDS)
 
 # Financial API endpoints
 @api_bp.route('/finance/transactions', methods=['GET'])
@@ -183,18 +320,134 @@ def get_transactions():
     if current_user.role not in [UserRole.ADMIN, UserRole.FINANCE]:
         return jsonify({'error': 'Permission denied'}), 403
         
-    transactions = FinancialTransaction.query.all()
+    return list_response(
+        'transactions',
+        FinancialTransaction.query,
+        [FinancialTransaction.transaction_date, FinancialTransaction.id],
+        serialize_transaction,
+        options=loader_profile('transaction'),
+        fieldset=TRANSACTION_FIELDS
+    )
+
+@api_bp.route('/finance/transactions/export', methods=['GET'])
+@login_required
+def export_transactions():
+    """Stream financial transactions as CSV or NDJSON"""
+    if current_user.role not in [UserRole.ADMIN, UserRole.FINANCE]:
+        return jsonify({'error': 'Permission denied'}), 403
+    
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_MIMETYPES:
+        return jsonify({'error': 'Unsupported export format'}), 400
+    try:
+        start_date = get_date_arg('start_date')
+        end_date = get_date_arg('end_date')
+    except ValueError:
+        return jsonify({'error': 'Dates must be formatted as YYYY-MM-DD'}), 400
+    
+    tx = FinancialTransaction
+    statement = db.select(
+        tx.id, tx.transaction_date, tx.amount, tx.transaction_type, tx.category,
+        tx.description, tx.reference_number, tx.created_by_id,
+        User.username.label('created_by')
+    ).outerjoin(User, User.id == tx.created_by_id)
+    
+    if start_date:
+        statement = statement.where(tx.transaction_date >= start_date)
+    if end_date:
+        statement = statement.where(tx.transaction_date <= end_date)
+    if request.args.get('category'):
+        statement = statement.where(tx.category == request.args.get('category'))
+    
+    statement = statement.order_by(tx.transaction_date, tx.id)
+    return stream_export(statement, fmt, 'transactions')
+
+@api_bp.route('/payroll/export', methods=['GET'])
+@login_required
+def export_payroll():
+    """Stream payroll records as CSV or NDJSON"""
+    if current_user.role not in [UserRole.ADMIN, UserRole.FINANCE, UserRole.HR]:
+        return jsonify({'error': 'Permission denied'}), 403
+    
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_MIMETYPES:
+        return jsonify({'error': 'Unsupported export format'}), 400
+    try:
+        start_date = get_date_arg('start_date')
+        end_date = get_date_arg('end_date')
+    except ValueError:
+        return jsonify({'error': 'Dates must be formatted as YYYY-MM-DD'}), 400
+    
+    statement = db.select(
+        Payroll.id, Payroll.user_id, User.first_name, User.last_name,
+        Payroll.pay_period_start, Payroll.pay_period_end, Payroll.base_salary,
+        Payroll.overtime_pay, Payroll.bonus, Payroll.tax_deduction,
+        Payroll.insurance_deduction, Payroll.other_deductions, Payroll.net_pay,
+        Payroll.payment_status, Payroll.payment_date
+    ).outerjoin(User, User.id == Payroll.user_id)
+    
+    # A pay run belongs to the range its period ends in
+    if start_date:
+        statement = statement.where(Payroll.pay_period_end >= start_date)
+    if end_date:
+        statement = statement.where(Payroll.pay_period_end <= end_date)
+    
+    statement = statement.order_by(Payroll.pay_period_end, Payroll.id)
+    return stream_export(statement, fmt, 'payroll')
+
+# Bulk write API endpoints
+def _bulk_response(model, validate, check_keys=None, on_insert=None):
+    """Run a bulk insert for the JSON batch in the request body"""
+    payload = request.get_json(silent=True)
+    records = payload.get('records') if isinstance(payload, dict) else payload
+    if not isinstance(records, list) or not records:
+        return jsonify({'error': 'Request body must contain a non-empty list of records'}), 400
+    
+    max_records = current_app.config.get('API_BULK_MAX_RECORDS', DEFAULT_MAX_RECORDS)
+    if len(records) > max_records:
+        return jsonify({'error': f'Batches are limited to {max_records} records'}), 413
+    
+    atomic = request.args.get('atomic', '').lower() in ('1', 'true', 'yes')
+    try:
+        inserted, errors = bulk_insert(model, records, validate, current_user.id,
+                                       atomic=atomic, check_keys=check_keys,
+                                       on_insert=on_insert)
+    except BulkConflict as conflict:
+        return jsonify({
+            'success': False,
+            'received': len(records),
+            'inserted': 0,
+            'error': 'Records conflict with rows written concurrently; nothing was inserted',
+            'errors': conflict.errors
+        }), 409
     return jsonify({
-        'transactions': [
-            {
-                'id': tx.id,
-                'date': tx.transaction_date.strftime('%Y-%m-%d'),
-                'amount': tx.amount,
-                'type': tx.transaction_type,
-                'category': tx.category,
-                'description': tx.description,
-                'reference': tx.reference_number,
-                'created_by': f"{tx.created_by.first_name} {tx.created_by.last_name}"
-            } for tx in transactions
-        ]
-    })
\ No newline at end of file
+        'success': not errors,
+        'received': len(records),
+        'inserted': inserted,
+        'errors': errors
+    }), 422 if errors and not inserted else 200
+
+@api_bp.route('/bulk/transactions', methods=['POST'])
+@login_required
+def bulk_transactions():
+    """Insert a batch of financial transactions"""
+    if current_user.role not in [UserRole.ADMIN, UserRole.FINANCE]:
+        return jsonify({'error': 'Permission denied'}), 403
+    return _bulk_response(FinancialTransaction, validate_transaction, on_insert=rollup_rows)
+
+@api_bp.route('/bulk/attendance', methods=['POST'])
+@login_required
+def bulk_attendance():
+    """Insert a batch of attendance records"""
+    if current_user.role not in [UserRole.ADMIN, UserRole.HR]:
+        return jsonify({'error': 'Permission denied'}), 403
+    return _bulk_response(Attendance, validate_attendance, check_keys=check_attendance_keys,
+                          on_insert=summarize_rows)
+
+@api_bp.route('/bulk/resources', methods=['POST'])
+@login_required
+def bulk_resources():
+    """Insert a batch of resources"""
+    if current_user.role not in [UserRole.ADMIN, UserRole.MANAGER]:
+        return jsonify({'error': 'Permission denied'}), 403
+    return _bulk_response(Resource, validate_resource)
@@ -0,0 +1,81 @@
+from datetime import date
+import click
+from flask import current_app
+from . import employee_bp
+from .. import db
+from ..models import Attendance, AttendanceArchive
+
+ARCHIVE_COLUMNS = ['id', 'employee_id', 'date', 'check_in', 'check_out', 'status',
+                   'notes', 'created_at', 'updated_at']
+
+def month_start(day, months_back=0):
+    """First day of the month months_back months before day's month"""
+    month = day.year * 12 + day.month - 1 - months_back
+    return date(month // 12, month % 12 + 1, 1)
+
+def retention_cutoff(months=None, today=None):
+    """First day kept in the live table, by default under ATTENDANCE_RETENTION_MONTHS"""
+    if months is None:
+        months = current_app.config.get('ATTENDANCE_RETENTION_MONTHS', 12)
+    return month_start(today or date.today(), months)
+
+def archived_through():
+    """Latest archived day, or None while the archive is empty"""
+    return db.session.scalar(db.select(db.func.max(AttendanceArchive.date)))
+
+def hours_worked(attendance, dialect_name):
+    """SQL expression for the hours between check-in and check-out"""
+    if dialect_name == 'postgresql':
+        return db.func.extract('epoch', attendance.c.check_out - attendance.c.check_in) / 3600.0
+    return (db.func.julianday(attendance.c.check_out) - db.func.julianday(attendance.c.check_in)) * 24.0
+
+def attendance_source(start_date, end_date):
+    """Selectable over the attendance rows between start_date and end_date.
+
+    The archive is only read when the range reaches back to archived days,
+    so queries on recent dates never touch it. Either way the result has
+    the columns of the attendance table, filtered to the range.
+    """
+    def in_range(table):
+        return db.select(*[table.c[name] for name in ARCHIVE_COLUMNS]).where(
+            table.c.date >= start_date, table.c.date <= end_date
+        )
+
+    live = in_range(Attendance.__table__)
+    last_archived = archived_through()
+    if last_archived is None or start_date > last_archived:
+        return live.subquery('attendance')
+    return db.union_all(live, in_range(AttendanceArchive.__table__)).subquery('attendance')
+
+def archive_attendance(cutoff):
+    """Move live attendance rows dated before cutoff into the archive.
+
+    Rows move one month per transaction, so a large backlog never holds a
+    long lock and an interrupted run resumes where it stopped. Returns the
+    number of rows moved.
+    """
+    live = Attendance.__table__
+    archive = AttendanceArchive.__table__
+    moved = 0
+
+    oldest = db.session.scalar(db.select(db.func.min(live.c.date)).where(live.c.date < cutoff))
+    start = month_start(oldest) if oldest else cutoff
+    while start < cutoff:
+        end = min(month_start(start, -1), cutoff)
+        month = db.and_(live.c.date >= start, live.c.date < end)
+        db.session.execute(archive.insert().from_select(
+            ARCHIVE_COLUMNS,
+            db.select(*[live.c[name] for name in ARCHIVE_COLUMNS]).where(month)
+        ))
+        moved += db.session.execute(live.delete().where(month)).rowcount
+        db.session.commit()
+        start = end
+    return moved
+
+@employee_bp.cli.command('archive-attendance')
+@click.option('--months', type=int, help='Months to keep in the live table')
+def archive_attendance_command(months):
+    """Move attendance older than the retention window into the archive"""
+    cutoff = retention_cutoff(months)
+    moved = archive_attendance(cutoff)
+    click.echo(f'Archived {moved} attendance rows dated before {cutoff.isoformat()}')
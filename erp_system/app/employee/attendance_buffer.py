@@ -0,0 +1,282 @@
+import atexit
+import glob
+import json
+import os
+import threading
+from datetime import date, datetime
+from flask import current_app
+from .. import db
+from ..models import Attendance
+from ..upsert import insert_on_conflict
+from .summary import refresh_summaries
+
+DURABILITY_MODES = ('memory', 'journal', 'commit')
+
+_buffer_lock = threading.Lock()
+
+def upsert_attendance(rows, chunk_size=1000):
+    """Write check-in/check-out rows with INSERT ... ON CONFLICT on
+    (employee_id, date) and commit.
+
+    An existing check-in is never overwritten, so the first one of the day
+    wins; a check-out replaces any earlier one.
+    """
+    table = Attendance.__table__
+    statement = insert_on_conflict(db.session.connection(), table)
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.employee_id, table.c.date],
+        set_={
+            'check_in': db.func.coalesce(table.c.check_in, statement.excluded.check_in),
+            'check_out': db.func.coalesce(statement.excluded.check_out, table.c.check_out),
+            'status': db.case(
+                (statement.excluded.check_in.isnot(None), 'Present'), else_=table.c.status
+            ),
+            'updated_at': statement.excluded.updated_at,
+        }
+    )
+
+    now = datetime.utcnow()
+    params = [
+        {
+            'employee_id': employee_id,
+            'date': day,
+            'check_in': times['check_in'],
+            'check_out': times['check_out'],
+            'status': 'Present',
+            'created_at': now,
+            'updated_at': now,
+        } for (employee_id, day), times in rows.items()
+    ]
+    for start in range(0, len(params), chunk_size):
+        db.session.execute(statement, params[start:start + chunk_size])
+    refresh_summaries(db.session.connection(), rows.keys())
+    db.session.commit()
+
+def _merge(rows, employee_id, day, check_in, check_out):
+    """Fold an event into rows keeping the earliest check-in and latest check-out"""
+    times = rows.setdefault((employee_id, day), {'check_in': None, 'check_out': None})
+    if check_in and (times['check_in'] is None or check_in < times['check_in']):
+        times['check_in'] = check_in
+    if check_out and (times['check_out'] is None or check_out > times['check_out']):
+        times['check_out'] = check_out
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError:
+        return False
+    return True
+
+class AttendanceBuffer:
+    """In-process queue of check-in/check-out events flushed in batches.
+
+    A background thread upserts the queue every ATTENDANCE_FLUSH_INTERVAL
+    seconds, or sooner once ATTENDANCE_FLUSH_BATCH distinct employee-days
+    are waiting. ATTENDANCE_DURABILITY decides when an event is acknowledged:
+
+    - memory: once queued; events still queued when the process dies are lost
+    - journal: once appended and fsynced to a per-process journal file, which
+      is replayed at startup if the process died before flushing it
+    - commit: once the batch holding it is committed; concurrent requests
+      still share a single transaction
+    """
+
+    def __init__(self, app):
+        config = app.config
+        self.app = app
+        self.interval = config.get('ATTENDANCE_FLUSH_INTERVAL', 1.0)
+        self.batch_size = config.get('ATTENDANCE_FLUSH_BATCH', 1000)
+        self.durability = config.get('ATTENDANCE_DURABILITY', 'journal')
+        if self.durability not in DURABILITY_MODES:
+            raise ValueError(f'ATTENDANCE_DURABILITY must be one of {", ".join(DURABILITY_MODES)}')
+
+        self._pending = {}
+        self._waiters = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._wake = threading.Event()
+
+        self._journal = None
+        self._journal_files = []
+        # Journal lines written and known to be on disk, for group fsync
+        self._written = 0
+        self._synced = 0
+        if self.durability == 'journal':
+            self._journal_base = (config.get('ATTENDANCE_JOURNAL_PATH') or
+                                  os.path.join(app.instance_path, 'attendance.journal'))
+            self._journal_seq = 0
+            self._replay_journals()
+            self._open_journal()
+
+        threading.Thread(target=self._run, daemon=True, name='attendance-flush').start()
+        atexit.register(self.flush)
+
+    def record(self, employee_id, day, check_in=None, check_out=None):
+        """Queue a check-in or check-out and return once it is acknowledged"""
+        waiter = None
+        written = None
+        with self._lock:
+            if self._journal:
+                self._journal.write(json.dumps({
+                    'employee_id': employee_id,
+                    'date': day.isoformat(),
+                    'check_in': check_in.isoformat() if check_in else None,
+                    'check_out': check_out.isoformat() if check_out else None,
+                }) + '\n')
+                self._journal.flush()
+                self._written += 1
+                written = self._written
+            _merge(self._pending, employee_id, day, check_in, check_out)
+            if len(self._pending) >= self.batch_size:
+                self._wake.set()
+            if self.durability == 'commit':
+                waiter = {'done': threading.Event(), 'error': None}
+                self._waiters.append(waiter)
+
+        if written:
+            self._sync_journal(written)
+
+        if waiter:
+            # Hand the request's connection back to the pool while waiting, or a
+            # burst of waiting requests would starve the flush of connections
+            db.session.close()
+            waiter['done'].wait()
+            if waiter['error']:
+                raise RuntimeError(f"Attendance could not be saved: {waiter['error']}")
+
+    def pending_check_in(self, employee_id, day):
+        """Return the queued check-in time of an employee-day, if any"""
+        with self._lock:
+            times = self._pending.get((employee_id, day))
+            return times['check_in'] if times else None
+
+    def flush(self):
+        """Upsert everything queued so far; returns the number of rows written"""
+        with self._flush_lock:
+            with self._lock:
+                rows, self._pending = self._pending, {}
+                waiters, self._waiters = self._waiters, []
+                if self._journal and rows:
+                    self._rotate_journal()
+                journal_files = list(self._journal_files)
+
+            error = None
+            if rows:
+                try:
+                    with self.app.app_context():
+                        upsert_attendance(rows, self.batch_size)
+                except Exception as e:
+                    self.app.logger.exception('Attendance flush of %s rows failed', len(rows))
+                    error = str(e)
+
+            if error and self.durability != 'commit':
+                # Keep the events for the next flush; their journals stay on disk
+                with self._lock:
+                    for (employee_id, day), times in rows.items():
+                        _merge(self._pending, employee_id, day, times['check_in'], times['check_out'])
+            else:
+                for path in journal_files:
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                    self._journal_files.remove(path)
+
+            for waiter in waiters:
+                waiter['error'] = error
+                waiter['done'].set()
+            return 0 if error else len(rows)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                # Keep the thread alive; the events stay queued for the next try
+                self.app.logger.exception('Attendance flush failed')
+
+    def _journal_path(self):
+        return f'{self._journal_base}.{os.getpid()}'
+
+    def _sync_journal(self, written):
+        """fsync the journal up to line number written, outside the queue lock.
+
+        Records arriving while an fsync runs wait for the next one, which
+        covers all of them at once.
+        """
+        with self._sync_lock:
+            if self._synced >= written:
+                return
+            # Every line counted in _written has been flushed to the file
+            target = self._written
+            os.fsync(self._journal.fileno())
+            self._synced = target
+
+    def _open_journal(self):
+        self._journal = open(self._journal_path(), 'a')
+
+    def _rotate_journal(self):
+        """Move the live journal aside so it can be deleted once its rows commit"""
+        with self._sync_lock:
+            os.fsync(self._journal.fileno())
+            self._journal.close()
+            self._synced = self._written
+        self._journal_seq += 1
+        rotated = f'{self._journal_path()}.{self._journal_seq}'
+        os.replace(self._journal_path(), rotated)
+        self._journal_files.append(rotated)
+        self._open_journal()
+
+    def _claim_journal(self, path):
+        """Take a dead process's journal by renaming it under this pid.
+
+        The rename is atomic, so when several processes start together each
+        journal is replayed by exactly one of them; the others find it gone.
+        Returns the new path, or None if another process claimed it first.
+        """
+        claimed = f'{self._journal_path()}.replay.{self._journal_seq}'
+        while os.path.exists(claimed):
+            self._journal_seq += 1
+            claimed = f'{self._journal_path()}.replay.{self._journal_seq}'
+        self._journal_seq += 1
+        try:
+            os.rename(path, claimed)
+        except FileNotFoundError:
+            return None
+        return claimed
+
+    def _replay_journals(self):
+        """Queue the events of journals left behind by processes that died"""
+        for path in sorted(glob.glob(f'{glob.escape(self._journal_base)}.*')):
+            pid = path[len(self._journal_base) + 1:].split('.')[0]
+            if not pid.isdigit() or (int(pid) != os.getpid() and _pid_alive(int(pid))):
+                continue
+            path = self._claim_journal(path)
+            if path is None:
+                continue
+            with open(path) as journal:
+                for line in journal:
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        # A torn final line was never acknowledged
+                        continue
+                    _merge(
+                        self._pending,
+                        event['employee_id'],
+                        date.fromisoformat(event['date']),
+                        datetime.fromisoformat(event['check_in']) if event['check_in'] else None,
+                        datetime.fromisoformat(event['check_out']) if event['check_out'] else None
+                    )
+            self._journal_files.append(path)
+
+def get_attendance_buffer():
+    """The attendance buffer of the current app, started on first use"""
+    app = current_app._get_current_object()
+    with _buffer_lock:
+        if 'attendance_buffer' not in app.extensions:
+            app.extensions['attendance_buffer'] = AttendanceBuffer(app)
+        return app.extensions['attendance_buffer']
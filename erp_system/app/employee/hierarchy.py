@@ -0,0 +1,172 @@
+import click
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, aliased
+from . import employee_bp
+from .. import db
+from ..models import Department, Employee, EmployeeHierarchy, User
+
+# Guards the rebuild against a manager cycle already present in the data
+MAX_DEPTH = 100
+
+def add_employees(connection, employee_ids):
+    """Add the self rows of employees new to the tree"""
+    if employee_ids:
+        connection.execute(db.insert(EmployeeHierarchy.__table__), [
+            {'ancestor_id': employee_id, 'descendant_id': employee_id, 'depth': 0}
+            for employee_id in employee_ids
+        ])
+
+def move_subtree(connection, employee_id, manager_id):
+    """Re-attach an employee and everyone below them under manager_id.
+
+    manager_id None makes the employee a root. Raises ValueError if the new
+    manager reports to the employee.
+    """
+    table = EmployeeHierarchy.__table__
+    if manager_id is not None and connection.scalar(
+        db.select(table.c.depth).where(table.c.ancestor_id == employee_id,
+                                       table.c.descendant_id == manager_id)
+    ) is not None:
+        raise ValueError(f'Employee {manager_id} reports to employee {employee_id}; '
+                         'making them their manager would create a cycle')
+
+    # Cut the subtree loose from its current ancestors
+    subtree = table.alias('subtree')
+    members = db.select(subtree.c.descendant_id).where(subtree.c.ancestor_id == employee_id)
+    connection.execute(db.delete(table).where(
+        table.c.descendant_id.in_(members),
+        table.c.ancestor_id.notin_(members)
+    ))
+
+    # Link every ancestor of the new manager to every member of the subtree
+    if manager_id is not None:
+        above = table.alias('above')
+        below = table.alias('below')
+        connection.execute(db.insert(table).from_select(
+            ['ancestor_id', 'descendant_id', 'depth'],
+            db.select(above.c.ancestor_id, below.c.descendant_id, above.c.depth + below.c.depth + 1)
+            .select_from(above.join(below, below.c.ancestor_id == employee_id))
+            .where(above.c.descendant_id == manager_id)
+        ))
+
+def remove_employee(connection, employee_id):
+    """Drop an employee from the tree; their reports become roots"""
+    table = EmployeeHierarchy.__table__
+    move_subtree(connection, employee_id, None)
+    connection.execute(db.delete(table).where(
+        db.or_(table.c.ancestor_id == employee_id, table.c.descendant_id == employee_id)
+    ))
+
+def rebuild_hierarchy():
+    """Recompute the closure table from employees.manager_id"""
+    child = aliased(Employee)
+    tree = db.select(
+        Employee.id.label('ancestor_id'),
+        Employee.id.label('descendant_id'),
+        db.literal(0).label('depth')
+    ).cte('tree', recursive=True)
+    tree = tree.union_all(
+        db.select(tree.c.ancestor_id, child.id, tree.c.depth + 1)
+        .where(child.manager_id == tree.c.descendant_id, tree.c.depth < MAX_DEPTH)
+    )
+
+    db.session.execute(db.delete(EmployeeHierarchy))
+    db.session.execute(
+        db.insert(EmployeeHierarchy).from_select(
+            ['ancestor_id', 'descendant_id', 'depth'],
+            db.select(tree.c.ancestor_id, tree.c.descendant_id, tree.c.depth)
+        )
+    )
+    db.session.commit()
+
+@event.listens_for(Session, 'after_flush')
+def _maintain_hierarchy(session, flush_context):
+    """Apply inserted, re-managed and deleted employees to the closure table"""
+    new = [obj for obj in session.new if isinstance(obj, Employee)]
+    moved = [obj for obj in session.dirty if isinstance(obj, Employee) and
+             inspect(obj).attrs.manager_id.history.has_changes()]
+    deleted = [obj for obj in session.deleted if isinstance(obj, Employee)]
+    if not (new or moved or deleted):
+        return
+
+    connection = session.connection()
+    add_employees(connection, [employee.id for employee in new])
+    for employee in new:
+        if employee.manager_id is not None:
+            move_subtree(connection, employee.id, employee.manager_id)
+    for employee in moved:
+        move_subtree(connection, employee.id, employee.manager_id)
+    for employee in deleted:
+        remove_employee(connection, employee.id)
+
+def management_chain(employee_id):
+    """The managers above an employee, nearest first, in one query"""
+    return db.session.execute(
+        db.select(
+            EmployeeHierarchy.ancestor_id.label('employee_id'),
+            EmployeeHierarchy.depth,
+            User.first_name,
+            User.last_name,
+            Employee.position
+        ).join(
+            Employee, Employee.id == EmployeeHierarchy.ancestor_id
+        ).outerjoin(
+            User, User.id == Employee.user_id
+        ).where(
+            EmployeeHierarchy.descendant_id == employee_id,
+            EmployeeHierarchy.depth > 0
+        ).order_by(EmployeeHierarchy.depth)
+    ).all()
+
+def reports_query(employee_id, max_depth=None):
+    """Query the reports below an employee as rows keyed by (depth, descendant_id)"""
+    query = db.session.query(
+        EmployeeHierarchy.depth,
+        EmployeeHierarchy.descendant_id,
+        Employee.manager_id,
+        Employee.position,
+        User.first_name,
+        User.last_name,
+        Department.name.label('department')
+    ).join(
+        Employee, Employee.id == EmployeeHierarchy.descendant_id
+    ).outerjoin(
+        User, User.id == Employee.user_id
+    ).outerjoin(
+        Department, Department.id == Employee.department_id
+    ).filter(
+        EmployeeHierarchy.ancestor_id == employee_id,
+        EmployeeHierarchy.depth > 0
+    )
+    if max_depth is not None:
+        query = query.filter(EmployeeHierarchy.depth <= max_depth)
+    return query
+
+def span_of_control(employee_id):
+    """Direct and total report counts and the depth of the tree below an employee"""
+    direct, total, levels = db.session.execute(
+        db.select(
+            db.func.sum(db.case((EmployeeHierarchy.depth == 1, 1), else_=0)),
+            db.func.count(),
+            db.func.max(EmployeeHierarchy.depth)
+        ).where(
+            EmployeeHierarchy.ancestor_id == employee_id,
+            EmployeeHierarchy.depth > 0
+        )
+    ).one()
+    return {'direct_reports': direct or 0, 'total_reports': total, 'levels': levels or 0}
+
+def manages(manager_id, employee_id):
+    """Whether employee_id is manager_id or reports to them at any depth"""
+    return db.session.scalar(
+        db.select(EmployeeHierarchy.depth).where(
+            EmployeeHierarchy.ancestor_id == manager_id,
+            EmployeeHierarchy.descendant_id == employee_id
+        )
+    ) is not None
+
+@employee_bp.cli.command('rebuild-hierarchy')
+def rebuild_hierarchy_command():
+    """Recompute the employee hierarchy closure table"""
+    rebuild_hierarchy()
+    click.echo('Employee hierarchy rebuilt')
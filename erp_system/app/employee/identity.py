@@ -0,0 +1,98 @@
+import threading
+import time
+from collections import namedtuple
+from flask import current_app, g
+from flask_login import current_user
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, aliased
+from .. import db
+from ..models import Department, Employee
+from ..versioning import get_table_versions
+
+# What request handlers need to know about the employee behind a user
+EmployeeIdentity = namedtuple('EmployeeIdentity', [
+    'id', 'user_id', 'position', 'department_id', 'department', 'manager_id', 'manager_user_id'
+])
+
+CACHED_TABLES = ['employees', 'departments']
+
+class EmployeeResolver:
+    """Process-wide cache of user id -> EmployeeIdentity.
+
+    Changes committed in this process clear it straight away. Changes made
+    by other processes are noticed through the employees and departments
+    write counters, checked at most every EMPLOYEE_CACHE_CHECK_INTERVAL
+    seconds.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._versions = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def resolve(self, user_id):
+        self._revalidate()
+        with self._lock:
+            if user_id in self._entries:
+                return self._entries[user_id]
+
+        manager = aliased(Employee)
+        row = db.session.execute(
+            db.select(
+                Employee.id, Employee.user_id, Employee.position, Employee.department_id,
+                Department.name, Employee.manager_id, manager.user_id
+            ).outerjoin(
+                Department, Department.id == Employee.department_id
+            ).outerjoin(
+                manager, manager.id == Employee.manager_id
+            ).where(Employee.user_id == user_id)
+        ).first()
+        identity = EmployeeIdentity(*row) if row else None
+
+        with self._lock:
+            self._entries[user_id] = identity
+        return identity
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _revalidate(self):
+        now = time.monotonic()
+        interval = current_app.config.get('EMPLOYEE_CACHE_CHECK_INTERVAL', 5.0)
+        if self._checked_at is not None and now - self._checked_at < interval:
+            return
+
+        versions = get_table_versions(CACHED_TABLES)
+        versions = tuple(versions[name][0] for name in CACHED_TABLES)
+        with self._lock:
+            if versions != self._versions:
+                self._entries.clear()
+                self._versions = versions
+            self._checked_at = now
+
+employee_resolver = EmployeeResolver()
+
+def current_employee():
+    """The EmployeeIdentity of the logged-in user, or None without an employee record"""
+    if 'current_employee' not in g:
+        g.current_employee = employee_resolver.resolve(current_user.id)
+    return g.current_employee
+
+@event.listens_for(Session, 'after_flush')
+def _note_employee_changes(session, flush_context):
+    """Remember that this transaction wrote employees or departments"""
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if any(table.name in CACHED_TABLES for table in inspect(obj).mapper.tables):
+            session.info['employees_changed'] = True
+            return
+
+@event.listens_for(Session, 'after_commit')
+def _clear_on_commit(session):
+    if session.info.pop('employees_changed', False):
+        employee_resolver.clear()
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _forget_on_rollback(session, previous_transaction):
+    session.info.pop('employees_changed', None)
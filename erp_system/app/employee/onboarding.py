@@ -0,0 +1,316 @@
+import csv
+import io
+import json
+import multiprocessing
+import secrets
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import click
+from flask import current_app
+from werkzeug.security import generate_password_hash
+from . import employee_bp
+from .. import db
+from ..api.bulk import RecordErrors
+from ..models import Department, Employee, EmployeeHierarchy, User, UserRole
+from ..versioning import bump_table_versions
+from ..workflow.approvers import approver_index
+from .identity import employee_resolver
+
+ROLES = tuple(role.value for role in UserRole)
+EMPLOYMENT_STATUSES = ('Active', 'On Leave', 'Resigned')
+
+# Below this many passwords a process pool costs more than it saves
+POOL_MIN_PASSWORDS = 64
+
+def read_records(text, fmt):
+    """Parse an import file given as text into a list of dicts"""
+    if fmt == 'csv':
+        return [
+            {key.strip(): (value.strip() if isinstance(value, str) else value)
+             for key, value in row.items() if key}
+            for row in csv.DictReader(io.StringIO(text))
+        ]
+    records = json.loads(text)
+    if isinstance(records, dict):
+        records = records.get('records')
+    if not isinstance(records, list):
+        raise ValueError('JSON imports must be a list of records')
+    return records
+
+def assignable_roles(user):
+    """Roles a user may give to imported accounts; only admins create admins"""
+    if user.role == UserRole.ADMIN:
+        return ROLES
+    return tuple(role for role in ROLES if role != UserRole.ADMIN.value)
+
+def validate_onboarding(record, roles=ROLES):
+    """Validate one onboarding record, allowing only the given roles"""
+    check = RecordErrors(record)
+    # Text fields are checked to be strings before anything hashes them
+    email = check.string('email', required=True)
+    if email and '@' not in email:
+        check.errors.append('email is not a valid address')
+    row = {
+        'username': check.string('username', required=True),
+        'email': email,
+        'first_name': check.string('first_name', required=True),
+        'last_name': check.string('last_name', required=True),
+        'role': check.choice('role', ROLES, default=UserRole.EMPLOYEE.value),
+        'password': check.string('password'),
+        'department': check.string('department'),
+        'manager': check.string('manager'),
+        'position': check.string('position'),
+        'hire_date': check.date('hire_date'),
+        'salary': check.number('salary'),
+        'employment_status': check.choice('employment_status', EMPLOYMENT_STATUSES, default='Active'),
+    }
+    if row['role'] in ROLES and row['role'] not in roles:
+        check.errors.append(f"you may not assign the {row['role']} role")
+    return row, check.errors
+
+def _existing(column, values):
+    """The subset of values already present in a users column"""
+    found = set()
+    values = list(values)
+    for start in range(0, len(values), 1000):
+        found.update(db.session.scalars(db.select(column).where(column.in_(values[start:start + 1000]))))
+    return found
+
+def check_onboarding_keys(rows, errors):
+    """Reject duplicate or taken usernames and emails and unknown managers.
+
+    Managers may be named by username or email, either of someone in the
+    same import or of an existing employee. Returns the existing managers
+    as {reference: employee_id}.
+    """
+    candidates = [i for i, row in enumerate(rows) if row]
+    taken_usernames = _existing(User.username, {rows[i]['username'] for i in candidates} - {None})
+    taken_emails = _existing(User.email, {rows[i]['email'] for i in candidates} - {None})
+
+    usernames, emails = set(), set()
+    for i in candidates:
+        row = rows[i]
+        if row['username'] and (row['username'] in taken_usernames or row['username'] in usernames):
+            errors[i].append('username is already taken')
+        if row['email'] and (row['email'] in taken_emails or row['email'] in emails):
+            errors[i].append('email is already taken')
+        usernames.add(row['username'])
+        emails.add(row['email'])
+
+    batch = set()
+    for i in candidates:
+        if not errors[i]:
+            batch.update([rows[i]['username'], rows[i]['email']])
+    references = {rows[i]['manager'] for i in candidates if rows[i]['manager']} - batch
+    existing = {}
+    if references:
+        for username, email, employee_id in db.session.execute(
+            db.select(User.username, User.email, Employee.id)
+            .join(Employee, Employee.user_id == User.id)
+            .where(db.or_(User.username.in_(references), User.email.in_(references)))
+        ):
+            existing[username] = existing[email] = employee_id
+
+    for i in candidates:
+        manager = rows[i]['manager']
+        if manager and manager not in batch and manager not in existing:
+            errors[i].append(f'manager {manager} is not an employee or part of this import')
+    return existing
+
+def _manager_chains(rows, valid, existing_managers):
+    """Resolve the manager of each valid row to a row index or an existing
+    employee id, and find the rows whose chain within the import loops"""
+    index = {}
+    for i in valid:
+        index[rows[i]['username']] = index[rows[i]['email']] = i
+
+    parents = {}
+    for i in valid:
+        manager = rows[i]['manager']
+        if manager in index:
+            parents[i] = ('row', index[manager])
+        elif manager in existing_managers:
+            parents[i] = ('employee', existing_managers[manager])
+
+    cyclic = set()
+    for i in valid:
+        seen = set()
+        node = i
+        while parents.get(node, (None,))[0] == 'row':
+            if node in seen:
+                cyclic.update(seen)
+                break
+            seen.add(node)
+            node = parents[node][1]
+    return parents, cyclic
+
+def hash_passwords(passwords):
+    """Hash passwords, spread over a process pool when there are many"""
+    workers = current_app.config.get('ONBOARDING_HASH_WORKERS', 4)
+    if not workers or len(passwords) < POOL_MIN_PASSWORDS:
+        return [generate_password_hash(p) for p in passwords]
+    with ProcessPoolExecutor(max_workers=workers,
+                             mp_context=multiprocessing.get_context('spawn')) as pool:
+        return list(pool.map(generate_password_hash, passwords,
+                             chunksize=max(1, len(passwords) // (workers * 4))))
+
+def _insert_returning(table, params, key, chunk_size):
+    """Insert rows in chunks and map each row's key value to its new id"""
+    ids = {}
+    for start in range(0, len(params), chunk_size):
+        result = db.session.execute(
+            db.insert(table).returning(table.c.id, table.c[key], sort_by_parameter_order=True),
+            params[start:start + chunk_size]
+        )
+        ids.update({value: row_id for row_id, value in result})
+    return ids
+
+def _closure_rows(rows, employee_ids, parents):
+    """Closure table rows for the imported employees"""
+    existing = {ref for kind, ref in parents.values() if kind == 'employee'}
+    above = {}
+    for ancestor_id, descendant_id, depth in db.session.execute(
+        db.select(EmployeeHierarchy.ancestor_id, EmployeeHierarchy.descendant_id, EmployeeHierarchy.depth)
+        .where(EmployeeHierarchy.descendant_id.in_(existing))
+    ):
+        above.setdefault(descendant_id, []).append((ancestor_id, depth))
+
+    closure = []
+    for i, row in enumerate(rows):
+        employee_id = employee_ids[row['username']]
+        closure.append({'ancestor_id': employee_id, 'descendant_id': employee_id, 'depth': 0})
+        depth, node = 1, i
+        while node in parents:
+            kind, ref = parents[node]
+            if kind == 'row':
+                closure.append({'ancestor_id': employee_ids[rows[ref]['username']],
+                                'descendant_id': employee_id, 'depth': depth})
+                depth, node = depth + 1, ref
+            else:
+                closure.extend({'ancestor_id': ancestor_id, 'descendant_id': employee_id,
+                                'depth': depth + above_depth}
+                               for ancestor_id, above_depth in above.get(ref, []))
+                break
+    return closure
+
+def import_employees(records, dry_run=False, roles=ROLES):
+    """Validate onboarding records and, unless dry_run, create them in bulk.
+
+    Every record becomes a User and an Employee. Departments named in the
+    import are created if missing, and managers are linked in a second pass
+    once every employee has an id. The import is all-or-nothing: any invalid
+    record leaves the database untouched. A record asking for a role outside
+    roles is reported as invalid. Returns a report dict.
+    """
+    rows, errors = [], []
+    for record in records:
+        if not isinstance(record, dict):
+            rows.append(None)
+            errors.append(['record must be an object'])
+            continue
+        row, row_errors = validate_onboarding(record, roles)
+        rows.append(row)
+        errors.append(row_errors)
+
+    existing_managers = check_onboarding_keys(rows, errors)
+    valid = [i for i, row_errors in enumerate(errors) if not row_errors]
+    parents, cyclic = _manager_chains(rows, valid, existing_managers)
+    for i in sorted(cyclic):
+        errors[i].append('manager chain within the import forms a cycle')
+
+    departments = {row['department'] for row in rows if row and row['department']}
+    known_departments = dict(db.session.execute(
+        db.select(Department.name, Department.id).where(Department.name.in_(departments))
+    ).all())
+    report = {
+        'received': len(records),
+        'valid': sum(1 for e in errors if not e),
+        'departments_created': sorted(departments - set(known_departments)),
+        'errors': [{'index': i, 'errors': e} for i, e in enumerate(errors) if e],
+        'dry_run': dry_run,
+        'created': 0,
+    }
+    if dry_run or report['errors'] or not rows:
+        return report
+
+    chunk_size = current_app.config.get('ONBOARDING_CHUNK_SIZE', 1000)
+    now = datetime.utcnow()
+
+    generated = {}
+    for row in rows:
+        if not row['password']:
+            row['password'] = generated[row['username']] = secrets.token_urlsafe(12)
+    hashes = hash_passwords([row['password'] for row in rows])
+
+    new_departments = [{'name': name, 'created_at': now, 'updated_at': now}
+                       for name in report['departments_created']]
+    if new_departments:
+        known_departments.update(_insert_returning(Department.__table__, new_departments, 'name', chunk_size))
+
+    user_ids = _insert_returning(User.__table__, [
+        {
+            'username': row['username'],
+            'email': row['email'],
+            'password': password_hash,
+            'first_name': row['first_name'],
+            'last_name': row['last_name'],
+            'role': UserRole(row['role']),
+            'is_active': True,
+            'created_at': now,
+            'updated_at': now,
+        } for row, password_hash in zip(rows, hashes)
+    ], 'username', chunk_size)
+
+    employee_by_user = _insert_returning(Employee.__table__, [
+        {
+            'user_id': user_ids[row['username']],
+            'department_id': known_departments.get(row['department']),
+            'position': row['position'],
+            'hire_date': row['hire_date'],
+            'salary': row['salary'],
+            'employment_status': row['employment_status'],
+            'created_at': now,
+            'updated_at': now,
+        } for row in rows
+    ], 'user_id', chunk_size)
+    employee_ids = {row['username']: employee_by_user[user_ids[row['username']]] for row in rows}
+
+    # Second pass: every employee has an id now, so managers can be linked
+    links = []
+    for i, (kind, ref) in parents.items():
+        manager_id = employee_ids[rows[ref]['username']] if kind == 'row' else ref
+        links.append({'employee_id': employee_ids[rows[i]['username']], 'manager_id': manager_id})
+    employees = Employee.__table__
+    for start in range(0, len(links), chunk_size):
+        db.session.execute(
+            employees.update()
+            .where(employees.c.id == db.bindparam('employee_id'))
+            .values(manager_id=db.bindparam('manager_id')),
+            links[start:start + chunk_size]
+        )
+
+    closure = _closure_rows(rows, employee_ids, parents)
+    for start in range(0, len(closure), chunk_size):
+        db.session.execute(db.insert(EmployeeHierarchy), closure[start:start + chunk_size])
+
+    bump_table_versions(db.session.connection(), ['users', 'employees', 'departments'])
+    db.session.commit()
+    employee_resolver.clear()
+    approver_index.clear()
+
+    report['created'] = len(rows)
+    report['employees'] = [
+        dict({'username': row['username'], 'employee_id': employee_ids[row['username']]},
+             **({'initial_password': generated[row['username']]} if row['username'] in generated else {}))
+        for row in rows
+    ]
+    return report
+
+@employee_bp.cli.command('import')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--dry-run', is_flag=True, help='Validate without writing anything')
+def import_employees_command(path, dry_run):
+    """Onboard employees from a CSV or JSON file"""
+    with open(path, encoding='utf-8') as f:
+        records = read_records(f.read(), 'csv' if path.lower().endswith('.csv') else 'json')
+    click.echo(json.dumps(import_employees(records, dry_run=dry_run), indent=2, default=str))
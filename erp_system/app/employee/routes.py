@@ -1,8 +1,17 @@
-from flask import render_template, redirect, url_for, flash, request, jsonify
+from flask import render_template, redirect, url_for, flash, request, jsonify, current_app
 from flask_login import login_required, current_user
+from sqlalchemy.exc import IntegrityError
 from . import employee_bp
+from .archive import attendance_source, month_start
+from .attendance_buffer import get_attendance_buffer
+from .hierarchy import management_chain, manages, reports_query, span_of_control
+from .identity import current_employee
+from .onboarding import assignable_roles, import_employees, read_records
+from .summary import department_summary, employee_summary_query, serialize_employee_summary
 from .. import db
-from ..models import Employee, Department, User, Attendance, PerformanceReview
+from ..models import (Employee, EmployeeHierarchy, Department, User, Attendance,
+                      AttendanceMonthlySummary, PerformanceReview)
+from ..api.pagination import get_page_size, keyset_page
 from datetime import datetime
 
 @employee_bp.route('/')
@@ -19,6 +28,106 @@ def profile(employee_id):
     employee = Employee.query.get_or_404(employee_id)
     return render_template('employee/profile.html', employee=employee, title='Employee Profile')
 
+def can_view_reports(employee_id):
+    """Admins and HR see every team; others only their own part of the tree"""
+    if current_user.role.name in ['ADMIN', 'HR']:
+        return True
+    employee = current_employee()
+    return employee is not None and manages(employee.id, employee_id)
+
+def report_page(employee_id):
+    """One keyset page of the reports below an employee, from the request args"""
+    max_depth = request.args.get('max_depth', type=int)
+    rows, next_cursor = keyset_page(
+        reports_query(employee_id, max_depth),
+        [EmployeeHierarchy.depth, EmployeeHierarchy.descendant_id],
+        get_page_size(),
+        request.args.get('cursor')
+    )
+    reports = [
+        {
+            'id': row.descendant_id,
+            'depth': row.depth,
+            'manager_id': row.manager_id,
+            'name': f'{row.first_name} {row.last_name}',
+            'position': row.position,
+            'department': row.department
+        } for row in rows
+    ]
+    return reports, next_cursor
+
+@employee_bp.route('/<int:employee_id>/management-chain')
+@login_required
+def management_chain_view(employee_id):
+    """Managers above an employee, nearest first"""
+    employee = current_employee()
+    if not can_view_reports(employee_id) and not (employee and manages(employee_id, employee.id)):
+        return jsonify({'error': 'Permission denied'}), 403
+    
+    return jsonify({
+        'employee_id': employee_id,
+        'managers': [
+            {
+                'id': row.employee_id,
+                'depth': row.depth,
+                'name': f'{row.first_name} {row.last_name}',
+                'position': row.position
+            } for row in management_chain(employee_id)
+        ]
+    })
+
+@employee_bp.route('/<int:employee_id>/reports')
+@login_required
+def reports(employee_id):
+    """Page through everyone reporting to an employee, level by level"""
+    if not can_view_reports(employee_id):
+        return jsonify({'error': 'Permission denied'}), 403
+    
+    try:
+        reports, next_cursor = report_page(employee_id)
+    except (ValueError, TypeError):
+        return jsonify({'error': 'Invalid cursor'}), 400
+    
+    return jsonify({
+        'employee_id': employee_id,
+        'span_of_control': span_of_control(employee_id),
+        'reports': reports,
+        'next_cursor': next_cursor
+    })
+
+@employee_bp.route('/org-chart')
+@login_required
+def org_chart():
+    """Org chart below an employee, one page of reports at a time"""
+    employee_id = request.args.get('employee_id', type=int)
+    if employee_id is None:
+        employee = current_employee()
+        if not employee:
+            flash('Employee record not found', 'danger')
+            return redirect(url_for('main.dashboard'))
+        employee_id = employee.id
+    
+    if not can_view_reports(employee_id):
+        flash('You do not have permission to view this team', 'danger')
+        return redirect(url_for('main.dashboard'))
+    
+    employee = Employee.query.get_or_404(employee_id)
+    try:
+        reports, next_cursor = report_page(employee_id)
+    except (ValueError, TypeError):
+        flash('Invalid page', 'danger')
+        return redirect(url_for('employee.org_chart', employee_id=employee_id))
+    
+    return render_template(
+        'employee/org_chart.html',
+        employee=employee,
+        chain=management_chain(employee_id),
+        span=span_of_control(employee_id),
+        reports=reports,
+        next_cursor=next_cursor,
+        title='Org Chart'
+    )
+
 @employee_bp.route('/register', methods=['GET', 'POST'])
 @login_required
 def register():
@@ -26,30 +135,175 @@ def register():
     # Implementation for employee registration
     return render_template('employee/register.html', title='Register Employee')
 
+@employee_bp.route('/import', methods=['POST'])
+@login_required
+def import_onboarding():
+    """Onboard employees in bulk from a CSV or JSON upload"""
+    if current_user.role.name not in ['ADMIN', 'HR']:
+        return jsonify({'error': 'Permission denied'}), 403
+
+    upload = request.files.get('file')
+    try:
+        if upload:
+            fmt = 'csv' if upload.filename.lower().endswith('.csv') else 'json'
+            records = read_records(upload.read().decode('utf-8-sig'), fmt)
+        else:
+            fmt = 'csv' if request.mimetype == 'text/csv' else 'json'
+            records = read_records(request.get_data(as_text=True), fmt)
+    except (UnicodeDecodeError, ValueError) as e:
+        return jsonify({'error': f'Could not read the import: {e}'}), 400
+    if not records:
+        return jsonify({'error': 'The import contains no records'}), 400
+
+    max_records = current_app.config.get('ONBOARDING_MAX_RECORDS', 20000)
+    if len(records) > max_records:
+        return jsonify({'error': f'Imports are limited to {max_records} records'}), 413
+
+    dry_run = request.args.get('dry_run', '').lower() in ('1', 'true', 'yes')
+    report = import_employees(records, dry_run=dry_run, roles=assignable_roles(current_user))
+    return jsonify(report), 422 if report['errors'] else 200
+
 @employee_bp.route('/attendance')
 @login_required
 def attendance():
-    """View attendance records"""
+    """View attendance records, a page at a time within a bounded date range"""
+    today = datetime.utcnow().date()
+    try:
+        date_from = datetime.strptime(request.args.get('date_from') or month_start(today).isoformat(), '%Y-%m-%d').date()
+        date_to = datetime.strptime(request.args.get('date_to') or today.isoformat(), '%Y-%m-%d').date()
+    except ValueError:
+        flash('Dates must be formatted as YYYY-MM-DD', 'danger')
+        return redirect(url_for('employee.attendance'))
+    
+    max_days = current_app.config.get('ATTENDANCE_VIEW_MAX_DAYS', 92)
+    if date_to < date_from or (date_to - date_from).days + 1 > max_days:
+        flash(f'Please choose a date range of at most {max_days} days', 'danger')
+        return redirect(url_for('employee.attendance'))
+    
+    source = attendance_source(date_from, date_to)
+    query = db.session.query(
+        source.c.id, source.c.employee_id, source.c.date, source.c.check_in,
+        source.c.check_out, source.c.status, source.c.notes, User.first_name, User.last_name
+    ).select_from(source).outerjoin(
+        Employee, Employee.id == source.c.employee_id
+    ).outerjoin(User, User.id == Employee.user_id)
+    
     if current_user.role.name in ['ADMIN', 'HR', 'MANAGER']:
-        records = Attendance.query.all()
+        if request.args.get('employee_id', type=int):
+            query = query.filter(source.c.employee_id == request.args.get('employee_id', type=int))
     else:
-        employee = Employee.query.filter_by(user_id=current_user.id).first()
+        employee = current_employee()
         if not employee:
             flash('Employee record not found', 'danger')
             return redirect(url_for('main.dashboard'))
-        records = employee.attendance_records
+        query = query.filter(source.c.employee_id == employee.id)
+    if request.args.get('status'):
+        query = query.filter(source.c.status == request.args.get('status'))
+    
+    try:
+        records, next_cursor = keyset_page(
+            query, [source.c.date, source.c.id], get_page_size(),
+            request.args.get('cursor'), descending=True
+        )
+    except (ValueError, TypeError):
+        flash('Invalid page', 'danger')
+        return redirect(url_for('employee.attendance'))
     
-    return render_template('employee/attendance.html', records=records, title='Attendance Records')
+    return render_template(
+        'employee/attendance.html',
+        records=records,
+        next_cursor=next_cursor,
+        date_from=date_from,
+        date_to=date_to,
+        title='Attendance Records'
+    )
+
+def summary_request():
+    """Parse the month and scope of an attendance summary request.
+
+    Returns (month, manager_id); managers only see the employees below them.
+    """
+    month = datetime.strptime(request.args.get('month') or datetime.utcnow().strftime('%Y-%m'), '%Y-%m').date()
+    if current_user.role.name in ['ADMIN', 'HR']:
+        return month, None
+    employee = current_employee()
+    return month, employee.id if employee else 0
+
+@employee_bp.route('/attendance/summary')
+@login_required
+def attendance_summary():
+    """Monthly attendance summary by department"""
+    if current_user.role.name not in ['ADMIN', 'HR', 'MANAGER']:
+        flash('You do not have permission to access this page', 'danger')
+        return redirect(url_for('main.dashboard'))
+    
+    try:
+        month, manager_id = summary_request()
+    except ValueError:
+        flash('Month must be formatted as YYYY-MM', 'danger')
+        return redirect(url_for('employee.attendance_summary'))
+    
+    return render_template(
+        'employee/attendance_summary.html',
+        month=month,
+        departments=department_summary(month, manager_id),
+        title='Attendance Summary'
+    )
+
+@employee_bp.route('/attendance/summary/data')
+@login_required
+def attendance_summary_data():
+    """Monthly attendance summary as JSON, by department or by employee"""
+    if current_user.role.name not in ['ADMIN', 'HR', 'MANAGER']:
+        return jsonify({'error': 'Permission denied'}), 403
+    
+    try:
+        month, manager_id = summary_request()
+    except ValueError:
+        return jsonify({'error': 'month must be formatted as YYYY-MM'}), 400
+    
+    if request.args.get('by', 'department') == 'department':
+        return jsonify({
+            'month': month.strftime('%Y-%m'),
+            'departments': department_summary(month, manager_id)
+        })
+    
+    query = employee_summary_query(month, request.args.get('department_id', type=int), manager_id)
+    try:
+        rows, next_cursor = keyset_page(
+            query, [AttendanceMonthlySummary.employee_id], get_page_size(), request.args.get('cursor')
+        )
+    except (ValueError, TypeError):
+        return jsonify({'error': 'Invalid cursor'}), 400
+    
+    return jsonify({
+        'month': month.strftime('%Y-%m'),
+        'employees': [serialize_employee_summary(row) for row in rows],
+        'next_cursor': next_cursor
+    })
 
 @employee_bp.route('/attendance/check-in', methods=['POST'])
 @login_required
 def check_in():
     """Record check-in time"""
-    employee = Employee.query.filter_by(user_id=current_user.id).first()
+    employee = current_employee()
     if not employee:
         return jsonify({'success': False, 'message': 'Employee record not found'})
     
-    today = datetime.utcnow().date()
+    now = datetime.utcnow()
+    if current_app.config.get('ATTENDANCE_BUFFERED'):
+        # Queued and upserted in batches; a repeated check-in keeps the first time
+        try:
+            get_attendance_buffer().record(employee.id, now.date(), check_in=now)
+        except RuntimeError as e:
+            return jsonify({'success': False, 'message': str(e)}), 503
+        return jsonify({
+            'success': True,
+            'message': 'Check-in recorded successfully',
+            'time': now.strftime('%H:%M:%S')
+        })
+    
+    today = now.date()
     attendance = Attendance.query.filter_by(
         employee_id=employee.id, 
         date=today
@@ -61,10 +315,15 @@ def check_in():
     else:
         attendance = Attendance(employee_id=employee.id, date=today)
     
-    attendance.check_in = datetime.utcnow()
+    attendance.check_in = now
     attendance.status = 'Present'
     db.session.add(attendance)
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # A concurrent check-in created today's row first
+        db.session.rollback()
+        return jsonify({'success': False, 'message': 'Already checked in today'})
     
     return jsonify({
         'success': True, 
@@ -76,11 +335,32 @@ def check_in():
 @login_required
 def check_out():
     """Record check-out time"""
-    employee = Employee.query.filter_by(user_id=current_user.id).first()
+    employee = current_employee()
     if not employee:
         return jsonify({'success': False, 'message': 'Employee record not found'})
     
-    today = datetime.utcnow().date()
+    now = datetime.utcnow()
+    today = now.date()
+    if current_app.config.get('ATTENDANCE_BUFFERED'):
+        buffer = get_attendance_buffer()
+        checked_in = buffer.pending_check_in(employee.id, today) or db.session.scalar(
+            db.select(Attendance.check_in).where(
+                Attendance.employee_id == employee.id,
+                Attendance.date == today
+            )
+        )
+        if not checked_in:
+            return jsonify({'success': False, 'message': 'No check-in record found for today'})
+        try:
+            buffer.record(employee.id, today, check_out=now)
+        except RuntimeError as e:
+            return jsonify({'success': False, 'message': str(e)}), 503
+        return jsonify({
+            'success': True,
+            'message': 'Check-out recorded successfully',
+            'time': now.strftime('%H:%M:%S')
+        })
+    
     attendance = Attendance.query.filter_by(
         employee_id=employee.id, 
         date=today
@@ -89,7 +369,7 @@ def check_out():
     if not attendance or not attendance.check_in:
         return jsonify({'success': False, 'message': 'No check-in record found for today'})
     
-    attendance.check_out = datetime.utcnow()
+    attendance.check_out = now
     db.session.commit()
     
     return jsonify({
@@ -105,10 +385,10 @@ def performance():
     if current_user.role.name in ['ADMIN', 'HR', 'MANAGER']:
         reviews = PerformanceReview.query.all()
     else:
-        employee = Employee.query.filter_by(user_id=current_user.id).first()
+        employee = current_employee()
         if not employee:
             flash('Employee record not found', 'danger')
             return redirect(url_for('main.dashboard'))
-        reviews = employee.performance_reviews
+        reviews = PerformanceReview.query.filter_by(employee_id=employee.id).all()
     
     return render_template('employee/performance.html', reviews=reviews, title='Performance Reviews')
\ No newline at end of file
@@ -0,0 +1,279 @@
+from collections import defaultdict
+from datetime import datetime
+import click
+import numpy as np
+from flask import current_app
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from . import employee_bp
+from .. import db
+from ..models import (Attendance, AttendanceArchive, AttendanceMonthlySummary, Department,
+                      Employee, EmployeeHierarchy, User)
+from .archive import hours_worked, month_start
+
+SUMMARY_COLUMNS = ['employee_id', 'month', 'department_id', 'present_days', 'late_days',
+                   'absent_days', 'worked_days', 'total_hours', 'overtime_hours', 'updated_at']
+
+def summary_settings():
+    """Lateness and overtime thresholds, read from the app config"""
+    config = current_app.config
+    return {
+        'standard_hours': config.get('PAYROLL_STANDARD_HOURS', 8),
+        'late_after': datetime.strptime(config.get('ATTENDANCE_LATE_AFTER', '09:15'), '%H:%M').time(),
+    }
+
+def _late_check_in(attendance, dialect_name, late_after):
+    # Check-ins are compared to the whole second, as _summarize_month does
+    if dialect_name == 'postgresql':
+        return db.cast(db.func.date_trunc('second', attendance.c.check_in), db.Time) > late_after
+    return db.func.time(attendance.c.check_in) > late_after.strftime('%H:%M:%S')
+
+def refresh_summaries(connection, keys):
+    """Recompute the summaries of (employee_id, month) pairs from raw attendance.
+
+    Each month costs one DELETE and one INSERT ... SELECT over the affected
+    employees' rows, found through the (employee_id, date) keys of the live
+    and archive tables.
+    """
+    by_month = defaultdict(set)
+    for employee_id, day in keys:
+        if employee_id is not None and day is not None:
+            by_month[month_start(day)].add(employee_id)
+    if not by_month:
+        return
+
+    settings = summary_settings()
+    standard = settings['standard_hours']
+    summary = AttendanceMonthlySummary.__table__
+    now = datetime.utcnow()
+
+    for month, employee_ids in sorted(by_month.items()):
+        employee_ids = sorted(employee_ids)
+        end = month_start(month, -1)
+
+        def in_month(table):
+            return db.select(
+                table.c.employee_id, table.c.check_in, table.c.check_out, table.c.status
+            ).where(
+                table.c.employee_id.in_(employee_ids),
+                table.c.date >= month,
+                table.c.date < end
+            )
+
+        attendance = db.union_all(
+            in_month(Attendance.__table__), in_month(AttendanceArchive.__table__)
+        ).subquery('attendance')
+        hours = hours_worked(attendance, connection.dialect.name)
+        checked_in = attendance.c.check_in.isnot(None)
+        worked = db.and_(checked_in, attendance.c.check_out.isnot(None))
+        late = db.and_(checked_in, db.or_(
+            attendance.c.status == 'Late',
+            _late_check_in(attendance, connection.dialect.name, settings['late_after'])
+        ))
+        absent = db.and_(attendance.c.check_in.is_(None), attendance.c.status == 'Absent')
+
+        totals = db.select(
+            attendance.c.employee_id,
+            db.literal(month, db.Date),
+            Employee.department_id,
+            db.func.sum(db.case((checked_in, 1), else_=0)),
+            db.func.sum(db.case((late, 1), else_=0)),
+            db.func.sum(db.case((absent, 1), else_=0)),
+            db.func.sum(db.case((worked, 1), else_=0)),
+            db.func.coalesce(db.func.sum(db.case((worked, hours), else_=0)), 0),
+            db.func.coalesce(db.func.sum(db.case((db.and_(worked, hours > standard), hours - standard), else_=0)), 0),
+            db.literal(now, db.DateTime)
+        ).select_from(attendance).outerjoin(
+            Employee, Employee.id == attendance.c.employee_id
+        ).group_by(attendance.c.employee_id, Employee.department_id)
+
+        connection.execute(db.delete(summary).where(
+            summary.c.month == month, summary.c.employee_id.in_(employee_ids)
+        ))
+        connection.execute(db.insert(summary).from_select(SUMMARY_COLUMNS, totals))
+
+def summarize_rows(connection, rows):
+    """Refresh the summaries touched by freshly inserted attendance rows given as dicts"""
+    refresh_summaries(connection, {(row['employee_id'], row['date']) for row in rows})
+
+def _summary_changed(attendance):
+    """Whether an update touched a column the summaries are computed from"""
+    state = inspect(attendance)
+    return any(state.attrs[name].history.has_changes()
+               for name in ('employee_id', 'date', 'check_in', 'check_out', 'status'))
+
+@event.listens_for(Session, 'after_flush')
+def _refresh_flushed_attendance(session, flush_context):
+    """Refresh the summaries of every employee-month written by this flush"""
+    keys = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if not isinstance(obj, Attendance):
+            continue
+        if obj in session.dirty and not _summary_changed(obj):
+            continue
+        keys.add((obj.employee_id, obj.date))
+        # A row moved to another employee or month also changes the old summary
+        state = inspect(obj)
+        old_employee = state.attrs.employee_id.history.deleted
+        old_date = state.attrs.date.history.deleted
+        if old_employee or old_date:
+            keys.add((old_employee[0] if old_employee else obj.employee_id,
+                      old_date[0] if old_date else obj.date))
+    if keys:
+        refresh_summaries(session.connection(), keys)
+
+def _summarize_month(rows, settings):
+    """Aggregate one month of (employee_id, check_in, check_out, status) rows
+    into per-employee totals with numpy"""
+    employee_ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+    check_in = np.array([r[1] for r in rows], dtype='datetime64[us]')
+    check_out = np.array([r[2] for r in rows], dtype='datetime64[us]')
+    status = np.array([r[3] or '' for r in rows], dtype=object)
+
+    checked_in = ~np.isnat(check_in)
+    worked = checked_in & ~np.isnat(check_out)
+    hours = np.zeros(len(rows))
+    hours[worked] = (check_out[worked] - check_in[worked]) / np.timedelta64(1, 'h')
+    overtime = np.where(worked & (hours > settings['standard_hours']), hours - settings['standard_hours'], 0)
+
+    late_after = settings['late_after']
+    late_seconds = late_after.hour * 3600 + late_after.minute * 60
+    seconds_of_day = np.zeros(len(rows))
+    seconds_of_day[checked_in] = (
+        check_in[checked_in] - check_in[checked_in].astype('datetime64[D]')
+    ) / np.timedelta64(1, 's')
+    late = checked_in & ((status == 'Late') | (np.floor(seconds_of_day) > late_seconds))
+    absent = ~checked_in & (status == 'Absent')
+
+    ids, index = np.unique(employee_ids, return_inverse=True)
+
+    def total(values):
+        return np.bincount(index, weights=values, minlength=len(ids))
+
+    return ids, {
+        'present_days': total(checked_in).astype(np.int64),
+        'late_days': total(late).astype(np.int64),
+        'absent_days': total(absent).astype(np.int64),
+        'worked_days': total(worked).astype(np.int64),
+        'total_hours': total(hours),
+        'overtime_hours': total(overtime),
+    }
+
+def rebuild_summaries(start_month, end_month):
+    """Recompute every summary from start_month to end_month inclusive.
+
+    Used for backfills: each month's raw rows are loaded once as arrays and
+    aggregated with numpy, then the month's summaries are replaced in bulk.
+    Returns the number of summary rows written.
+    """
+    settings = summary_settings()
+    chunk_size = current_app.config.get('API_STREAM_CHUNK_SIZE', 1000)
+    departments = dict(db.session.execute(db.select(Employee.id, Employee.department_id)).all())
+    summary = AttendanceMonthlySummary.__table__
+    written = 0
+
+    month = month_start(start_month)
+    while month <= end_month:
+        end = month_start(month, -1)
+        rows = []
+        for table in (Attendance.__table__, AttendanceArchive.__table__):
+            result = db.session.execute(
+                db.select(table.c.employee_id, table.c.check_in, table.c.check_out, table.c.status)
+                .where(table.c.date >= month, table.c.date < end, table.c.employee_id.isnot(None))
+                .execution_options(yield_per=chunk_size)
+            )
+            for partition in result.partitions():
+                rows.extend(partition)
+
+        db.session.execute(db.delete(summary).where(summary.c.month == month))
+        if rows:
+            ids, totals = _summarize_month(rows, settings)
+            columns = {name: values.tolist() for name, values in totals.items()}
+            now = datetime.utcnow()
+            params = [
+                dict({name: columns[name][i] for name in columns},
+                     employee_id=employee_id, month=month,
+                     department_id=departments.get(employee_id), updated_at=now)
+                for i, employee_id in enumerate(ids.tolist())
+            ]
+            for start in range(0, len(params), chunk_size):
+                db.session.execute(db.insert(summary), params[start:start + chunk_size])
+            written += len(params)
+        db.session.commit()
+        month = end
+    return written
+
+def summary_scope(query, manager_id=None):
+    """Limit a summary query to the employees below manager_id, if given"""
+    if manager_id is None:
+        return query
+    return query.where(AttendanceMonthlySummary.employee_id.in_(
+        db.select(EmployeeHierarchy.descendant_id).where(EmployeeHierarchy.ancestor_id == manager_id)
+    ))
+
+def department_summary(month, manager_id=None):
+    """Monthly attendance totals per department, read from the summaries"""
+    s = AttendanceMonthlySummary
+    query = db.select(
+        s.department_id,
+        Department.name,
+        db.func.count(s.employee_id),
+        db.func.sum(s.present_days),
+        db.func.sum(s.late_days),
+        db.func.sum(s.absent_days),
+        db.func.sum(s.worked_days),
+        db.func.sum(s.total_hours),
+        db.func.sum(s.overtime_hours)
+    ).outerjoin(
+        Department, Department.id == s.department_id
+    ).where(s.month == month).group_by(s.department_id, Department.name).order_by(Department.name)
+
+    return [
+        {
+            'department_id': department_id,
+            'department': name or 'Unassigned',
+            'employees': employees,
+            'present_days': present,
+            'late_days': late,
+            'absent_days': absent,
+            'average_hours': round(hours / worked, 2) if worked else 0,
+            'overtime_hours': round(overtime, 2),
+        } for department_id, name, employees, present, late, absent, worked, hours, overtime
+        in db.session.execute(summary_scope(query, manager_id)).all()
+    ]
+
+def employee_summary_query(month, department_id=None, manager_id=None):
+    """Query per-employee summary rows for a month, keyed by employee_id"""
+    s = AttendanceMonthlySummary
+    query = db.session.query(
+        s.employee_id, s.department_id, s.present_days, s.late_days, s.absent_days,
+        s.worked_days, s.total_hours, s.overtime_hours, User.first_name, User.last_name
+    ).outerjoin(
+        Employee, Employee.id == s.employee_id
+    ).outerjoin(
+        User, User.id == Employee.user_id
+    ).filter(s.month == month)
+    if department_id is not None:
+        query = query.filter(s.department_id == department_id)
+    return summary_scope(query, manager_id)
+
+def serialize_employee_summary(row):
+    return {
+        'employee_id': row.employee_id,
+        'name': f'{row.first_name} {row.last_name}',
+        'department_id': row.department_id,
+        'present_days': row.present_days,
+        'late_days': row.late_days,
+        'absent_days': row.absent_days,
+        'average_hours': round(row.total_hours / row.worked_days, 2) if row.worked_days else 0,
+        'overtime_hours': round(row.overtime_hours, 2),
+    }
+
+@employee_bp.cli.command('rebuild-attendance-summary')
+@click.option('--start', 'start_month', type=click.DateTime(formats=['%Y-%m']), required=True)
+@click.option('--end', 'end_month', type=click.DateTime(formats=['%Y-%m']))
+def rebuild_summaries_command(start_month, end_month):
+    """Backfill the monthly attendance summaries for a range of months"""
+    end = end_month.date() if end_month else month_start(datetime.utcnow().date())
+    written = rebuild_summaries(start_month.date(), end)
+    click.echo(f'Wrote {written} attendance summaries')
@@ -0,0 +1,157 @@
+from collections import defaultdict
+import click
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from . import finance_bp
+from .. import db
+from ..models import FinanceDailyRollup, FinancialTransaction
+from ..upsert import insert_on_conflict
+from ..versioning import bump_table_versions
+
+ROLLUP_KEYS = ('transaction_date', 'transaction_type', 'category', 'amount')
+
+def _rollup_key(transaction_date, transaction_type, category):
+    # Primary key columns cannot be NULL, so missing values roll up under ''
+    return (transaction_date, transaction_type or '', category or '')
+
+def apply_rollup_deltas(connection, deltas):
+    """Add {(date, type, category): [amount, count]} deltas to the rollup"""
+    table = FinanceDailyRollup.__table__
+    changed = False
+    for (rollup_date, transaction_type, category), (amount, count) in sorted(deltas.items()):
+        if rollup_date is None or (not amount and not count):
+            continue
+        changed = True
+        stmt = insert_on_conflict(connection, table).values(
+            rollup_date=rollup_date,
+            transaction_type=transaction_type,
+            category=category,
+            total_amount=amount,
+            transaction_count=count
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.rollup_date, table.c.transaction_type, table.c.category],
+            set_={
+                'total_amount': table.c.total_amount + stmt.excluded.total_amount,
+                'transaction_count': table.c.transaction_count + stmt.excluded.transaction_count,
+            }
+        )
+        connection.execute(stmt)
+    if changed:
+        bump_table_versions(connection, [table.name])
+
+def rollup_rows(connection, rows):
+    """Roll up freshly inserted transaction rows given as dicts"""
+    deltas = defaultdict(lambda: [0, 0])
+    for row in rows:
+        key = _rollup_key(row['transaction_date'], row['transaction_type'], row['category'])
+        deltas[key][0] += row['amount'] or 0
+        deltas[key][1] += 1
+    apply_rollup_deltas(connection, deltas)
+
+def rollup_summary(start_date=None, end_date=None, types=('Income', 'Expense')):
+    """Return {transaction_type: {category: amount}} summed from the rollup.
+
+    A single GROUP BY category with one conditional SUM per transaction type,
+    so every breakdown comes back from one pass over the rollup rows.
+    """
+    rollup = FinanceDailyRollup
+    query = db.select(
+        rollup.category,
+        *[
+            db.func.sum(db.case((rollup.transaction_type == t, rollup.total_amount)))
+            for t in types
+        ]
+    ).where(rollup.transaction_type.in_(types))
+    if start_date:
+        query = query.where(rollup.rollup_date >= start_date)
+    if end_date:
+        query = query.where(rollup.rollup_date <= end_date)
+    query = query.group_by(rollup.category)
+
+    summary = {transaction_type: {} for transaction_type in types}
+    for category, *amounts in db.session.execute(query):
+        for transaction_type, amount in zip(types, amounts):
+            if amount is not None:
+                summary[transaction_type][category or None] = amount
+    return summary
+
+def rebuild_rollup(start_date=None, end_date=None):
+    """Recompute the rollup from financial_transactions for a date range"""
+    tx = FinancialTransaction
+    rollup = FinanceDailyRollup
+
+    delete = db.delete(rollup)
+    select = db.select(
+        tx.transaction_date,
+        db.func.coalesce(tx.transaction_type, ''),
+        db.func.coalesce(tx.category, ''),
+        db.func.sum(tx.amount),
+        db.func.count(tx.id)
+    ).where(tx.transaction_date.isnot(None))
+    if start_date:
+        delete = delete.where(rollup.rollup_date >= start_date)
+        select = select.where(tx.transaction_date >= start_date)
+    if end_date:
+        delete = delete.where(rollup.rollup_date <= end_date)
+        select = select.where(tx.transaction_date <= end_date)
+    select = select.group_by(
+        tx.transaction_date,
+        db.func.coalesce(tx.transaction_type, ''),
+        db.func.coalesce(tx.category, '')
+    )
+
+    db.session.execute(delete)
+    db.session.execute(
+        db.insert(rollup).from_select(
+            ['rollup_date', 'transaction_type', 'category', 'total_amount', 'transaction_count'],
+            select
+        )
+    )
+    bump_table_versions(db.session.connection(), [rollup.__tablename__])
+    db.session.commit()
+
+@event.listens_for(Session, 'after_flush')
+def _rollup_flushed_transactions(session, flush_context):
+    """Fold inserted, updated and deleted transactions into the daily rollup"""
+    deltas = defaultdict(lambda: [0, 0])
+
+    for obj in session.new:
+        if isinstance(obj, FinancialTransaction):
+            key = _rollup_key(obj.transaction_date, obj.transaction_type, obj.category)
+            deltas[key][0] += obj.amount or 0
+            deltas[key][1] += 1
+
+    for obj in session.deleted:
+        if isinstance(obj, FinancialTransaction):
+            key = _rollup_key(obj.transaction_date, obj.transaction_type, obj.category)
+            deltas[key][0] -= obj.amount or 0
+            deltas[key][1] -= 1
+
+    for obj in session.dirty:
+        if not isinstance(obj, FinancialTransaction):
+            continue
+        state = inspect(obj)
+        histories = {key: state.attrs[key].history for key in ROLLUP_KEYS}
+        if not any(h.has_changes() for h in histories.values()):
+            continue
+        old = {key: h.deleted[0] if h.deleted else getattr(obj, key)
+               for key, h in histories.items()}
+        old_key = _rollup_key(old['transaction_date'], old['transaction_type'], old['category'])
+        deltas[old_key][0] -= old['amount'] or 0
+        deltas[old_key][1] -= 1
+        new_key = _rollup_key(obj.transaction_date, obj.transaction_type, obj.category)
+        deltas[new_key][0] += obj.amount or 0
+        deltas[new_key][1] += 1
+
+    if deltas:
+        apply_rollup_deltas(session.connection(), deltas)
+
+@finance_bp.cli.command('rebuild-rollup')
+@click.option('--start', 'start_date', type=click.DateTime(formats=['%Y-%m-%d']))
+@click.option('--end', 'end_date', type=click.DateTime(formats=['%Y-%m-%d']))
+def rebuild_rollup_command(start_date, end_date):
+    """Recompute the daily finance rollup, optionally for a date range"""
+    rebuild_rollup(start_date.date() if start_date else None,
+                   end_date.date() if end_date else None)
+    click.echo('Finance rollup rebuilt')
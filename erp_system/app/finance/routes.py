@@ -1,10 +1,25 @@
-from flask import render_template, redirect, url_for, flash, request, jsonify
+from flask import current_app, render_template, redirect, url_for, flash, request, jsonify
 from flask_login import login_required, current_user
 from . import finance_bp
 from .. import db
 from ..models import FinancialTransaction, ExpenseClaim, UserRole
+from ..api.bulk import TRANSACTION_TYPES
+from ..api.pagination import get_page_size, keyset_page
+from ..reports.definitions import parse_date_range
+from ..reports.jobs import submit_job
+from .rollup import rollup_summary
 from datetime import datetime, timedelta
 import calendar
+import json
+
+def check_report_range(start_date, end_date):
+    """Return an error message if a report date range is invalid or too long"""
+    if end_date < start_date:
+        return 'The report end date must not be before its start date'
+    max_days = current_app.config.get('FINANCE_REPORT_MAX_DAYS', 366)
+    if (end_date - start_date).days + 1 > max_days:
+        return f'Reports are limited to {max_days} days; please choose a shorter range'
+    return None
 
 @finance_bp.route('/')
 @login_required
@@ -23,15 +38,9 @@ def index():
     today = datetime.utcnow().date()
     start_of_month = today.replace(day=1)
     
-    income_mtd = FinancialTransaction.query.filter(
-        FinancialTransaction.transaction_type == 'Income',
-        FinancialTransaction.transaction_date >= start_of_month
-    ).with_entities(db.func.sum(FinancialTransaction.amount)).scalar() or 0
-    
-    expenses_mtd = FinancialTransaction.query.filter(
-        FinancialTransaction.transaction_type == 'Expense',
-        FinancialTransaction.transaction_date >= start_of_month
-    ).with_entities(db.func.sum(FinancialTransaction.amount)).scalar() or 0
+    summary = rollup_summary(start_date=start_of_month)
+    income_mtd = sum(summary['Income'].values())
+    expenses_mtd = sum(summary['Expense'].values())
     
     # Get pending expense claims
     pending_claims = ExpenseClaim.query.filter_by(reimbursed=False).all()
@@ -111,62 +120,91 @@ def income_expense_report():
     today = datetime.utcnow().date()
     
     # Default to current month
-    start_date = today.replace(day=1)
     _, last_day = calendar.monthrange(today.year, today.month)
-    end_date = today.replace(day=last_day)
-    
-    if request.method == 'POST':
-        start_date = datetime.strptime(request.form.get('start_date'), '%Y-%m-%d').date()
-        end_date = datetime.strptime(request.form.get('end_date'), '%Y-%m-%d').date()
-    
-    # Get income transactions
-    income_transactions = FinancialTransaction.query.filter(
-        FinancialTransaction.transaction_type == 'Income',
-        FinancialTransaction.transaction_date >= start_date,
-        FinancialTransaction.transaction_date <= end_date
-    ).order_by(FinancialTransaction.transaction_date).all()
-    
-    # Get expense transactions
-    expense_transactions = FinancialTransaction.query.filter(
-        FinancialTransaction.transaction_type == 'Expense',
-        FinancialTransaction.transaction_date >= start_date,
-        FinancialTransaction.transaction_date <= end_date
-    ).order_by(FinancialTransaction.transaction_date).all()
-    
-    # Calculate totals
-    total_income = sum(tx.amount for tx in income_transactions)
-    total_expenses = sum(tx.amount for tx in expense_transactions)
-    net_profit = total_income - total_expenses
-    
-    # Group by category for charts
-    income_by_category = {}
-    for tx in income_transactions:
-        if tx.category in income_by_category:
-            income_by_category[tx.category] += tx.amount
-        else:
-            income_by_category[tx.category] = tx.amount
-    
-    expense_by_category = {}
-    for tx in expense_transactions:
-        if tx.category in expense_by_category:
-            expense_by_category[tx.category] += tx.amount
-        else:
-            expense_by_category[tx.category] = tx.amount
+    args = request.form if request.method == 'POST' else request.args
+    try:
+        params = parse_date_range({
+            'start_date': args.get('start_date', today.replace(day=1).isoformat()),
+            'end_date': args.get('end_date', today.replace(day=last_day).isoformat())
+        }, max_days=current_app.config.get('FINANCE_REPORT_MAX_DAYS', 366))
+    except ValueError as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('finance.reports'))
+    
+    # The report is computed by a background job; a cached result for the
+    # same range and unchanged rollup is served straight away
+    job = submit_job('income_expense', params, current_user.id)
+    if job.status == 'Failed':
+        flash('The report could not be generated, please try again', 'danger')
+        return redirect(url_for('finance.reports'))
     
     return render_template(
         'finance/income_expense_report.html',
-        start_date=start_date,
-        end_date=end_date,
-        income_transactions=income_transactions,
-        expense_transactions=expense_transactions,
-        total_income=total_income,
-        total_expenses=total_expenses,
-        net_profit=net_profit,
-        income_by_category=income_by_category,
-        expense_by_category=expense_by_category,
+        start_date=params['start_date'],
+        end_date=params['end_date'],
+        report=json.loads(job.result) if job.status == 'Done' else None,
+        status_url=url_for('reports.job_status', job_id=job.id),
         title='Income vs Expense Report'
     )
 
+@finance_bp.route('/reports/income-expense/transactions')
+@login_required
+def income_expense_transactions():
+    """Page through the itemised transactions behind an income vs expense report"""
+    if current_user.role not in [UserRole.ADMIN, UserRole.FINANCE]:
+        return jsonify({'error': 'Permission denied'}), 403
+    
+    transaction_type = request.args.get('type', 'Income')
+    if transaction_type not in TRANSACTION_TYPES:
+        return jsonify({'error': f'type must be one of {", ".join(TRANSACTION_TYPES)}'}), 400
+    try:
+        start_date = datetime.strptime(request.args.get('start_date', ''), '%Y-%m-%d').date()
+        end_date = datetime.strptime(request.args.get('end_date', ''), '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({'error': 'start_date and end_date must be formatted as YYYY-MM-DD'}), 400
+    
+    error = check_report_range(start_date, end_date)
+    if error:
+        return jsonify({'error': error}), 400
+    
+    # Only the columns the report lists, as plain rows
+    query = FinancialTransaction.query.filter(
+        FinancialTransaction.transaction_type == transaction_type,
+        FinancialTransaction.transaction_date >= start_date,
+        FinancialTransaction.transaction_date <= end_date
+    ).with_entities(
+        FinancialTransaction.id,
+        FinancialTransaction.transaction_date,
+        FinancialTransaction.amount,
+        FinancialTransaction.category,
+        FinancialTransaction.description,
+        FinancialTransaction.reference_number
+    )
+    
+    try:
+        rows, next_cursor = keyset_page(
+            query,
+            [FinancialTransaction.transaction_date, FinancialTransaction.id],
+            get_page_size(),
+            request.args.get('cursor')
+        )
+    except (ValueError, TypeError):
+        return jsonify({'error': 'Invalid cursor'}), 400
+    
+    return jsonify({
+        'transactions': [
+            {
+                'id': row.id,
+                'date': row.transaction_date.strftime('%Y-%m-%d'),
+                'amount': row.amount,
+                'category': row.category,
+                'description': row.description,
+                'reference': row.reference_number
+            } for row in rows
+        ],
+        'next_cursor': next_cursor
+    })
+
 @finance_bp.route('/reports/tax-compliance')
 @login_required
 def tax_compliance():
@@ -1,21 +1,24 @@
-from flask import Blueprint, render_template, redirect, url_for
+from flask import render_template, redirect, url_for
 from flask_login import login_required, current_user
-from app.models import Employee, Attendance, WorkflowRequest, Task, Department, Project
 from datetime import datetime
 from sqlalchemy import func
 from . import main_bp
-from ..models import User, Payroll, Resource, Workflow, WorkflowStatus
+from .. import db
+from ..employee.identity import current_employee
+from ..models import (Employee, Attendance, Department, Payroll, Resource, Workflow, WorkflowStatus,
+                      loader_profile, PolymorphicWorkflow)
 
-main = Blueprint('main', __name__)
+# Pending approvals shown on the dashboard; the workflow page lists the rest
+DASHBOARD_APPROVALS = 10
 
-@main.route('/')
+@main_bp.route('/')
 def index():
     """Main landing page"""
     if current_user.is_authenticated:
         return redirect(url_for('main.dashboard'))
     return render_template('main/index.html', title='ERP System')
 
-@main.route('/dashboard')
+@main_bp.route('/dashboard')
 @login_required
 def dashboard():
     """Main dashboard with summary of all modules"""
@@ -23,69 +26,46 @@ def dashboard():
     stats = {
         'total_employees': Employee.query.count(),
         'present_today': Attendance.query.filter_by(date=datetime.now().date()).count(),
-        'pending_requests': WorkflowRequest.query.filter_by(status='pending').count(),
-        'tasks_due': Task.query.filter_by(due_date=datetime.now().date()).count(),
+        'pending_requests': Workflow.query.filter_by(status=WorkflowStatus.PENDING).count(),
         'total_departments': Department.query.count(),
-        'pending_workflows': Workflow.query.filter_by(status=WorkflowStatus.PENDING).count(),
         'low_stock_resources': Resource.query.filter_by(status='Low Stock').count()
     }
 
-    # Get recent notifications
-    notifications = current_user.notifications.order_by(Notification.timestamp.desc()).limit(5).all()
-
     # For admin/manager users, prepare chart data
-    dept_performance_data = None
-    project_status_data = None
+    dept_headcount_data = None
     
     if current_user.role.value in ['admin', 'manager']:
-        # Department performance data
+        # Department headcount data
         dept_data = db.session.query(
             Department.name,
-            func.count(Task.id).label('completed_tasks')
-        ).join(Employee).join(Task).filter(
-            Task.status == 'completed'
-        ).group_by(Department.name).all()
+            func.count(Employee.id).label('employees')
+        ).join(Employee).group_by(Department.name).all()
 
-        dept_performance_data = {
+        dept_headcount_data = {
             'labels': [d[0] for d in dept_data],
             'datasets': [{
-                'label': 'Completed Tasks',
+                'label': 'Employees',
                 'data': [d[1] for d in dept_data],
                 'backgroundColor': 'rgba(54, 162, 235, 0.5)'
             }]
         }
 
-        # Project status data
-        project_stats = db.session.query(
-            Project.status,
-            func.count(Project.id)
-        ).group_by(Project.status).all()
-
-        project_status_data = {
-            'labels': [s[0] for s in project_stats],
-            'datasets': [{
-                'data': [s[1] for s in project_stats],
-                'backgroundColor': [
-                    'rgba(54, 162, 235, 0.5)',
-                    'rgba(255, 206, 86, 0.5)',
-                    'rgba(75, 192, 192, 0.5)',
-                    'rgba(255, 99, 132, 0.5)'
-                ]
-            }]
-        }
-
     # Get pending approvals for current user
-    pending_approvals = Workflow.query.filter_by(
-        assignee_id=current_user.id,
-        status=WorkflowStatus.PENDING
-    ).all()
+    pending_query = db.session.query(PolymorphicWorkflow).filter(
+        Workflow.assignee_id == current_user.id,
+        Workflow.status == WorkflowStatus.PENDING
+    )
+    stats['my_approvals'] = pending_query.count()
+    pending_approvals = pending_query.options(
+        *loader_profile('workflow')
+    ).order_by(Workflow.created_at).limit(DASHBOARD_APPROVALS).all()
     
     # User's own statistics
     user_stats = {}
-    employee = Employee.query.filter_by(user_id=current_user.id).first()
+    employee = current_employee()
     if employee:
         user_stats['position'] = employee.position
-        user_stats['department'] = employee.department.name if employee.department else 'Unassigned'
+        user_stats['department'] = employee.department or 'Unassigned'
         
         # Latest payroll
         latest_payroll = Payroll.query.filter_by(user_id=current_user.id).order_by(
@@ -104,7 +84,5 @@ def dashboard():
         stats=stats,
         user_stats=user_stats,
         pending_approvals=pending_approvals,
-        notifications=notifications,
-        dept_performance_data=dept_performance_data,
-        project_status_data=project_status_data
-    )
\ No newline at end of file
+        dept_headcount_data=dept_headcount_data
+    )
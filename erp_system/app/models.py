@@ -1,6 +1,7 @@
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
+from sqlalchemy.orm import configure_mappers, joinedload, with_polymorphic
 from . import db, login_manager
 import enum
 
@@ -24,12 +25,12 @@ class User(UserMixin, db.Model):
     role = db.Column(db.Enum(UserRole), default=UserRole.EMPLOYEE)
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     # Relationships
     employee_info = db.relationship('Employee', backref='user', uselist=False)
     payrolls = db.relationship('Payroll', backref='user')
-    workflows = db.relationship('Workflow', backref='assigned_to')
+    workflows = db.relationship('Workflow', backref='assigned_to', foreign_keys='Workflow.assignee_id')
 
     def set_password(self, password):
         """Set password hash"""
@@ -55,7 +56,7 @@ class Department(db.Model):
     name = db.Column(db.String(64), unique=True)
     description = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     # Relationships
     employees = db.relationship('Employee', backref='department')
@@ -73,26 +74,85 @@ class Employee(db.Model):
     salary = db.Column(db.Float)
     manager_id = db.Column(db.Integer, db.ForeignKey('employees.id'), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     # Relationships
     subordinates = db.relationship('Employee', backref=db.backref('manager', remote_side=[id]))
     attendance_records = db.relationship('Attendance', backref='employee')
     performance_reviews = db.relationship('PerformanceReview', backref='employee')
 
+class EmployeeHierarchy(db.Model):
+    """Closure table of the manager tree, one row per manager/report pair.
+
+    Every employee has a depth 0 row for itself; depth 1 rows are direct
+    reports. Kept current by app.employee.hierarchy.
+    """
+    __tablename__ = 'employee_hierarchy'
+    __table_args__ = (
+        db.Index('ix_employee_hierarchy_ancestor_depth', 'ancestor_id', 'depth', 'descendant_id'),
+        db.Index('ix_employee_hierarchy_descendant_depth', 'descendant_id', 'depth'),
+    )
+    
+    ancestor_id = db.Column(db.Integer, primary_key=True)
+    descendant_id = db.Column(db.Integer, primary_key=True)
+    depth = db.Column(db.Integer, nullable=False)
+
 class Attendance(db.Model):
     """Attendance tracking model"""
     __tablename__ = 'attendance'
+    __table_args__ = (
+        db.UniqueConstraint('employee_id', 'date', name='uq_attendance_employee_date'),
+        db.Index('ix_attendance_date_id', 'date', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
-    employee_id = db.Column(db.Integer, db.ForeignKey('employees.id'))
-    date = db.Column(db.Date, default=datetime.utcnow().date)
+    # A row moved to another employee or month changes the old month's
+    # summary too, so the old values are loaded before a change (active_history)
+    employee_id = db.column_property(db.Column(db.Integer, db.ForeignKey('employees.id')), active_history=True)
+    date = db.column_property(db.Column(db.Date, default=datetime.utcnow().date), active_history=True)
     check_in = db.Column(db.DateTime, nullable=True)
     check_out = db.Column(db.DateTime, nullable=True)
     status = db.Column(db.String(20), default='Present')  # Present, Absent, Late, Half-day
     notes = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+
+class AttendanceArchive(db.Model):
+    """Attendance rows of months past the retention window, moved out of the
+    live table by the archive-attendance job"""
+    __tablename__ = 'attendance_archive'
+    __table_args__ = (
+        db.UniqueConstraint('employee_id', 'date', name='uq_attendance_archive_employee_date'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    employee_id = db.Column(db.Integer, db.ForeignKey('employees.id'))
+    date = db.Column(db.Date, index=True)
+    check_in = db.Column(db.DateTime, nullable=True)
+    check_out = db.Column(db.DateTime, nullable=True)
+    status = db.Column(db.String(20))
+    notes = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)
+
+class AttendanceMonthlySummary(db.Model):
+    """Per-employee monthly attendance totals, kept current by
+    app.employee.summary so reports never scan raw attendance"""
+    __tablename__ = 'attendance_monthly_summaries'
+    __table_args__ = (
+        db.Index('ix_attendance_monthly_summaries_month_department', 'month', 'department_id'),
+    )
+    
+    employee_id = db.Column(db.Integer, primary_key=True)
+    month = db.Column(db.Date, primary_key=True)  # first day of the month
+    department_id = db.Column(db.Integer, nullable=True)
+    present_days = db.Column(db.Integer, nullable=False, default=0)
+    late_days = db.Column(db.Integer, nullable=False, default=0)
+    absent_days = db.Column(db.Integer, nullable=False, default=0)
+    worked_days = db.Column(db.Integer, nullable=False, default=0)  # days with check-in and check-out
+    total_hours = db.Column(db.Float, nullable=False, default=0)
+    overtime_hours = db.Column(db.Float, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class PerformanceReview(db.Model):
     """Employee performance evaluation model"""
@@ -107,7 +167,7 @@ class PerformanceReview(db.Model):
     rating = db.Column(db.Integer)  # 1-5 scale
     comments = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     # Relationship
     reviewer = db.relationship('User', backref='reviews_given')
@@ -115,6 +175,12 @@ class PerformanceReview(db.Model):
 class Payroll(db.Model):
     """Payroll model for salary processing"""
     __tablename__ = 'payrolls'
+    __table_args__ = (
+        db.Index('ix_payrolls_user_period_end', 'user_id', 'pay_period_end'),
+        # Idempotency key for pay runs: one payroll row per user and period
+        db.UniqueConstraint('user_id', 'pay_period_start', 'pay_period_end',
+                            name='uq_payrolls_user_period'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
@@ -130,11 +196,44 @@ class Payroll(db.Model):
     payment_status = db.Column(db.String(20), default='Pending')  # Pending, Paid, Cancelled
     payment_date = db.Column(db.DateTime, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+
+class PayrollRun(db.Model):
+    """A pay run for one period, split into independently committed partitions"""
+    __tablename__ = 'payroll_runs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    pay_period_start = db.Column(db.Date)
+    pay_period_end = db.Column(db.Date)
+    status = db.Column(db.String(20), default='Pending')  # Pending, Running, Done, Failed
+    created_by_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    
+    # Relationships
+    partitions = db.relationship('PayrollRunPartition', backref='run', order_by='PayrollRunPartition.id')
+
+class PayrollRunPartition(db.Model):
+    """The slice of a pay run covering one department"""
+    __tablename__ = 'payroll_run_partitions'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    run_id = db.Column(db.Integer, db.ForeignKey('payroll_runs.id'), index=True)
+    department_id = db.Column(db.Integer, db.ForeignKey('departments.id'), nullable=True)  # None: unassigned staff
+    status = db.Column(db.String(20), default='Pending')  # Pending, Running, Done, Failed
+    employees_paid = db.Column(db.Integer, default=0)
+    error = db.Column(db.Text, nullable=True)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 class Resource(db.Model):
     """Office resources and inventory model"""
     __tablename__ = 'resources'
+    __table_args__ = (
+        db.Index('ix_resources_status', 'status'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(64))
@@ -146,7 +245,7 @@ class Resource(db.Model):
     supplier = db.Column(db.String(64), nullable=True)
     notes = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     # Relationships
     allocations = db.relationship('ResourceAllocation', backref='resource')
@@ -164,7 +263,7 @@ class ResourceAllocation(db.Model):
     status = db.Column(db.String(20), default='Allocated')  # Allocated, Returned, Damaged
     notes = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     # Relationship
     employee = db.relationship('Employee', backref='resource_allocations')
@@ -185,6 +284,12 @@ class WorkflowStatus(enum.Enum):
 class Workflow(db.Model):
     """Workflow for approvals and requests"""
     __tablename__ = 'workflows'
+    __table_args__ = (
+        db.Index('ix_workflows_assignee_status', 'assignee_id', 'status'),
+        db.Index('ix_workflows_requester', 'requester_id'),
+        # The SLA sweep walks pending workflows oldest first
+        db.Index('ix_workflows_status_created', 'status', 'created_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     workflow_type = db.Column(db.Enum(WorkflowType))
@@ -194,11 +299,13 @@ class Workflow(db.Model):
     assignee_id = db.Column(db.Integer, db.ForeignKey('users.id'))
     status = db.Column(db.Enum(WorkflowStatus), default=WorkflowStatus.PENDING)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     completed_at = db.Column(db.DateTime, nullable=True)
+    current_step = db.Column(db.String(20), nullable=True)  # Approval step awaiting a decision
     
-    # Relationship
+    # Relationships
     requester = db.relationship('User', foreign_keys=[requester_id], backref='requested_workflows')
+    steps = db.relationship('WorkflowStep', backref='workflow', order_by='WorkflowStep.id')
     
     # Polymorphic configuration
     __mapper_args__ = {
@@ -233,20 +340,142 @@ class ExpenseClaim(Workflow):
         'polymorphic_identity': WorkflowType.EXPENSE_CLAIM,
     }
 
+class TravelRequest(Workflow):
+    """Travel request workflow model"""
+    __tablename__ = 'travel_requests'
+    
+    id = db.Column(db.Integer, db.ForeignKey('workflows.id'), primary_key=True)
+    destination = db.Column(db.String(128))
+    purpose = db.Column(db.Text)
+    start_date = db.Column(db.Date)
+    end_date = db.Column(db.Date)
+    estimated_cost = db.Column(db.Float)
+    
+    __mapper_args__ = {
+        'polymorphic_identity': WorkflowType.TRAVEL_REQUEST,
+    }
+
+class WorkflowStep(db.Model):
+    """One approval step of a workflow and who it is assigned to"""
+    __tablename__ = 'workflow_steps'
+    __table_args__ = (
+        # An approver's inbox is a range scan over their pending steps
+        db.Index('ix_workflow_steps_assignee_status', 'assignee_id', 'status', 'workflow_id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    workflow_id = db.Column(db.Integer, db.ForeignKey('workflows.id'), index=True)
+    step = db.Column(db.String(20))  # manager, hr, finance
+    assignee_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    status = db.Column(db.Enum(WorkflowStatus), default=WorkflowStatus.PENDING)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    assigned_at = db.Column(db.DateTime, default=datetime.utcnow)  # Reset when the step is escalated
+    reminded_at = db.Column(db.DateTime, nullable=True)
+    decided_at = db.Column(db.DateTime, nullable=True)
+
+class WorkflowReminder(db.Model):
+    """A reminder or escalation sent for an overdue approval step"""
+    __tablename__ = 'workflow_reminders'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    workflow_id = db.Column(db.Integer, db.ForeignKey('workflows.id'), index=True)
+    step_id = db.Column(db.Integer, db.ForeignKey('workflow_steps.id'))
+    kind = db.Column(db.String(20))  # reminder, escalation
+    recipient_id = db.Column(db.Integer, db.ForeignKey('users.id'), index=True)
+    previous_assignee_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# Workflow with its subclass tables outer-joined, so the columns of every
+# workflow type load with the base row instead of one query per row
+PolymorphicWorkflow = with_polymorphic(Workflow, [LeaveRequest, ExpenseClaim, TravelRequest])
+
 class FinancialTransaction(db.Model):
     """Financial transactions model"""
     __tablename__ = 'financial_transactions'
+    __table_args__ = (
+        db.Index('ix_financial_transactions_type_date', 'transaction_type', 'transaction_date'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
-    transaction_date = db.Column(db.Date, default=datetime.utcnow().date)
-    amount = db.Column(db.Float)
-    transaction_type = db.Column(db.String(20))  # Income, Expense, Transfer
-    category = db.Column(db.String(64))
+    # The daily rollup needs the old values of an update, so they are loaded
+    # before an expired transaction is changed (active_history)
+    transaction_date = db.column_property(db.Column(db.Date, default=datetime.utcnow().date), active_history=True)
+    amount = db.column_property(db.Column(db.Float), active_history=True)
+    transaction_type = db.column_property(db.Column(db.String(20)), active_history=True)  # Income, Expense, Transfer
+    category = db.column_property(db.Column(db.String(64)), active_history=True)
     description = db.Column(db.Text, nullable=True)
     reference_number = db.Column(db.String(64), nullable=True)
     created_by_id = db.Column(db.Integer, db.ForeignKey('users.id'))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     # Relationship
-    created_by = db.relationship('User', backref='financial_transactions')
\ No newline at end of file
+    created_by = db.relationship('User', backref='financial_transactions')
+
+class FinanceDailyRollup(db.Model):
+    """Daily totals of financial transactions per type and category"""
+    __tablename__ = 'finance_daily_rollups'
+    
+    rollup_date = db.Column(db.Date, primary_key=True)
+    transaction_type = db.Column(db.String(20), primary_key=True)
+    category = db.Column(db.String(64), primary_key=True)  # '' when uncategorized
+    total_amount = db.Column(db.Float, default=0, nullable=False)
+    transaction_count = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class ReportJob(db.Model):
+    """Background report computation and its cached result"""
+    __tablename__ = 'report_jobs'
+    
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex
+    report = db.Column(db.String(64))
+    params = db.Column(db.Text)  # canonical JSON
+    cache_key = db.Column(db.String(40), index=True)  # report, params and data version
+    status = db.Column(db.String(20), default='Pending')  # Pending, Running, Done, Failed
+    claim = db.Column(db.String(32), nullable=True)  # uuid4 hex of the run_job call computing it
+    result = db.Column(db.Text, nullable=True)
+    result_size = db.Column(db.Integer, default=0)
+    error = db.Column(db.Text, nullable=True)
+    requested_by_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class SchedulerLease(db.Model):
+    """Which process may run a periodic job until the lease expires"""
+    __tablename__ = 'scheduler_leases'
+    
+    name = db.Column(db.String(64), primary_key=True)
+    holder = db.Column(db.String(128))
+    expires_at = db.Column(db.DateTime)
+
+class TableVersion(db.Model):
+    """Write counter per table, used to fingerprint cached API responses"""
+    __tablename__ = 'table_versions'
+    
+    table_name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+def loader_profile(name):
+    """Eager-loading options for the relationships a serializer touches"""
+    # Backref attributes only exist once the mappers are configured
+    configure_mappers()
+    profiles = {
+        'employee_list': [
+            joinedload(Employee.user),
+            joinedload(Employee.department),
+        ],
+        'employee_detail': [
+            joinedload(Employee.user),
+            joinedload(Employee.department),
+            joinedload(Employee.manager).joinedload(Employee.user),
+        ],
+        'payroll': [joinedload(Payroll.user)],
+        'workflow': [
+            joinedload(PolymorphicWorkflow.requester),
+            joinedload(PolymorphicWorkflow.assigned_to),
+        ],
+        'transaction': [joinedload(FinancialTransaction.created_by)],
+    }
+    return profiles[name]
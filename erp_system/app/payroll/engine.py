@@ -0,0 +1,168 @@
+import numpy as np
+from flask import current_app
+from .. import db
+from ..employee.archive import attendance_source, hours_worked
+from ..models import Employee, Payroll
+from ..upsert import insert_on_conflict
+from ..versioning import bump_table_versions
+
+# Annual income brackets as (lower bound, marginal rate)
+DEFAULT_TAX_BRACKETS = [
+    (0, 0.0),
+    (12000, 0.2),
+    (50000, 0.3),
+    (150000, 0.4),
+]
+
+def payroll_settings():
+    """Calculation settings, read from the app config"""
+    config = current_app.config
+    return {
+        'periods_per_year': config.get('PAYROLL_PERIODS_PER_YEAR', 12),
+        'standard_hours': config.get('PAYROLL_STANDARD_HOURS', 8),
+        'annual_hours': config.get('PAYROLL_ANNUAL_HOURS', 2080),
+        'overtime_multiplier': config.get('PAYROLL_OVERTIME_MULTIPLIER', 1.5),
+        'insurance_rate': config.get('PAYROLL_INSURANCE_RATE', 0.05),
+        'tax_brackets': config.get('PAYROLL_TAX_BRACKETS', DEFAULT_TAX_BRACKETS),
+    }
+
+def compute_pay(salary, overtime_hours, settings):
+    """Compute pay components for whole arrays of employees at once.
+
+    salary is annual salary and overtime_hours the hours worked beyond the
+    standard day during the period, both as float arrays of equal length.
+    """
+    periods = settings['periods_per_year']
+    base = salary / periods
+    hourly = salary / settings['annual_hours']
+    overtime = overtime_hours * hourly * settings['overtime_multiplier']
+    gross = base + overtime
+
+    # Progressive tax on the annualised gross, then brought back to the period
+    annual = gross * periods
+    tax = np.zeros_like(annual)
+    brackets = settings['tax_brackets']
+    for i, (lower, rate) in enumerate(brackets):
+        upper = brackets[i + 1][0] if i + 1 < len(brackets) else np.inf
+        tax += np.clip(annual - lower, 0, upper - lower) * rate
+    tax /= periods
+
+    insurance = base * settings['insurance_rate']
+    return {
+        'base_salary': np.round(base, 2),
+        'overtime_pay': np.round(overtime, 2),
+        'tax_deduction': np.round(tax, 2),
+        'insurance_deduction': np.round(insurance, 2),
+        'net_pay': np.round(gross - tax - insurance, 2),
+    }
+
+def department_filter(department_ids):
+    """Filter employees by department; None in the list means no department"""
+    ids = [i for i in department_ids if i is not None]
+    clause = Employee.department_id.in_(ids)
+    if len(ids) < len(department_ids):
+        clause = db.or_(clause, Employee.department_id.is_(None))
+    return clause
+
+def load_pay_inputs(period_start, period_end, department_ids=None):
+    """Load employee ids, user ids, salaries and overtime hours as arrays.
+
+    Employees already paid for this period are left out, so a run can be
+    repeated without creating duplicate payroll rows.
+    """
+    already_paid = db.select(Payroll.user_id).where(
+        Payroll.pay_period_start == period_start,
+        Payroll.pay_period_end == period_end
+    )
+    query = db.select(Employee.id, Employee.user_id, Employee.salary).where(
+        Employee.employment_status != 'Resigned',
+        Employee.salary.isnot(None),
+        Employee.user_id.isnot(None),
+        Employee.user_id.notin_(already_paid)
+    )
+    if department_ids is not None:
+        query = query.where(department_filter(department_ids))
+    rows = db.session.execute(query.order_by(Employee.id)).all()
+    if not rows:
+        return None
+
+    employee_ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+    user_ids = np.fromiter((r[1] for r in rows), dtype=np.int64, count=len(rows))
+    salary = np.fromiter((r[2] for r in rows), dtype=np.float64, count=len(rows))
+
+    # Overtime is summed per employee in the database; only one row per
+    # employee with overtime comes back
+    attendance = attendance_source(period_start, period_end)
+    hours = hours_worked(attendance, db.session.get_bind().dialect.name)
+    standard = payroll_settings()['standard_hours']
+    overtime_query = db.select(
+        attendance.c.employee_id,
+        db.func.sum(db.case((hours > standard, hours - standard), else_=0))
+    ).where(
+        attendance.c.check_in.isnot(None),
+        attendance.c.check_out.isnot(None)
+    ).group_by(attendance.c.employee_id)
+    if department_ids is not None:
+        overtime_query = overtime_query.join(
+            Employee, Employee.id == attendance.c.employee_id
+        ).where(department_filter(department_ids))
+    overtime_rows = db.session.execute(overtime_query).all()
+
+    overtime_hours = np.zeros(len(rows))
+    if overtime_rows:
+        ot_ids = np.fromiter((r[0] for r in overtime_rows), dtype=np.int64, count=len(overtime_rows))
+        ot_hours = np.fromiter((r[1] or 0 for r in overtime_rows), dtype=np.float64, count=len(overtime_rows))
+        # employee_ids is sorted, so each overtime row can be placed by bisection
+        positions = np.minimum(np.searchsorted(employee_ids, ot_ids), len(employee_ids) - 1)
+        found = employee_ids[positions] == ot_ids
+        overtime_hours[positions[found]] = ot_hours[found]
+
+    return employee_ids, user_ids, salary, overtime_hours
+
+def insert_payroll_rows(user_ids, pay, period_start, period_end):
+    """Bulk-insert computed pay rows in chunks on the current transaction.
+
+    Rows that already exist for a user and period are skipped by the
+    uq_payrolls_user_period key, which makes resumed runs safe.
+    """
+    chunk_size = current_app.config.get('PAYROLL_INSERT_CHUNK', 5000)
+    columns = {name: values.tolist() for name, values in pay.items()}
+    user_ids = user_ids.tolist()
+    table = Payroll.__table__
+    statement = insert_on_conflict(db.session.connection(), table).on_conflict_do_nothing(
+        index_elements=[table.c.user_id, table.c.pay_period_start, table.c.pay_period_end]
+    )
+
+    for start in range(0, len(user_ids), chunk_size):
+        end = start + chunk_size
+        db.session.execute(statement, [
+            {
+                'user_id': user_ids[i],
+                'pay_period_start': period_start,
+                'pay_period_end': period_end,
+                'base_salary': columns['base_salary'][i],
+                'overtime_pay': columns['overtime_pay'][i],
+                'bonus': 0,
+                'tax_deduction': columns['tax_deduction'][i],
+                'insurance_deduction': columns['insurance_deduction'][i],
+                'other_deductions': 0,
+                'net_pay': columns['net_pay'][i],
+                'payment_status': 'Pending',
+            } for i in range(start, min(end, len(user_ids)))
+        ])
+    bump_table_versions(db.session.connection(), ['payrolls'])
+
+def generate_payroll(period_start, period_end, department_ids=None):
+    """Compute and store pay for the period in one transaction.
+
+    Returns the number of employees paid.
+    """
+    inputs = load_pay_inputs(period_start, period_end, department_ids)
+    if inputs is None:
+        return 0
+
+    _, user_ids, salary, overtime_hours = inputs
+    pay = compute_pay(salary, overtime_hours, payroll_settings())
+    insert_payroll_rows(user_ids, pay, period_start, period_end)
+    db.session.commit()
+    return len(user_ids)
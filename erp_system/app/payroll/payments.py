@@ -0,0 +1,92 @@
+from datetime import datetime
+from .. import db
+from ..models import Employee, Payroll, PayrollRun, User
+from ..versioning import bump_table_versions
+from .engine import department_filter
+
+def is_id(value):
+    if isinstance(value, str):
+        return value.isdigit()
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def id_list(value, name, allow_none=False):
+    """Read an id or a list of ids from a request argument.
+
+    With allow_none, null may stand in the list for "no department".
+    """
+    values = value if isinstance(value, list) else [value]
+    if not all(is_id(v) or (allow_none and v is None) for v in values):
+        raise ValueError(f'{name} must be an id or a list of ids')
+    return [None if v is None else int(v) for v in values]
+
+def payment_filters(args):
+    """Build the WHERE clauses selecting payrolls for a batch payment.
+
+    args may name a pay run (run_id), a pay period, departments or explicit
+    payroll ids; at least one of them is required.
+    """
+    clauses = []
+    if args.get('run_id'):
+        run_ids = id_list(args['run_id'], 'run_id')
+        if len(run_ids) != 1:
+            raise ValueError('run_id must be a single id')
+        run = db.get_or_404(PayrollRun, run_ids[0])
+        clauses += [Payroll.pay_period_start == run.pay_period_start,
+                    Payroll.pay_period_end == run.pay_period_end]
+    if args.get('pay_period_start'):
+        start = datetime.strptime(args['pay_period_start'], '%Y-%m-%d').date()
+        clauses.append(Payroll.pay_period_start == start)
+    if args.get('pay_period_end'):
+        end = datetime.strptime(args['pay_period_end'], '%Y-%m-%d').date()
+        clauses.append(Payroll.pay_period_end == end)
+    if args.get('department_id'):
+        department_ids = id_list(args['department_id'], 'department_id', allow_none=True)
+        clauses.append(Payroll.user_id.in_(
+            db.select(Employee.user_id).where(department_filter(department_ids))
+        ))
+    if args.get('payroll_id'):
+        clauses.append(Payroll.id.in_(id_list(args['payroll_id'], 'payroll_id')))
+    if not clauses:
+        raise ValueError('Select payrolls by run_id, pay period, department_id or payroll_id')
+    return clauses
+
+def mark_paid(clauses):
+    """Mark every pending payroll matching clauses as Paid in one UPDATE.
+
+    All rows in the batch share one payment_date, which identifies the batch
+    for its bank file. Returns the updated ids and that payment_date.
+    """
+    payment_date = datetime.utcnow()
+    result = db.session.execute(
+        db.update(Payroll)
+        .where(Payroll.payment_status == 'Pending', *clauses)
+        .values(payment_status='Paid', payment_date=payment_date, updated_at=payment_date)
+        .returning(Payroll.id)
+        .execution_options(synchronize_session=False)
+    )
+    ids = sorted(result.scalars().all())
+    if ids:
+        bump_table_versions(db.session.connection(), ['payrolls'])
+    db.session.commit()
+    return ids, payment_date
+
+def bank_file_statement(payment_date):
+    """Select the payment lines of the batch paid at payment_date"""
+    return db.select(
+        Payroll.id.label('payroll_id'),
+        Employee.id.label('employee_id'),
+        User.first_name,
+        User.last_name,
+        User.email,
+        Payroll.net_pay.label('amount'),
+        Payroll.pay_period_start,
+        Payroll.pay_period_end,
+        Payroll.payment_date
+    ).join(
+        User, User.id == Payroll.user_id
+    ).outerjoin(
+        Employee, Employee.user_id == Payroll.user_id
+    ).where(
+        Payroll.payment_date == payment_date,
+        Payroll.payment_status == 'Paid'
+    ).order_by(Payroll.id)
@@ -2,7 +2,10 @@ from flask import render_template, redirect, url_for, flash, request, jsonify
 from flask_login import login_required, current_user
 from . import payroll_bp
 from .. import db
-from ..models import User, Employee, Payroll, UserRole
+from ..models import User, Employee, Payroll, PayrollRun, UserRole
+from .payments import bank_file_statement, mark_paid, payment_filters
+from .runs import claim_resume, create_payroll_run, run_progress, start_run
+from ..api.export import stream_export
 from datetime import datetime
 
 @payroll_bp.route('/')
@@ -12,7 +15,13 @@ def index():
     if current_user.role in [UserRole.ADMIN, UserRole.FINANCE, UserRole.HR]:
         # Admin, finance and HR can see all payrolls
         payrolls = Payroll.query.all()
-        return render_template('payroll/index.html', payrolls=payrolls, title='Payroll Management')
+        payroll_runs = PayrollRun.query.order_by(PayrollRun.id.desc()).limit(5).all()
+        return render_template(
+            'payroll/index.html',
+            payrolls=payrolls,
+            payroll_runs=[run_progress(run) for run in payroll_runs],
+            title='Payroll Management'
+        )
     else:
         # Regular employees can only see their own payroll
         payrolls = Payroll.query.filter_by(user_id=current_user.id).all()
@@ -27,8 +36,21 @@ def generate():
         return redirect(url_for('payroll.index'))
     
     if request.method == 'POST':
-        # Implementation for payroll generation
-        flash('Payroll generated successfully', 'success')
+        try:
+            period_start = datetime.strptime(request.form.get('pay_period_start'), '%Y-%m-%d').date()
+            period_end = datetime.strptime(request.form.get('pay_period_end'), '%Y-%m-%d').date()
+        except (TypeError, ValueError):
+            flash('Pay period dates must be formatted as YYYY-MM-DD', 'danger')
+            return redirect(url_for('payroll.generate'))
+        
+        if period_end < period_start:
+            flash('Pay period end must not be before its start', 'danger')
+            return redirect(url_for('payroll.generate'))
+        
+        run = create_payroll_run(period_start, period_end, current_user.id)
+        start_run(run.id)
+        
+        flash(f'Payroll run #{run.id} started for {len(run.partitions)} departments', 'success')
         return redirect(url_for('payroll.index'))
     
     employees = Employee.query.all()
@@ -66,16 +88,100 @@ def process_payment(payroll_id):
     if current_user.role not in [UserRole.ADMIN, UserRole.FINANCE]:
         return jsonify({'success': False, 'message': 'Permission denied'}), 403
     
-    payroll = Payroll.query.get_or_404(payroll_id)
-    payroll.payment_status = 'Paid'
-    payroll.payment_date = datetime.utcnow()
+    # The user is loaded with the payroll, not lazily for the message
+    payroll = Payroll.query.options(db.joinedload(Payroll.user)).filter_by(id=payroll_id).first_or_404()
     
-    db.session.commit()
+    # Paid through the same conditional UPDATE as a batch, so a payroll that
+    # is no longer Pending is never paid twice or moved to another batch
+    ids, payment_date = mark_paid([Payroll.id == payroll_id])
+    if not ids:
+        db.session.refresh(payroll)
+        return jsonify({
+            'success': False,
+            'message': f'Payroll is already {payroll.payment_status}',
+            'payroll_id': payroll.id,
+            'status': payroll.payment_status
+        }), 409
     
     return jsonify({
         'success': True,
         'message': f'Payment processed for {payroll.user.first_name} {payroll.user.last_name}',
         'payroll_id': payroll.id,
-        'status': payroll.payment_status,
-        'payment_date': payroll.payment_date.strftime('%Y-%m-%d %H:%M:%S')
-    })
\ No newline at end of file
+        'status': 'Paid',
+        'payment_date': payment_date.strftime('%Y-%m-%d %H:%M:%S'),
+        'bank_file': url_for('payroll.bank_file', payment_date=payment_date.isoformat())
+    })
+
+@payroll_bp.route('/process', methods=['POST'])
+@login_required
+def process_payments():
+    """Mark a pay run or a filtered set of payrolls as paid in one batch"""
+    if current_user.role not in [UserRole.ADMIN, UserRole.FINANCE]:
+        return jsonify({'success': False, 'message': 'Permission denied'}), 403
+    
+    data = request.get_json(silent=True)
+    if data is None:
+        data = {key: request.form.get(key) for key in ['run_id', 'pay_period_start', 'pay_period_end']}
+        data['department_id'] = request.form.getlist('department_id', type=int)
+        data['payroll_id'] = request.form.getlist('payroll_id', type=int)
+    
+    try:
+        clauses = payment_filters(data)
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    ids, payment_date = mark_paid(clauses)
+    return jsonify({
+        'success': True,
+        'message': f'Payment processed for {len(ids)} payrolls',
+        'payroll_ids': ids,
+        'payment_date': payment_date.isoformat(),
+        'bank_file': url_for('payroll.bank_file', payment_date=payment_date.isoformat()) if ids else None
+    })
+
+@payroll_bp.route('/bank-file')
+@login_required
+def bank_file():
+    """Stream the bank payment file of a payment batch as CSV"""
+    if current_user.role not in [UserRole.ADMIN, UserRole.FINANCE]:
+        return jsonify({'success': False, 'message': 'Permission denied'}), 403
+    
+    try:
+        payment_date = datetime.fromisoformat(request.args.get('payment_date', ''))
+    except ValueError:
+        return jsonify({'success': False, 'message': 'payment_date must be an ISO timestamp'}), 400
+    
+    filename = f"bank-payments-{payment_date.strftime('%Y%m%d%H%M%S')}"
+    return stream_export(bank_file_statement(payment_date), 'csv', filename)
+
+@payroll_bp.route('/runs/<int:run_id>')
+@login_required
+def run_status(run_id):
+    """Progress of a payroll run, polled by the payroll dashboard"""
+    if current_user.role not in [UserRole.ADMIN, UserRole.FINANCE, UserRole.HR]:
+        return jsonify({'success': False, 'message': 'Permission denied'}), 403
+    
+    run = PayrollRun.query.get_or_404(run_id)
+    return jsonify(run_progress(run))
+
+@payroll_bp.route('/runs/<int:run_id>/resume', methods=['POST'])
+@login_required
+def resume_run(run_id):
+    """Resume an interrupted payroll run from its unfinished partitions"""
+    if current_user.role not in [UserRole.ADMIN, UserRole.FINANCE, UserRole.HR]:
+        return jsonify({'success': False, 'message': 'Permission denied'}), 403
+    
+    run = PayrollRun.query.get_or_404(run_id)
+    if not claim_resume(run.id):
+        db.session.refresh(run)
+        message = ('Payroll run already completed' if run.status == 'Done'
+                   else f'Payroll run is {run.status.lower()} and has not been interrupted')
+        return jsonify({'success': False, 'message': message, 'run': run_progress(run)}), 409
+    
+    start_run(run.id)
+    db.session.expire_all()
+    return jsonify({
+        'success': True,
+        'message': f'Payroll run #{run.id} resumed',
+        'run': run_progress(run)
+    })
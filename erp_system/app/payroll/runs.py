@@ -0,0 +1,170 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from .. import db
+from ..models import Department, Employee, PayrollRun, PayrollRunPartition
+from .engine import generate_payroll
+
+# App instance of a pool worker process, created once by _init_worker
+_worker_app = None
+
+def create_payroll_run(period_start, period_end, user_id):
+    """Create a run with one pending partition per department"""
+    run = PayrollRun(
+        pay_period_start=period_start,
+        pay_period_end=period_end,
+        status='Pending',
+        created_by_id=user_id
+    )
+    db.session.add(run)
+
+    department_ids = db.session.scalars(db.select(Department.id).order_by(Department.id)).all()
+    has_unassigned = db.session.scalar(
+        db.select(Employee.id).where(Employee.department_id.is_(None)).limit(1)
+    ) is not None
+    if has_unassigned:
+        department_ids.append(None)
+
+    run.partitions = [PayrollRunPartition(department_id=d, status='Pending') for d in department_ids]
+    db.session.commit()
+    return run
+
+def run_partition(partition_id):
+    """Compute and commit one partition; safe to call again after a crash.
+
+    The partition is claimed by moving it from Pending to Running in one
+    UPDATE, so a partition picked up by two executors is computed once.
+    """
+    partitions = PayrollRunPartition.__table__
+    claimed = db.session.execute(
+        partitions.update()
+        .where(partitions.c.id == partition_id, partitions.c.status == 'Pending')
+        .values(status='Running', started_at=datetime.utcnow(), error=None)
+    ).rowcount
+    db.session.commit()
+    if not claimed:
+        return
+
+    partition = db.session.get(PayrollRunPartition, partition_id)
+    run = partition.run
+    try:
+        paid = generate_payroll(run.pay_period_start, run.pay_period_end, [partition.department_id])
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.exception('Payroll partition %s failed', partition_id)
+        partition.status = 'Failed'
+        partition.error = str(e)
+    else:
+        partition.status = 'Done'
+        partition.employees_paid = (partition.employees_paid or 0) + paid
+    partition.finished_at = datetime.utcnow()
+    db.session.commit()
+
+def _init_worker(config):
+    global _worker_app
+    from .. import create_app
+    _worker_app = create_app(config)
+
+def _run_partition_in_worker(partition_id):
+    with _worker_app.app_context():
+        run_partition(partition_id)
+
+def _worker_config(app):
+    """The config a pool worker needs to rebuild the app"""
+    return {key: value for key, value in app.config.items()
+            if key == 'SQLALCHEMY_DATABASE_URI' or key.startswith('PAYROLL_')}
+
+def execute_run(app, run_id):
+    """Run every unfinished partition of a run and record the outcome"""
+    with app.app_context():
+        run = db.session.get(PayrollRun, run_id)
+        run.status = 'Running'
+        db.session.commit()
+
+        pending = [p.id for p in run.partitions if p.status == 'Pending']
+        workers = app.config.get('PAYROLL_RUN_WORKERS', 4)
+        if workers and len(pending) > 1:
+            # spawn avoids inheriting the parent's database connections
+            with ProcessPoolExecutor(
+                max_workers=min(workers, len(pending)),
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(_worker_config(app),)
+            ) as pool:
+                list(pool.map(_run_partition_in_worker, pending))
+        else:
+            for partition_id in pending:
+                run_partition(partition_id)
+
+        db.session.expire_all()
+        run = db.session.get(PayrollRun, run_id)
+        run.status = 'Done' if all(p.status == 'Done' for p in run.partitions) else 'Failed'
+        run.finished_at = datetime.utcnow()
+        db.session.commit()
+
+def stale_before():
+    """Runs with no activity since this time are presumed interrupted"""
+    timeout = current_app.config.get('PAYROLL_RUN_TIMEOUT', 3600)
+    return datetime.utcnow() - timedelta(seconds=timeout)
+
+def claim_resume(run_id):
+    """Take over a failed or interrupted run so it can be resumed.
+
+    A run is interrupted when it is still Pending or Running but neither it
+    nor any of its partitions has changed for PAYROLL_RUN_TIMEOUT seconds,
+    as happens when the process executing it dies. The run is claimed in
+    one conditional UPDATE, so concurrent resumes cannot both succeed, and
+    its unfinished partitions go back to Pending. Returns True if claimed.
+    """
+    runs = PayrollRun.__table__
+    partitions = PayrollRunPartition.__table__
+    stale = stale_before()
+    active = db.exists().where(partitions.c.run_id == runs.c.id, partitions.c.updated_at >= stale)
+    claimed = db.session.execute(
+        runs.update()
+        .where(runs.c.id == run_id, db.or_(
+            runs.c.status == 'Failed',
+            db.and_(runs.c.status.in_(['Pending', 'Running']), runs.c.updated_at < stale, ~active)
+        ))
+        .values(status='Running', finished_at=None)
+    ).rowcount
+    if claimed:
+        db.session.execute(
+            partitions.update()
+            .where(partitions.c.run_id == run_id, partitions.c.status.in_(['Running', 'Failed']))
+            .values(status='Pending')
+        )
+    db.session.commit()
+    return bool(claimed)
+
+def start_run(run_id):
+    """Execute a run in the background so the request can return at once"""
+    app = current_app._get_current_object()
+    if app.config.get('PAYROLL_RUNS_SYNC'):
+        execute_run(app, run_id)
+    else:
+        threading.Thread(target=execute_run, args=(app, run_id), daemon=True).start()
+
+def run_progress(run):
+    """Progress of a run as a JSON-serializable dict"""
+    partitions = run.partitions
+    done = sum(1 for p in partitions if p.status == 'Done')
+    return {
+        'id': run.id,
+        'period': f"{run.pay_period_start.strftime('%Y-%m-%d')} to {run.pay_period_end.strftime('%Y-%m-%d')}",
+        'status': run.status,
+        'partitions_total': len(partitions),
+        'partitions_done': done,
+        'employees_paid': sum(p.employees_paid or 0 for p in partitions),
+        'partitions': [
+            {
+                'id': p.id,
+                'department_id': p.department_id,
+                'status': p.status,
+                'employees_paid': p.employees_paid,
+                'error': p.error
+            } for p in partitions
+        ]
+    }
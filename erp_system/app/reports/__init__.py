@@ -0,0 +1,5 @@
+from flask import Blueprint
+
+reports_bp = Blueprint('reports', __name__, url_prefix='/reports')
+
+from . import routes
\ No newline at end of file
@@ -0,0 +1,89 @@
+from datetime import date, datetime
+from .. import db
+from ..models import Payroll, UserRole
+from ..finance.rollup import rollup_summary
+
+def parse_date_range(args, max_days=None):
+    """Parse start_date/end_date (YYYY-MM-DD) from the submitted parameters"""
+    try:
+        start_date = datetime.strptime(args.get('start_date'), '%Y-%m-%d').date()
+        end_date = datetime.strptime(args.get('end_date'), '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        # JSON bodies can carry numbers or nulls where strings belong
+        raise ValueError('start_date and end_date must be formatted as YYYY-MM-DD')
+    if end_date < start_date:
+        raise ValueError('end_date must not be before start_date')
+    if max_days and (end_date - start_date).days + 1 > max_days:
+        raise ValueError(f'Reports are limited to {max_days} days')
+    return {'start_date': start_date.isoformat(), 'end_date': end_date.isoformat()}
+
+def income_expense(params):
+    """Income vs expense totals and category breakdowns"""
+    summary = rollup_summary(date.fromisoformat(params['start_date']),
+                             date.fromisoformat(params['end_date']))
+    total_income = sum(summary['Income'].values())
+    total_expenses = sum(summary['Expense'].values())
+    return {
+        'start_date': params['start_date'],
+        'end_date': params['end_date'],
+        'total_income': total_income,
+        'total_expenses': total_expenses,
+        'net_profit': total_income - total_expenses,
+        'income_by_category': summary['Income'],
+        'expense_by_category': summary['Expense'],
+    }
+
+def payroll_summary(params):
+    """Payroll totals per pay period ending in the range"""
+    rows = db.session.execute(
+        db.select(
+            Payroll.pay_period_start,
+            Payroll.pay_period_end,
+            db.func.count(Payroll.id),
+            db.func.sum(Payroll.base_salary),
+            db.func.sum(Payroll.overtime_pay),
+            db.func.sum(Payroll.bonus),
+            db.func.sum(Payroll.tax_deduction + Payroll.insurance_deduction + Payroll.other_deductions),
+            db.func.sum(Payroll.net_pay),
+            db.func.sum(db.case((Payroll.payment_status == 'Paid', 1), else_=0))
+        ).where(
+            Payroll.pay_period_end >= date.fromisoformat(params['start_date']),
+            Payroll.pay_period_end <= date.fromisoformat(params['end_date'])
+        ).group_by(
+            Payroll.pay_period_start, Payroll.pay_period_end
+        ).order_by(Payroll.pay_period_end)
+    ).all()
+
+    return {
+        'start_date': params['start_date'],
+        'end_date': params['end_date'],
+        'periods': [
+            {
+                'period': f"{start.strftime('%Y-%m-%d')} to {end.strftime('%Y-%m-%d')}",
+                'employees': count,
+                'base_salary': base or 0,
+                'overtime': overtime or 0,
+                'bonus': bonus or 0,
+                'deductions': deductions or 0,
+                'net_pay': net or 0,
+                'paid': paid or 0,
+            } for start, end, count, base, overtime, bonus, deductions, net, paid in rows
+        ]
+    }
+
+# Reports that can run as background jobs. tables lists what each report
+# reads, so a cached result is reused only while those tables are unchanged.
+REPORTS = {
+    'income_expense': {
+        'run': income_expense,
+        'parse': parse_date_range,
+        'tables': ['finance_daily_rollups'],
+        'roles': [UserRole.ADMIN, UserRole.FINANCE],
+    },
+    'payroll_summary': {
+        'run': payroll_summary,
+        'parse': parse_date_range,
+        'tables': ['payrolls'],
+        'roles': [UserRole.ADMIN, UserRole.FINANCE, UserRole.HR],
+    },
+}
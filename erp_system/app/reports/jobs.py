@@ -0,0 +1,181 @@
+import hashlib
+import json
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from .. import db
+from ..models import ReportJob
+from ..versioning import get_table_versions
+from .definitions import REPORTS
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor():
+    """Lazily create the worker pool shared by this process"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=current_app.config.get('REPORT_WORKERS', 2),
+                thread_name_prefix='report-job'
+            )
+        return _executor
+
+def make_cache_key(report, params):
+    """Key a report result by its name, parameters and the data it reads"""
+    versions = get_table_versions(REPORTS[report]['tables'])
+    fingerprint = json.dumps({
+        'report': report,
+        'params': params,
+        'versions': {name: version for name, (version, _) in versions.items()},
+    }, sort_keys=True)
+    return hashlib.sha1(fingerprint.encode()).hexdigest()
+
+def stale_before():
+    """Pending or Running jobs untouched since this time are presumed lost.
+
+    A running job refreshes its updated_at while it computes, so only a job
+    whose worker died goes stale.
+    """
+    timeout = current_app.config.get('REPORT_JOB_TIMEOUT', 900)
+    return datetime.utcnow() - timedelta(seconds=timeout)
+
+def prune_jobs():
+    """Fail jobs orphaned by a dead worker, evict finished jobs older than the
+    cache age, then the oldest results until the cached results fit in the
+    configured size"""
+    max_age = current_app.config.get('REPORT_CACHE_MAX_AGE', 3600)
+    max_bytes = current_app.config.get('REPORT_CACHE_MAX_BYTES', 50 * 1024 * 1024)
+
+    # A worker that crashed or restarted never finishes its jobs
+    db.session.execute(
+        db.update(ReportJob).where(
+            ReportJob.status.in_(['Pending', 'Running']),
+            ReportJob.updated_at < stale_before()
+        ).values(status='Failed', error='Timed out', finished_at=datetime.utcnow())
+    )
+
+    cutoff = datetime.utcnow() - timedelta(seconds=max_age)
+    db.session.execute(
+        db.delete(ReportJob).where(
+            ReportJob.created_at < cutoff,
+            ReportJob.status.in_(['Done', 'Failed'])
+        )
+    )
+
+    total = db.session.scalar(
+        db.select(db.func.coalesce(db.func.sum(ReportJob.result_size), 0))
+        .where(ReportJob.status == 'Done')
+    )
+    if total > max_bytes:
+        oldest = db.session.execute(
+            db.select(ReportJob.id, ReportJob.result_size)
+            .where(ReportJob.status == 'Done')
+            .order_by(ReportJob.created_at)
+        )
+        evict = []
+        for job_id, size in oldest:
+            if total <= max_bytes:
+                break
+            evict.append(job_id)
+            total -= size or 0
+        db.session.execute(db.delete(ReportJob).where(ReportJob.id.in_(evict)))
+    db.session.commit()
+
+def submit_job(report, params, user_id):
+    """Return a job for the report, reusing a cached or live in-flight one if possible"""
+    prune_jobs()
+    cache_key = make_cache_key(report, params)
+    max_age = current_app.config.get('REPORT_CACHE_MAX_AGE', 3600)
+
+    existing = ReportJob.query.filter(
+        ReportJob.cache_key == cache_key,
+        db.or_(
+            db.and_(ReportJob.status == 'Done',
+                    ReportJob.created_at >= datetime.utcnow() - timedelta(seconds=max_age)),
+            db.and_(ReportJob.status.in_(['Pending', 'Running']),
+                    ReportJob.updated_at >= stale_before())
+        )
+    ).order_by(ReportJob.created_at.desc()).first()
+    if existing:
+        return existing
+
+    job = ReportJob(
+        id=uuid.uuid4().hex,
+        report=report,
+        params=json.dumps(params, sort_keys=True),
+        cache_key=cache_key,
+        status='Pending',
+        requested_by_id=user_id
+    )
+    db.session.add(job)
+    db.session.commit()
+
+    if current_app.config.get('REPORT_JOBS_SYNC'):
+        run_job(current_app._get_current_object(), job.id)
+        # run_job commits through its own session
+        db.session.refresh(job)
+    else:
+        get_executor().submit(run_job, current_app._get_current_object(), job.id)
+    return job
+
+def _heartbeat(app, job_id, claim, stop):
+    """Keep a running job's updated_at fresh until stop is set"""
+    jobs = ReportJob.__table__
+    interval = app.config.get('REPORT_JOB_TIMEOUT', 900) / 3
+    with app.app_context():
+        while not stop.wait(interval):
+            db.session.execute(
+                jobs.update()
+                .where(jobs.c.id == job_id, jobs.c.status == 'Running', jobs.c.claim == claim)
+                .values(updated_at=datetime.utcnow())
+            )
+            db.session.commit()
+
+def run_job(app, job_id):
+    """Compute a report job in its own app context and store the result.
+
+    The job is claimed by moving it from Pending to Running in one UPDATE,
+    and its result is only stored while it is still Running under that
+    claim, so a job failed by prune_jobs is never overwritten.
+    """
+    jobs = ReportJob.__table__
+    claim = uuid.uuid4().hex
+    with app.app_context():
+        # Jobs that timed out while queued were failed by prune_jobs
+        claimed = db.session.execute(
+            jobs.update()
+            .where(jobs.c.id == job_id, jobs.c.status == 'Pending')
+            .values(status='Running', claim=claim)
+        ).rowcount
+        db.session.commit()
+        if not claimed:
+            return
+        job = db.session.get(ReportJob, job_id)
+
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=_heartbeat, args=(app, job_id, claim, stop), daemon=True)
+        heartbeat.start()
+        try:
+            result = json.dumps(REPORTS[job.report]['run'](json.loads(job.params)))
+        except Exception as e:
+            db.session.rollback()
+            app.logger.exception('Report job %s failed', job_id)
+            values = {'status': 'Failed', 'error': str(e)}
+        else:
+            values = {'status': 'Done', 'result': result, 'result_size': len(result)}
+        finally:
+            stop.set()
+            heartbeat.join()
+
+        finished = db.session.execute(
+            jobs.update()
+            .where(jobs.c.id == job_id, jobs.c.status == 'Running', jobs.c.claim == claim)
+            .values(finished_at=datetime.utcnow(), **values)
+        ).rowcount
+        db.session.commit()
+        if not finished:
+            app.logger.warning('Report job %s was failed before it finished; result discarded', job_id)
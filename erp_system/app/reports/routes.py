@@ -0,0 +1,70 @@
+from flask import current_app, jsonify, request, url_for, Response
+from flask_login import login_required, current_user
+from . import reports_bp
+from ..models import ReportJob
+from .definitions import REPORTS
+from .jobs import submit_job
+
+def serialize_job(job):
+    return {
+        'job_id': job.id,
+        'report': job.report,
+        'status': job.status,
+        'error': job.error,
+        'created_at': job.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+        'finished_at': job.finished_at.strftime('%Y-%m-%d %H:%M:%S') if job.finished_at else None,
+        'status_url': url_for('reports.job_status', job_id=job.id),
+        'result_url': url_for('reports.job_result', job_id=job.id) if job.status == 'Done' else None
+    }
+
+def _get_job(job_id):
+    """Load a job the current user may see, or return an error response"""
+    job = ReportJob.query.get_or_404(job_id)
+    if current_user.role not in REPORTS[job.report]['roles']:
+        return None, (jsonify({'error': 'Permission denied'}), 403)
+    return job, None
+
+@reports_bp.route('/jobs', methods=['POST'])
+@login_required
+def submit():
+    """Submit a report to be computed in the background"""
+    args = request.get_json(silent=True) or request.form
+    report = args.get('report')
+    if report not in REPORTS:
+        return jsonify({'error': 'Unknown report'}), 400
+    if current_user.role not in REPORTS[report]['roles']:
+        return jsonify({'error': 'Permission denied'}), 403
+    
+    try:
+        params = REPORTS[report]['parse'](
+            args, max_days=current_app.config.get('FINANCE_REPORT_MAX_DAYS', 366)
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    job = submit_job(report, params, current_user.id)
+    return jsonify(serialize_job(job)), 200 if job.status == 'Done' else 202
+
+@reports_bp.route('/jobs/<job_id>', methods=['GET'])
+@login_required
+def job_status(job_id):
+    """Poll the status of a report job"""
+    job, error = _get_job(job_id)
+    if error:
+        return error
+    return jsonify(serialize_job(job))
+
+@reports_bp.route('/jobs/<job_id>/result', methods=['GET'])
+@login_required
+def job_result(job_id):
+    """Download the result of a finished report job"""
+    job, error = _get_job(job_id)
+    if error:
+        return error
+    if job.status != 'Done':
+        return jsonify(serialize_job(job)), 409
+    
+    response = Response(job.result, mimetype='application/json')
+    if request.args.get('download'):
+        response.headers['Content-Disposition'] = f'attachment; filename={job.report}-{job.id}.json'
+    return response
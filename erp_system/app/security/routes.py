@@ -4,6 +4,7 @@ from werkzeug.security import generate_password_hash
 from . import security_bp
 from .. import db
 from ..models import User, UserRole
+from ..workflow.approvers import approver_index
 from functools import wraps
 
 def admin_required(f):
@@ -57,6 +58,7 @@ def edit_user(user_id):
         user.is_active = 'is_active' in request.form
         
         db.session.commit()
+        approver_index.clear()
         flash('User updated successfully', 'success')
         return redirect(url_for('security.users'))
     
@@ -81,6 +83,7 @@ def deactivate_user(user_id):
     
     user.is_active = False
     db.session.commit()
+    approver_index.clear()
     
     return jsonify({
         'success': True,
@@ -96,6 +99,7 @@ def activate_user(user_id):
     user = User.query.get_or_404(user_id)
     user.is_active = True
     db.session.commit()
+    approver_index.clear()
     
     return jsonify({
         'success': True,
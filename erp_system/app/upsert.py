@@ -0,0 +1,10 @@
+from sqlalchemy.dialects import postgresql, sqlite
+
+def insert_on_conflict(connection, table):
+    """Dialect-specific INSERT that supports ON CONFLICT clauses.
+
+    PostgreSQL runs in production and SQLite in development; both accept the
+    same on_conflict_do_update / on_conflict_do_nothing API.
+    """
+    dialect = postgresql if connection.dialect.name == 'postgresql' else sqlite
+    return dialect.insert(table)
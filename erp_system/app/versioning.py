@@ -0,0 +1,50 @@
+from datetime import datetime
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from . import db
+from .models import TableVersion
+from .upsert import insert_on_conflict
+
+# Tables whose contents are served from the API response cache. Other tables
+# (attendance in particular) are left out so busy write paths do not contend
+# on a shared counter row.
+VERSIONED_TABLES = {
+    'users', 'departments', 'employees', 'payrolls', 'resources',
+    'workflows', 'leave_requests', 'expense_claims', 'travel_requests', 'financial_transactions',
+    'finance_daily_rollups',
+}
+
+def bump_table_versions(connection, tables):
+    """Increment the write counter of each versioned table in tables"""
+    tables = sorted(set(tables) & VERSIONED_TABLES)
+    if not tables:
+        return
+
+    now = datetime.utcnow()
+    table = TableVersion.__table__
+    for name in tables:
+        stmt = insert_on_conflict(connection, table).values(table_name=name, version=1, updated_at=now)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.table_name],
+            set_={'version': table.c.version + 1, 'updated_at': now}
+        )
+        connection.execute(stmt)
+
+def get_table_versions(tables):
+    """Return {table: (version, updated_at)} for the given tables in one query"""
+    rows = db.session.execute(
+        db.select(TableVersion.table_name, TableVersion.version, TableVersion.updated_at)
+        .where(TableVersion.table_name.in_(tables))
+    ).all()
+    versions = {name: (0, None) for name in tables}
+    versions.update({row.table_name: (row.version, row.updated_at) for row in rows})
+    return versions
+
+@event.listens_for(Session, 'after_flush')
+def _bump_flushed_tables(session, flush_context):
+    """Bump the counters of every table written by this flush"""
+    tables = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        tables.update(table.name for table in inspect(obj).mapper.tables)
+    if tables & VERSIONED_TABLES:
+        bump_table_versions(session.connection(), tables)
@@ -0,0 +1,160 @@
+from collections import namedtuple
+from datetime import datetime
+import click
+from flask import current_app
+from . import workflow_bp
+from .approvers import resolve_approver, resolve_approvers
+from .. import db
+from ..employee.identity import employee_resolver
+from ..models import (PolymorphicWorkflow, UserRole, Workflow, WorkflowStatus, WorkflowStep,
+                      WorkflowType)
+
+# One step of an approval chain. roles approve it, tried in order; a manager
+# step goes to the requester's manager first. applies(workflow) decides
+# whether the step is needed, None meaning always.
+ApprovalStep = namedtuple('ApprovalStep', ['name', 'roles', 'applies'])
+
+# The state of a workflow that has not entered its chain yet
+START = 'start'
+
+def large_amount(workflow):
+    """Whether an expense claim or travel request needs the long chain"""
+    amount = getattr(workflow, 'amount', None) or getattr(workflow, 'estimated_cost', None) or 0
+    return amount >= current_app.config.get('WORKFLOW_LARGE_AMOUNT', 1000)
+
+APPROVAL_CHAINS = {
+    WorkflowType.LEAVE_REQUEST: [
+        ApprovalStep('manager', (UserRole.HR, UserRole.ADMIN), None),
+    ],
+    WorkflowType.EXPENSE_CLAIM: [
+        ApprovalStep('manager', (UserRole.HR, UserRole.ADMIN), large_amount),
+        ApprovalStep('hr', (UserRole.HR, UserRole.ADMIN), large_amount),
+        ApprovalStep('finance', (UserRole.FINANCE, UserRole.ADMIN), None),
+    ],
+    WorkflowType.TRAVEL_REQUEST: [
+        ApprovalStep('manager', (UserRole.HR, UserRole.ADMIN), None),
+        ApprovalStep('hr', (UserRole.HR, UserRole.ADMIN), large_amount),
+        ApprovalStep('finance', (UserRole.FINANCE, UserRole.ADMIN), None),
+    ],
+}
+
+def compile_transitions(chains):
+    """Turn approval chains into {(workflow_type, state): candidate next steps}.
+
+    An approval in a state moves the workflow to the first candidate that
+    applies to it, or completes it when none does. States missing from the
+    table, such as workflows created before their type had a chain, have
+    no further steps.
+    """
+    transitions = {}
+    for workflow_type, steps in chains.items():
+        states = [START] + [step.name for step in steps]
+        for i, state in enumerate(states):
+            transitions[(workflow_type, state)] = tuple(steps[i:])
+    return transitions
+
+TRANSITIONS = compile_transitions(APPROVAL_CHAINS)
+
+def next_step(workflow, state):
+    """The step an approval in state leads to, or None if it completes the workflow"""
+    for step in TRANSITIONS.get((workflow.workflow_type, state), ()):
+        if step.applies is None or step.applies(workflow):
+            return step
+    return None
+
+def _manager_of(requester_id):
+    identity = employee_resolver.resolve(requester_id)
+    return identity.manager_user_id if identity else None
+
+def _ineligible_approvers(workflows):
+    """Per workflow, the users who may not approve its next step: the
+    requester and everyone assigned an earlier step"""
+    ineligible = {w: {w.requester_id, w.assignee_id} - {None} for w in workflows}
+    saved = {w.id: w for w in workflows if w.id is not None}
+    if saved:
+        for workflow_id, assignee_id in db.session.execute(
+            db.select(WorkflowStep.workflow_id, WorkflowStep.assignee_id)
+            .where(WorkflowStep.workflow_id.in_(list(saved)), WorkflowStep.assignee_id.isnot(None))
+        ):
+            ineligible[saved[workflow_id]].add(assignee_id)
+    return ineligible
+
+def assign_steps(pairs):
+    """Pick the approvers of (workflow, step) pairs entering a step.
+
+    Manager steps go to the requester's manager when they have one. The
+    rest are balanced across the step's roles, one lookup per step. Nobody
+    approves their own workflow or two steps of the same one.
+    """
+    ineligible = _ineligible_approvers([workflow for workflow, _ in pairs])
+    assignees = [None] * len(pairs)
+    by_step = {}
+    for i, (workflow, step) in enumerate(pairs):
+        if step.name == 'manager':
+            manager = _manager_of(workflow.requester_id)
+            if manager not in ineligible[workflow]:
+                assignees[i] = manager
+        if assignees[i] is None:
+            by_step.setdefault(step, []).append(i)
+    for step, indexes in by_step.items():
+        exclude = [ineligible[pairs[i][0]] for i in indexes]
+        for i, assignee_id in zip(indexes, resolve_approvers(step.roles, len(indexes), exclude)):
+            assignees[i] = assignee_id
+    return assignees
+
+def start_workflow(workflow):
+    """Route a new workflow to the first step of its chain.
+
+    Types without a chain keep a single step: it goes to the first active
+    admin other than the requester, like any workflow whose approver cannot
+    be resolved.
+    """
+    step = next_step(workflow, START)
+    if step is None:
+        workflow.current_step = 'review'
+        workflow.assignee_id = resolve_approver([UserRole.ADMIN], {workflow.requester_id})
+    else:
+        workflow.current_step = step.name
+        workflow.assignee_id = assign_steps([(workflow, step)])[0]
+    workflow.steps.append(WorkflowStep(step=workflow.current_step, assignee_id=workflow.assignee_id))
+
+def inbox_query(user_id):
+    """Query the workflows awaiting user_id's decision, oldest first.
+
+    The pending steps are a range scan of the (assignee_id, status,
+    workflow_id) index, however many decided steps the table holds.
+    """
+    return db.session.query(PolymorphicWorkflow).join(
+        WorkflowStep, WorkflowStep.workflow_id == Workflow.id
+    ).filter(
+        WorkflowStep.assignee_id == user_id,
+        WorkflowStep.status == WorkflowStatus.PENDING
+    ).order_by(WorkflowStep.workflow_id)
+
+def backfill_steps():
+    """Give pending workflows created before approval steps a pending step
+    for their current assignee; returns the number of steps added"""
+    steps = WorkflowStep.__table__
+    now = datetime.utcnow()
+    result = db.session.execute(steps.insert().from_select(
+        ['workflow_id', 'step', 'assignee_id', 'status', 'created_at', 'assigned_at'],
+        db.select(
+            Workflow.id,
+            db.func.coalesce(Workflow.current_step, 'review'),
+            Workflow.assignee_id,
+            db.literal(WorkflowStatus.PENDING, steps.c.status.type),
+            db.func.coalesce(Workflow.created_at, now),
+            db.func.coalesce(Workflow.created_at, now)
+        ).where(
+            Workflow.status == WorkflowStatus.PENDING,
+            ~db.exists().where(steps.c.workflow_id == Workflow.id, steps.c.status == WorkflowStatus.PENDING)
+        )
+    ))
+    db.session.commit()
+    return result.rowcount
+
+@workflow_bp.cli.command('backfill-steps')
+def backfill_steps_command():
+    """Create approval steps for pending workflows that predate them"""
+    added = backfill_steps()
+    click.echo(f'Added {added} pending approval steps')
@@ -0,0 +1,122 @@
+import threading
+import time
+from collections import defaultdict
+from flask import current_app
+from .. import db
+from ..models import User, Workflow, WorkflowStatus
+from ..versioning import get_table_versions
+
+ASSIGNMENT_STRATEGIES = ('least_pending', 'round_robin')
+
+class ApproverIndex:
+    """Process-wide index of role -> ids of the active users holding it.
+
+    Security routes clear it when they change a user. Changes made by other
+    processes are noticed through the users write counter, checked at most
+    every APPROVER_CACHE_CHECK_INTERVAL seconds.
+    """
+
+    def __init__(self):
+        self._approvers = None
+        self._version = None
+        self._checked_at = None
+        self._turns = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def approvers(self, role):
+        """Ids of the active users with role, in a stable order"""
+        self._revalidate()
+        with self._lock:
+            approvers = self._approvers
+        if approvers is None:
+            approvers = defaultdict(list)
+            for user_id, user_role in db.session.execute(
+                db.select(User.id, User.role).where(User.is_active.is_(True)).order_by(User.id)
+            ):
+                approvers[user_role].append(user_id)
+            with self._lock:
+                self._approvers = approvers
+        return approvers.get(role, [])
+
+    def next_turn(self, role, count=1):
+        """A rotating counter per role for round-robin assignment"""
+        with self._lock:
+            turn = self._turns[role]
+            self._turns[role] += count
+        return turn
+
+    def clear(self):
+        with self._lock:
+            self._approvers = None
+
+    def _revalidate(self):
+        now = time.monotonic()
+        interval = current_app.config.get('APPROVER_CACHE_CHECK_INTERVAL', 5.0)
+        if self._checked_at is not None and now - self._checked_at < interval:
+            return
+
+        version = get_table_versions(['users'])['users'][0]
+        with self._lock:
+            if version != self._version:
+                self._approvers = None
+                self._version = version
+            self._checked_at = now
+
+approver_index = ApproverIndex()
+
+def pending_counts(user_ids):
+    """Pending workflows per assignee, counted on the (assignee_id, status) index"""
+    counts = dict.fromkeys(user_ids, 0)
+    counts.update(db.session.execute(
+        db.select(Workflow.assignee_id, db.func.count())
+        .where(Workflow.assignee_id.in_(user_ids), Workflow.status == WorkflowStatus.PENDING)
+        .group_by(Workflow.assignee_id)
+    ).all())
+    return counts
+
+def resolve_approvers(roles, count, exclude=None):
+    """Pick approvers for count new workflows from the first of roles that
+    has an eligible active user.
+
+    WORKFLOW_ASSIGNMENT decides between them: least_pending hands each
+    workflow to whoever has the fewest pending workflows, counting the ones
+    already handed out in this batch; round_robin takes turns. Ties are
+    broken in rotation, so equally loaded approvers share new work.
+    exclude optionally gives, per workflow, the user ids that may not
+    approve it, such as its requester. Returns a list of count user ids,
+    with None where no role has an eligible active user.
+    """
+    strategy = current_app.config.get('WORKFLOW_ASSIGNMENT', 'least_pending')
+    if strategy not in ASSIGNMENT_STRATEGIES:
+        raise ValueError(f'WORKFLOW_ASSIGNMENT must be one of {", ".join(ASSIGNMENT_STRATEGIES)}')
+    if exclude is None:
+        exclude = [()] * count
+
+    picked = [None] * count
+    remaining = list(range(count))
+    for role in roles:
+        approvers = approver_index.approvers(role)
+        if not remaining:
+            break
+        if not approvers:
+            continue
+        turns = len(remaining) if strategy == 'round_robin' else 1
+        start = approver_index.next_turn(role, turns) % len(approvers)
+        rotation = approvers[start:] + approvers[:start]
+        counts = pending_counts(rotation) if strategy == 'least_pending' and len(rotation) > 1 else None
+        unassigned = []
+        for turn, i in enumerate(remaining):
+            candidates = [a for a in rotation if a not in exclude[i]]
+            if not candidates:
+                unassigned.append(i)
+            elif counts is None:
+                picked[i] = candidates[turn % len(candidates)]
+            else:
+                picked[i] = min(candidates, key=counts.__getitem__)
+                counts[picked[i]] += 1
+        remaining = unassigned
+    return picked
+
+def resolve_approver(roles, exclude=()):
+    """Pick the approver of one new workflow, see resolve_approvers"""
+    return resolve_approvers(roles, 1, [exclude])[0]
@@ -0,0 +1,103 @@
+from datetime import datetime
+from .. import db
+from ..models import ExpenseClaim, PolymorphicWorkflow, Workflow, WorkflowStatus, WorkflowStep
+from ..versioning import bump_table_versions
+from .approvals import assign_steps, next_step
+
+def decide_workflows(workflow_ids, assignee_id, status):
+    """Approve or reject a batch of workflows in one transaction.
+
+    Ownership and state are checked for the whole batch in one query. The
+    current step of each workflow still pending and assigned to
+    assignee_id is then closed. A rejection, or an approval of the last
+    step, completes the workflow; any other approval moves it to its next
+    step and approver. Approved expense claims are marked for reimbursement
+    in the same transaction. Returns {workflow_id: outcome} where outcome is
+    the new status value, 'forwarded', or the reason it was skipped.
+    """
+    workflow_ids = sorted(set(workflow_ids))
+    outcomes = dict.fromkeys(workflow_ids, 'not_found')
+    workflows = {}
+    for workflow in db.session.query(PolymorphicWorkflow).filter(Workflow.id.in_(workflow_ids)):
+        if workflow.assignee_id != assignee_id:
+            outcomes[workflow.id] = 'not_authorized'
+        elif workflow.status != WorkflowStatus.PENDING:
+            outcomes[workflow.id] = f'already_{workflow.status.value}'
+        else:
+            workflows[workflow.id] = workflow
+
+    if not workflows:
+        return outcomes
+
+    # The WHERE repeats the checks so a concurrent decision is not overwritten
+    now = datetime.utcnow()
+    decided = db.session.execute(
+        db.update(Workflow)
+        .where(Workflow.id.in_(list(workflows)),
+               Workflow.assignee_id == assignee_id,
+               Workflow.status == WorkflowStatus.PENDING)
+        .values(updated_at=now)
+        .returning(Workflow.id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    for workflow_id in workflows:
+        outcomes[workflow_id] = 'conflict'
+    if not decided:
+        db.session.commit()
+        return outcomes
+
+    db.session.execute(
+        db.update(WorkflowStep)
+        .where(WorkflowStep.workflow_id.in_(decided), WorkflowStep.status == WorkflowStatus.PENDING)
+        .values(status=status, decided_at=now)
+        .execution_options(synchronize_session=False)
+    )
+
+    completed, forwarded = [], []
+    for workflow_id in decided:
+        workflow = workflows[workflow_id]
+        step = next_step(workflow, workflow.current_step) if status == WorkflowStatus.APPROVED else None
+        if step is None:
+            completed.append(workflow_id)
+        else:
+            forwarded.append((workflow, step))
+
+    tables = ['workflows']
+    if completed:
+        db.session.execute(
+            db.update(Workflow)
+            .where(Workflow.id.in_(completed))
+            .values(status=status, completed_at=now, current_step=None)
+            .execution_options(synchronize_session=False)
+        )
+        if status == WorkflowStatus.APPROVED:
+            claims = ExpenseClaim.__table__
+            if db.session.execute(
+                claims.update().where(claims.c.id.in_(completed)).values(reimbursed=True)
+            ).rowcount:
+                tables.append('expense_claims')
+
+    if forwarded:
+        assignees = assign_steps(forwarded)
+        workflows_table = Workflow.__table__
+        db.session.execute(
+            workflows_table.update()
+            .where(workflows_table.c.id == db.bindparam('workflow_id'))
+            .values(current_step=db.bindparam('step'), assignee_id=db.bindparam('assignee')),
+            [{'workflow_id': workflow.id, 'step': step.name, 'assignee': assignee}
+             for (workflow, step), assignee in zip(forwarded, assignees)]
+        )
+        db.session.execute(db.insert(WorkflowStep), [
+            {'workflow_id': workflow.id, 'step': step.name, 'assignee_id': assignee,
+             'status': WorkflowStatus.PENDING, 'created_at': now, 'assigned_at': now}
+            for (workflow, step), assignee in zip(forwarded, assignees)
+        ])
+
+    bump_table_versions(db.session.connection(), tables)
+    db.session.commit()
+
+    for workflow_id in completed:
+        outcomes[workflow_id] = status.value
+    for workflow, step in forwarded:
+        outcomes[workflow.id] = 'forwarded'
+    return outcomes
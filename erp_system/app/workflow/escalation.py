@@ -0,0 +1,192 @@
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+import click
+from flask import current_app
+from . import workflow_bp
+from .. import db
+from ..employee.identity import employee_resolver
+from ..models import SchedulerLease, Workflow, WorkflowReminder, WorkflowStatus, WorkflowStep
+from ..upsert import insert_on_conflict
+from ..versioning import bump_table_versions
+
+SLA_LEASE = 'workflow-sla-sweep'
+
+def acquire_lease(name, holder, seconds):
+    """Take or renew the named lease for holder; True if holder now has it.
+
+    The lease row is claimed with a conditional UPDATE, so only one process
+    holds it at a time however many workers compete for it.
+    """
+    now = datetime.utcnow()
+    table = SchedulerLease.__table__
+    connection = db.session.connection()
+    connection.execute(
+        insert_on_conflict(connection, table)
+        .values(name=name, holder=None, expires_at=now)
+        .on_conflict_do_nothing(index_elements=[table.c.name])
+    )
+    taken = connection.execute(
+        table.update()
+        .where(table.c.name == name, db.or_(table.c.expires_at <= now, table.c.holder == holder))
+        .values(holder=holder, expires_at=now + timedelta(seconds=seconds))
+    ).rowcount
+    db.session.commit()
+    return bool(taken)
+
+def _manager_of(user_id):
+    identity = employee_resolver.resolve(user_id)
+    return identity.manager_user_id if identity else None
+
+def _remind_and_escalate(workflow_ids, now, remind_before, escalate_before):
+    """Remind or escalate the overdue pending steps of a batch of workflows.
+
+    A step whose assignee has held it since escalate_before moves to that
+    assignee's manager; one left unanswered since remind_before gets a
+    reminder. Returns (reminded, escalated) counts.
+    """
+    steps = db.session.execute(
+        db.select(
+            WorkflowStep.id,
+            WorkflowStep.workflow_id,
+            WorkflowStep.assignee_id,
+            db.func.coalesce(WorkflowStep.assigned_at, WorkflowStep.created_at),
+            WorkflowStep.reminded_at
+        ).where(
+            WorkflowStep.workflow_id.in_(workflow_ids),
+            WorkflowStep.status == WorkflowStatus.PENDING,
+            WorkflowStep.assignee_id.isnot(None)
+        )
+    ).all()
+
+    reminders, escalations = [], []
+    for step_id, workflow_id, assignee_id, assigned_at, reminded_at in steps:
+        if assigned_at <= escalate_before:
+            manager_id = _manager_of(assignee_id)
+            if manager_id and manager_id != assignee_id:
+                escalations.append({'step_id': step_id, 'workflow_id': workflow_id,
+                                    'previous_assignee_id': assignee_id, 'recipient_id': manager_id})
+                continue
+        if (reminded_at or assigned_at) <= remind_before:
+            reminders.append({'step_id': step_id, 'workflow_id': workflow_id,
+                              'previous_assignee_id': None, 'recipient_id': assignee_id})
+
+    if reminders:
+        db.session.execute(
+            db.update(WorkflowStep)
+            .where(WorkflowStep.id.in_([r['step_id'] for r in reminders]))
+            .values(reminded_at=now)
+            .execution_options(synchronize_session=False)
+        )
+    if escalations:
+        steps_table = WorkflowStep.__table__
+        workflows_table = Workflow.__table__
+        db.session.execute(
+            steps_table.update()
+            .where(steps_table.c.id == db.bindparam('step_id'))
+            .values(assignee_id=db.bindparam('recipient_id'), assigned_at=now, reminded_at=None),
+            escalations
+        )
+        db.session.execute(
+            workflows_table.update()
+            .where(workflows_table.c.id == db.bindparam('workflow_id'))
+            .values(assignee_id=db.bindparam('recipient_id'), updated_at=now),
+            escalations
+        )
+        bump_table_versions(db.session.connection(), ['workflows'])
+
+    records = ([dict(r, kind='reminder', created_at=now) for r in reminders] +
+               [dict(e, kind='escalation', created_at=now) for e in escalations])
+    if records:
+        db.session.execute(db.insert(WorkflowReminder), records)
+    return len(reminders), len(escalations)
+
+def sweep_overdue(now=None, on_batch=None):
+    """Remind and escalate approvals pending past their SLA.
+
+    Pending workflows are walked oldest first on the (status, created_at,
+    id) index, WORKFLOW_SWEEP_BATCH at a time, each batch in its own short
+    transaction. Rows locked by a concurrent decision are skipped until
+    the next sweep. on_batch is called between batches and may return False
+    to stop early. Returns {'reminded': n, 'escalated': n}.
+    """
+    config = current_app.config
+    now = now or datetime.utcnow()
+    remind_before = now - timedelta(hours=config.get('WORKFLOW_REMINDER_HOURS', 24))
+    escalate_before = now - timedelta(hours=config.get('WORKFLOW_SLA_HOURS', 72))
+    batch_size = config.get('WORKFLOW_SWEEP_BATCH', 500)
+    totals = {'reminded': 0, 'escalated': 0}
+
+    cursor = None
+    while True:
+        query = db.select(Workflow.id, Workflow.created_at).where(
+            Workflow.status == WorkflowStatus.PENDING,
+            Workflow.created_at <= max(remind_before, escalate_before)
+        )
+        if cursor is not None:
+            query = query.where(db.tuple_(Workflow.created_at, Workflow.id) > cursor)
+        rows = db.session.execute(
+            query.order_by(Workflow.created_at, Workflow.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        ).all()
+        if not rows:
+            break
+
+        reminded, escalated = _remind_and_escalate(
+            [row.id for row in rows], now, remind_before, escalate_before
+        )
+        db.session.commit()
+        totals['reminded'] += reminded
+        totals['escalated'] += escalated
+
+        cursor = (rows[-1].created_at, rows[-1].id)
+        if len(rows) < batch_size or (on_batch and on_batch() is False):
+            break
+    return totals
+
+def _lease_holder():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+def ensure_sla_scheduler():
+    """Start this process's SLA sweep thread, once per process.
+
+    Called before each request, so worker processes forked from a preloaded
+    app start their own thread. Every worker competes for the same database
+    lease, so only one of them sweeps at a time.
+    """
+    app = current_app._get_current_object()
+    if app.extensions.get('workflow_sla_pid') == os.getpid():
+        return
+    app.extensions['workflow_sla_pid'] = os.getpid()
+
+    interval = app.config.get('WORKFLOW_SWEEP_INTERVAL', 300)
+    holder = _lease_holder()
+
+    def renew():
+        return acquire_lease(SLA_LEASE, holder, interval * 2)
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                with app.app_context():
+                    if renew():
+                        sweep_overdue(on_batch=renew)
+            except Exception:
+                app.logger.exception('Workflow SLA sweep failed')
+
+    threading.Thread(target=run, daemon=True, name='workflow-sla').start()
+
+@workflow_bp.cli.command('sweep-sla')
+def sweep_sla_command():
+    """Send reminders and escalate approvals pending past their SLA"""
+    holder = _lease_holder()
+    lease_seconds = current_app.config.get('WORKFLOW_SWEEP_INTERVAL', 300) * 2
+    if not acquire_lease(SLA_LEASE, holder, lease_seconds):
+        click.echo('Another process holds the SLA sweep lease')
+        return
+    totals = sweep_overdue(on_batch=lambda: acquire_lease(SLA_LEASE, holder, lease_seconds))
+    click.echo(f"Sent {totals['reminded']} reminders and escalated {totals['escalated']} approvals")
@@ -1,20 +1,29 @@
-from flask import render_template, redirect, url_for, flash, request, jsonify
+from flask import render_template, redirect, url_for, flash, request, jsonify, current_app, abort
 from flask_login import login_required, current_user
 from . import workflow_bp
 from .. import db
+from .approvals import inbox_query, start_workflow
+from .decisions import decide_workflows
+from ..employee.identity import current_employee
 from ..models import (Workflow, WorkflowType, WorkflowStatus, 
-                     LeaveRequest, ExpenseClaim, User, Employee)
+                     LeaveRequest, ExpenseClaim, TravelRequest, User, UserRole, Employee,
+                     loader_profile, PolymorphicWorkflow)
 from datetime import datetime
+import math
 
 @workflow_bp.route('/')
 @login_required
 def index():
     """Display workflow dashboard"""
-    # Get workflows requested by the user
-    requested_workflows = Workflow.query.filter_by(requester_id=current_user.id).all()
+    limit = current_app.config.get('WORKFLOW_INDEX_LIMIT', 200)
     
-    # Get workflows assigned to the user for approval
-    assigned_workflows = Workflow.query.filter_by(assignee_id=current_user.id).all()
+    # Get the user's most recent requests
+    requested_workflows = db.session.query(PolymorphicWorkflow).options(
+        *loader_profile('workflow')
+    ).filter(Workflow.requester_id == current_user.id).order_by(Workflow.id.desc()).limit(limit).all()
+    
+    # Get workflows waiting for the user's approval, oldest first
+    assigned_workflows = inbox_query(current_user.id).options(*loader_profile('workflow')).limit(limit).all()
     
     return render_template(
         'workflow/index.html',
@@ -28,26 +37,11 @@ def index():
 def leave_request():
     """Create a new leave request"""
     if request.method == 'POST':
-        # Find the employee's manager to assign the request to
-        employee = Employee.query.filter_by(user_id=current_user.id).first()
+        # Leave is approved by the employee's manager
+        employee = current_employee()
         if not employee:
             flash('Employee record not found', 'danger')
             return redirect(url_for('workflow.index'))
-            
-        manager_id = None
-        if employee.manager:
-            manager_id = employee.manager.user_id
-        
-        # If no manager, assign to HR
-        if not manager_id:
-            hr_user = User.query.filter_by(role=UserRole.HR).first()
-            if hr_user:
-                manager_id = hr_user.id
-            else:
-                # Fallback to admin
-                admin_user = User.query.filter_by(role=UserRole.ADMIN).first()
-                if admin_user:
-                    manager_id = admin_user.id
         
         # Create the leave request workflow
         leave_request = LeaveRequest(
@@ -55,13 +49,13 @@ def leave_request():
             title=f"Leave Request: {request.form.get('leave_type')}",
             description=request.form.get('reason'),
             requester_id=current_user.id,
-            assignee_id=manager_id,
             status=WorkflowStatus.PENDING,
             leave_type=request.form.get('leave_type'),
             start_date=datetime.strptime(request.form.get('start_date'), '%Y-%m-%d').date(),
             end_date=datetime.strptime(request.form.get('end_date'), '%Y-%m-%d').date()
         )
         
+        start_workflow(leave_request)
         db.session.add(leave_request)
         db.session.commit()
         
@@ -75,31 +69,19 @@ def leave_request():
 def expense_claim():
     """Create a new expense claim"""
     if request.method == 'POST':
-        # Find finance manager or admin to assign the request to
-        finance_manager = User.query.filter_by(role=UserRole.FINANCE).first()
-        if finance_manager:
-            assignee_id = finance_manager.id
-        else:
-            # Fallback to admin
-            admin_user = User.query.filter_by(role=UserRole.ADMIN).first()
-            if admin_user:
-                assignee_id = admin_user.id
-            else:
-                assignee_id = None
-        
         # Create the expense claim workflow
         expense_claim = ExpenseClaim(
             workflow_type=WorkflowType.EXPENSE_CLAIM,
             title=f"Expense Claim: {request.form.get('category')} - ${request.form.get('amount')}",
             description=request.form.get('description'),
             requester_id=current_user.id,
-            assignee_id=assignee_id,
             status=WorkflowStatus.PENDING,
             amount=float(request.form.get('amount')),
             expense_date=datetime.strptime(request.form.get('expense_date'), '%Y-%m-%d').date(),
             category=request.form.get('category')
         )
         
+        start_workflow(expense_claim)
         db.session.add(expense_claim)
         db.session.commit()
         
@@ -108,52 +90,122 @@ def expense_claim():
     
     return render_template('workflow/expense_claim.html', title='Submit Expense Claim')
 
-@workflow_bp.route('/approve/<int:workflow_id>', methods=['POST'])
+@workflow_bp.route('/travel-request', methods=['GET', 'POST'])
 @login_required
-def approve_workflow(workflow_id):
-    """Approve a workflow request"""
-    workflow = Workflow.query.get_or_404(workflow_id)
-    
-    # Check permissions
-    if workflow.assignee_id != current_user.id:
-        return jsonify({'success': False, 'message': 'Not authorized to approve this request'}), 403
-    
-    workflow.status = WorkflowStatus.APPROVED
-    workflow.completed_at = datetime.utcnow()
-    db.session.commit()
+def travel_request():
+    """Create a new travel request"""
+    if request.method == 'POST':
+        destination = (request.form.get('destination') or '').strip()
+        if not destination:
+            flash('Destination is required', 'danger')
+            return redirect(url_for('workflow.travel_request'))
+        try:
+            start_date = datetime.strptime(request.form.get('start_date'), '%Y-%m-%d').date()
+            end_date = datetime.strptime(request.form.get('end_date'), '%Y-%m-%d').date()
+        except (TypeError, ValueError):
+            flash('Travel dates must be formatted as YYYY-MM-DD', 'danger')
+            return redirect(url_for('workflow.travel_request'))
+        if end_date < start_date:
+            flash('Travel must not end before it starts', 'danger')
+            return redirect(url_for('workflow.travel_request'))
+        try:
+            estimated_cost = float(request.form.get('estimated_cost') or 0)
+        except ValueError:
+            estimated_cost = None
+        if estimated_cost is None or not math.isfinite(estimated_cost) or estimated_cost < 0:
+            flash('Estimated cost must be a non-negative number', 'danger')
+            return redirect(url_for('workflow.travel_request'))
+        
+        # Create the travel request workflow
+        travel_request = TravelRequest(
+            workflow_type=WorkflowType.TRAVEL_REQUEST,
+            title=f"Travel Request: {destination}",
+            description=request.form.get('purpose'),
+            requester_id=current_user.id,
+            status=WorkflowStatus.PENDING,
+            destination=destination,
+            purpose=request.form.get('purpose'),
+            start_date=start_date,
+            end_date=end_date,
+            estimated_cost=estimated_cost
+        )
+        
+        start_workflow(travel_request)
+        db.session.add(travel_request)
+        db.session.commit()
+        
+        flash('Travel request submitted successfully', 'success')
+        return redirect(url_for('workflow.index'))
     
-    # If it's an expense claim that was approved, mark it for reimbursement
-    if workflow.workflow_type == WorkflowType.EXPENSE_CLAIM:
-        expense = ExpenseClaim.query.get(workflow_id)
-        if expense:
-            expense.reimbursed = True
+    return render_template('workflow/travel_request.html', title='Submit Travel Request')
+
+def _decision_response(workflow_id, status, verb):
+    """Decide one workflow and describe where it went"""
+    outcome = decide_workflows([workflow_id], current_user.id, status)[workflow_id]
+    if outcome == 'not_found':
+        abort(404)
+    if outcome == 'not_authorized':
+        return jsonify({'success': False, 'message': f'Not authorized to {verb} this request'}), 403
     
+    workflow = db.session.get(Workflow, workflow_id)
+    if outcome == status.value:
+        message = f'Workflow {status.value}'
+    elif outcome == 'forwarded':
+        message = f'Workflow forwarded to {workflow.current_step} approval'
+    else:
+        message = f'Workflow could not be {status.value}: {outcome}'
     return jsonify({
-        'success': True,
-        'message': 'Workflow approved successfully',
+        'success': outcome in (status.value, 'forwarded'),
+        'message': message,
         'workflow_id': workflow.id,
         'status': workflow.status.value,
-        'completed_at': workflow.completed_at.strftime('%Y-%m-%d %H:%M:%S')
+        'current_step': workflow.current_step,
+        'completed_at': workflow.completed_at.strftime('%Y-%m-%d %H:%M:%S') if workflow.completed_at else None
     })
 
+@workflow_bp.route('/approve/<int:workflow_id>', methods=['POST'])
+@login_required
+def approve_workflow(workflow_id):
+    """Approve the current step of a workflow request"""
+    return _decision_response(workflow_id, WorkflowStatus.APPROVED, 'approve')
+
 @workflow_bp.route('/reject/<int:workflow_id>', methods=['POST'])
 @login_required
 def reject_workflow(workflow_id):
     """Reject a workflow request"""
-    workflow = Workflow.query.get_or_404(workflow_id)
-    
-    # Check permissions
-    if workflow.assignee_id != current_user.id:
-        return jsonify({'success': False, 'message': 'Not authorized to reject this request'}), 403
+    return _decision_response(workflow_id, WorkflowStatus.REJECTED, 'reject')
+
+def _bulk_decision(status):
+    """Apply status to the workflow ids posted as JSON or form data"""
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        ids = data.get('ids')
+    else:
+        ids = request.form.getlist('workflow_id', type=int)
+    if not isinstance(ids, list) or not ids or not all(isinstance(i, int) for i in ids):
+        return jsonify({'success': False, 'message': 'ids must be a non-empty list of workflow ids'}), 400
     
-    workflow.status = WorkflowStatus.REJECTED
-    workflow.completed_at = datetime.utcnow()
-    db.session.commit()
+    max_records = current_app.config.get('API_BULK_MAX_RECORDS', 5000)
+    if len(ids) > max_records:
+        return jsonify({'success': False, 'message': f'Batches are limited to {max_records} workflows'}), 413
     
+    outcomes = decide_workflows(ids, current_user.id, status)
+    decided = sum(1 for outcome in outcomes.values() if outcome in (status.value, 'forwarded'))
     return jsonify({
-        'success': True,
-        'message': 'Workflow rejected',
-        'workflow_id': workflow.id,
-        'status': workflow.status.value,
-        'completed_at': workflow.completed_at.strftime('%Y-%m-%d %H:%M:%S')
-    })
\ No newline at end of file
+        'success': decided == len(outcomes),
+        'message': f'{decided} of {len(outcomes)} workflows {status.value}',
+        'results': [{'workflow_id': workflow_id, 'outcome': outcome}
+                    for workflow_id, outcome in outcomes.items()]
+    })
+
+@workflow_bp.route('/approve', methods=['POST'])
+@login_required
+def approve_workflows():
+    """Approve a batch of workflow requests"""
+    return _bulk_decision(WorkflowStatus.APPROVED)
+
+@workflow_bp.route('/reject', methods=['POST'])
+@login_required
+def reject_workflows():
+    """Reject a batch of workflow requests"""
+    return _bulk_decision(WorkflowStatus.REJECTED)
@@ -0,0 +1,121 @@
+import threading
+from contextlib import contextmanager
+from datetime import date, timedelta
+import pytest
+from flask import g
+from sqlalchemy import event
+from app import create_app, db as _db
+from app.api.cache import response_cache
+from app.employee.identity import employee_resolver
+from app.models import (Department, Employee, ExpenseClaim, FinancialTransaction, LeaveRequest, Payroll,
+                        Resource, User, UserRole, WorkflowStatus, WorkflowType)
+from app.workflow.approvers import approver_index
+
+@pytest.fixture
+def app():
+    """An app on a fresh in-memory database, with the process caches emptied"""
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+        'TESTING': True,
+        'WTF_CSRF_ENABLED': False,
+    })
+    for cache in (response_cache, employee_resolver, approver_index):
+        cache.clear()
+    with app.app_context():
+        _db.create_all()
+        yield app
+        _db.session.remove()
+        _db.drop_all()
+
+@pytest.fixture
+def db(app):
+    return _db
+
+@pytest.fixture
+def login(app):
+    """Return a test client logged in as the given user"""
+    def login(user):
+        # Requests share the fixture's app context; drop the user and employee
+        # an earlier request cached there
+        g.pop('_login_user', None)
+        g.pop('current_employee', None)
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user.id)
+            session['_fresh'] = True
+        return client
+    return login
+
+class QueryCounter:
+    """Counts SQL statements issued by the current thread, keeping each
+    statement and its parameters"""
+
+    def __init__(self):
+        self.count = 0
+        self.statements = []
+        self.executed = []
+        self._thread = threading.get_ident()
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() == self._thread:
+            self.count += 1
+            self.statements.append(statement)
+            if not executemany:
+                self.executed.append((statement, parameters))
+
+@pytest.fixture
+def count_queries(db):
+    """Context manager yielding a counter of the statements executed inside it"""
+    @contextmanager
+    def count_queries():
+        counter = QueryCounter()
+        event.listen(db.engine, 'before_cursor_execute', counter)
+        try:
+            yield counter
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', counter)
+    return count_queries
+
+@pytest.fixture
+def admin(db):
+    user = User(username='admin', email='admin@example.com', first_name='Ada', last_name='Admin',
+                role=UserRole.ADMIN, password='x')
+    db.session.add(user)
+    db.session.add(Employee(user=user, position='Administrator', hire_date=date(2020, 1, 1)))
+    db.session.commit()
+    return user
+
+@pytest.fixture
+def add_rows(db, admin):
+    """Add n employees, each with a department, payroll, workflows, transaction
+    and resource. Each new employee reports to the one added before it and
+    their workflows go to an approver of their own, so the related rows differ
+    from row to row and a lazy load costs one query per row."""
+    def add_rows(n):
+        start = db.session.query(Employee).count()
+        manager = db.session.query(Employee).order_by(Employee.id.desc()).first()
+        for i in range(start, start + n):
+            user = User(username=f'user{i}', email=f'user{i}@example.com', first_name=f'First{i}',
+                        last_name=f'Last{i}', role=UserRole.EMPLOYEE, password='x')
+            approver = User(username=f'approver{i}', email=f'approver{i}@example.com', first_name=f'Approver{i}',
+                            last_name=f'Last{i}', role=UserRole.HR, password='x')
+            department = Department(name=f'Department {i}')
+            employee = Employee(user=user, department=department, manager=manager, position='Analyst',
+                                salary=50000, hire_date=date(2021, 1, 1))
+            db.session.add(employee)
+            db.session.add(Payroll(user=user, pay_period_start=date(2024, 1, 1), pay_period_end=date(2024, 1, 31),
+                                   base_salary=4000, net_pay=3200))
+            db.session.add(LeaveRequest(workflow_type=WorkflowType.LEAVE_REQUEST, title='Leave', requester=user,
+                                        assigned_to=approver, status=WorkflowStatus.PENDING,
+                                        leave_type='Annual', start_date=date(2024, 2, 1), end_date=date(2024, 2, 2)))
+            db.session.add(ExpenseClaim(workflow_type=WorkflowType.EXPENSE_CLAIM, title='Claim', requester=user,
+                                        assigned_to=approver, status=WorkflowStatus.PENDING, amount=25,
+                                        category='Travel'))
+            db.session.add(FinancialTransaction(transaction_date=date(2024, 1, 1) + timedelta(days=i % 28),
+                                                amount=100 + i, transaction_type='Expense', category='Supplies',
+                                                created_by=user))
+            db.session.add(Resource(name=f'Resource {i}', category='Equipment', quantity=i))
+            manager = employee
+        db.session.commit()
+        response_cache.clear()
+    return add_rows
@@ -0,0 +1,45 @@
+"""The API list endpoints must load a page in a fixed number of queries,
+however many rows it holds; a lazy load in a serializer breaks that"""
+import pytest
+from flask import g
+from app import db
+from app.api.cache import response_cache
+from app.models import Employee
+
+LIST_ENDPOINTS = [
+    '/api/users',
+    '/api/employees',
+    '/api/payroll',
+    '/api/resources',
+    '/api/workflows',
+    '/api/finance/transactions',
+]
+
+def request_queries(client, count_queries, url):
+    # Requests share the test's app context: start each from an empty
+    # session and login cache so nothing is served from the identity map
+    db.session.expunge_all()
+    g.pop('_login_user', None)
+    response_cache.clear()
+    with count_queries() as counter:
+        response = client.get(url)
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return counter
+
+@pytest.mark.parametrize('url', LIST_ENDPOINTS)
+def test_list_query_count_is_flat(url, admin, add_rows, login, count_queries):
+    client = login(admin)
+    add_rows(3)
+    few = request_queries(client, count_queries, url)
+    add_rows(30)
+    many = request_queries(client, count_queries, url)
+    assert many.count == few.count, '\n'.join(many.statements)
+
+def test_employee_detail_loads_manager_eagerly(admin, add_rows, login, count_queries):
+    client = login(admin)
+    add_rows(2)
+    employee_id = db.session.query(Employee.id).order_by(Employee.id.desc()).limit(1).scalar()
+    admin_employee_id = db.session.query(Employee.id).filter_by(user_id=admin.id).scalar()
+    with_manager = request_queries(client, count_queries, f'/api/employees/{employee_id}')
+    alone = request_queries(client, count_queries, f'/api/employees/{admin_employee_id}')
+    assert with_manager.count == alone.count, '\n'.join(with_manager.statements)
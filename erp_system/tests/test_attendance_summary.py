@@ -0,0 +1,82 @@
+from datetime import date, datetime, time
+import pytest
+from sqlalchemy.dialects import postgresql
+from app.employee.summary import _late_check_in, rebuild_summaries
+from app.models import Attendance, AttendanceMonthlySummary, Employee
+
+SUMMARY_FIELDS = ['employee_id', 'month', 'present_days', 'late_days', 'absent_days', 'worked_days']
+
+def summaries(db):
+    """Summary rows as (counts, hours) pairs, the hours rounded off"""
+    return [
+        (tuple(getattr(row, name) for name in SUMMARY_FIELDS),
+         (round(row.total_hours, 6), round(row.overtime_hours, 6)))
+        for row in db.session.query(AttendanceMonthlySummary).order_by(
+            AttendanceMonthlySummary.employee_id, AttendanceMonthlySummary.month
+        )
+    ]
+
+@pytest.fixture
+def attendance(db, admin):
+    """Check-ins either side of the 09:15 lateness threshold, some by a fraction of a second"""
+    employee = db.session.query(Employee).filter_by(user_id=admin.id).one()
+    check_ins = [
+        (date(2024, 3, 1), datetime(2024, 3, 1, 9, 15, 0)),
+        (date(2024, 3, 4), datetime(2024, 3, 4, 9, 15, 0, 400000)),
+        (date(2024, 3, 5), datetime(2024, 3, 5, 9, 15, 0, 999999)),
+        (date(2024, 3, 6), datetime(2024, 3, 6, 9, 15, 1)),
+        (date(2024, 3, 7), datetime(2024, 3, 7, 9, 14, 59, 999999)),
+        (date(2024, 4, 1), datetime(2024, 4, 1, 10, 0, 0, 500000)),
+    ]
+    for day, check_in in check_ins:
+        db.session.add(Attendance(employee_id=employee.id, date=day, check_in=check_in,
+                                  check_out=check_in.replace(hour=18), status='Present'))
+    db.session.commit()
+    return employee
+
+def test_incremental_summaries_match_rebuild(db, attendance):
+    incremental = summaries(db)
+    assert [counts[3] for counts, _ in incremental] == [1, 1]
+
+    rebuild_summaries(date(2024, 3, 1), date(2024, 4, 1))
+    db.session.expire_all()
+    assert summaries(db) == incremental
+
+def summary_updated_at(db, month):
+    db.session.expire_all()
+    return db.session.query(AttendanceMonthlySummary).filter_by(month=month).one().updated_at
+
+def test_updates_refresh_only_changed_summaries(db, attendance):
+    march = summary_updated_at(db, date(2024, 3, 1))
+    april = summary_updated_at(db, date(2024, 4, 1))
+
+    row = db.session.query(Attendance).filter_by(date=date(2024, 4, 1)).one()
+    row.notes = 'Left early'
+    db.session.commit()
+    assert summary_updated_at(db, date(2024, 4, 1)) == april
+
+    row = db.session.query(Attendance).filter_by(date=date(2024, 3, 6)).one()
+    row.check_in = datetime(2024, 3, 6, 8, 0)
+    db.session.commit()
+    assert summary_updated_at(db, date(2024, 3, 1)) > march
+    assert summary_updated_at(db, date(2024, 4, 1)) == april
+    assert db.session.query(AttendanceMonthlySummary).filter_by(month=date(2024, 3, 1)).one().late_days == 0
+
+def test_postgresql_lateness_truncates_to_the_second():
+    sql = str(_late_check_in(Attendance.__table__, 'postgresql', time(9, 15)).compile(dialect=postgresql.dialect()))
+    assert 'date_trunc' in sql
+
+def test_moving_a_row_refreshes_both_months(db, admin):
+    employee = db.session.query(Employee).filter_by(user_id=admin.id).one()
+    row = Attendance(employee_id=employee.id, date=date(2024, 1, 10), check_in=datetime(2024, 1, 10, 9),
+                     check_out=datetime(2024, 1, 10, 17), status='Present')
+    db.session.add(row)
+    db.session.commit()
+
+    # Moved while expired by the commit, so the old date is not loaded
+    row.date = date(2024, 2, 10)
+    db.session.commit()
+    db.session.expire_all()
+    present = dict(db.session.query(AttendanceMonthlySummary.month, AttendanceMonthlySummary.present_days))
+    assert present.get(date(2024, 1, 1), 0) == 0
+    assert present[date(2024, 2, 1)] == 1
@@ -0,0 +1,22 @@
+import pytest
+
+GOOD_TRANSACTION = {'transaction_date': '2024-01-05', 'amount': 10, 'transaction_type': 'Expense',
+                    'category': 'Supplies'}
+GOOD_RESOURCE = {'name': 'Laptop', 'quantity': 3}
+
+@pytest.mark.parametrize('url, good, field, value, message', [
+    ('/api/bulk/transactions', GOOD_TRANSACTION, 'category', {'a': 1}, 'category must be a string'),
+    ('/api/bulk/transactions', GOOD_TRANSACTION, 'description', ['x'], 'description must be a string'),
+    ('/api/bulk/transactions', GOOD_TRANSACTION, 'amount', 'nan', 'amount must be a finite number'),
+    ('/api/bulk/transactions', GOOD_TRANSACTION, 'amount', 'inf', 'amount must be a finite number'),
+    ('/api/bulk/transactions', GOOD_TRANSACTION, 'amount', True, 'amount must be a number'),
+    ('/api/bulk/resources', GOOD_RESOURCE, 'name', ['x'], 'name must be a string'),
+    ('/api/bulk/resources', GOOD_RESOURCE, 'quantity', True, 'quantity must be a number'),
+    ('/api/bulk/resources', GOOD_RESOURCE, 'purchase_cost', '-inf', 'purchase_cost must be a finite number'),
+])
+def test_malformed_values_are_reported_per_record(login, admin, url, good, field, value, message):
+    client = login(admin)
+    response = client.post(url, json=[good, dict(good, **{field: value})])
+    assert response.status_code == 200
+    assert response.json['inserted'] == 1
+    assert response.json['errors'] == [{'index': 1, 'errors': [message]}]
@@ -0,0 +1,38 @@
+from datetime import date
+from app.finance.rollup import rebuild_rollup
+from app.models import FinanceDailyRollup, FinancialTransaction
+
+def rollup(db):
+    return sorted(
+        (row.rollup_date, row.transaction_type, row.category, round(row.total_amount, 6), row.transaction_count)
+        for row in db.session.query(FinanceDailyRollup)
+        if row.transaction_count or row.total_amount
+    )
+
+def assert_matches_rebuild(db):
+    incremental = rollup(db)
+    rebuild_rollup()
+    db.session.expire_all()
+    assert rollup(db) == incremental
+    return incremental
+
+def test_rollup_follows_insert_update_and_delete(db, admin):
+    transaction = FinancialTransaction(transaction_date=date(2024, 1, 5), amount=100, transaction_type='Expense',
+                                       category='A', created_by=admin)
+    db.session.add(transaction)
+    db.session.add(FinancialTransaction(transaction_date=date(2024, 1, 5), amount=30, transaction_type='Expense',
+                                        category='A', created_by=admin))
+    db.session.commit()
+    assert assert_matches_rebuild(db) == [(date(2024, 1, 5), 'Expense', 'A', 130, 2)]
+
+    # Updated while expired by the commits, so the old values are not loaded
+    transaction.amount = 40
+    transaction.category = 'B'
+    transaction.transaction_date = date(2024, 1, 6)
+    db.session.commit()
+    assert assert_matches_rebuild(db) == [(date(2024, 1, 5), 'Expense', 'A', 30, 1),
+                                          (date(2024, 1, 6), 'Expense', 'B', 40, 1)]
+
+    db.session.delete(transaction)
+    db.session.commit()
+    assert assert_matches_rebuild(db) == [(date(2024, 1, 5), 'Expense', 'A', 30, 1)]
@@ -0,0 +1,31 @@
+import pytest
+from app.models import User, UserRole
+
+def record(i, **fields):
+    return dict({'username': f'new{i}', 'email': f'new{i}@example.com', 'first_name': 'New',
+                 'last_name': f'Hire{i}'}, **fields)
+
+@pytest.mark.parametrize('field, value', [
+    ('username', ['x']),
+    ('email', {'a': 1}),
+    ('department', {'name': 'Ops'}),
+    ('manager', ['admin']),
+    ('password', 12345678),
+])
+def test_non_string_fields_are_reported_per_record(login, admin, field, value):
+    response = login(admin).post('/employee/import', json=[record(1), record(2, **{field: value})])
+    assert response.status_code == 422
+    assert response.json['errors'] == [{'index': 1, 'errors': [f'{field} must be a string']}]
+
+def test_only_admins_import_admins(db, login, admin):
+    hr = User(username='hr', email='hr@example.com', first_name='H', last_name='R', role=UserRole.HR, password='x')
+    db.session.add(hr)
+    db.session.commit()
+    records = [record(1, role='admin'), record(2, role='hr')]
+
+    response = login(hr).post('/employee/import?dry_run=1', json=records)
+    assert response.status_code == 422
+    assert response.json['errors'] == [{'index': 0, 'errors': ['you may not assign the admin role']}]
+
+    response = login(admin).post('/employee/import?dry_run=1', json=records)
+    assert response.status_code == 200
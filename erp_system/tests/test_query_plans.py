@@ -0,0 +1,73 @@
+"""The hot filters must be served by their indexes. Each test EXPLAINs the
+statements a real request issued, so a route whose query stops matching
+its index fails here even though the index still exists"""
+from datetime import datetime, timedelta
+import pytest
+from flask import g
+from app import db
+from app.models import Employee, User, Workflow
+from app.workflow.escalation import sweep_overdue
+
+def query_plans(counter):
+    """EXPLAIN QUERY PLAN every captured SELECT, as (statement, plan lines)"""
+    connection = db.session.connection()
+    plans = []
+    for statement, parameters in counter.executed:
+        if not statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+            continue
+        rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).all()
+        plans.append((statement, [row[-1] for row in rows]))
+    return plans
+
+def assert_uses_index(counter, index):
+    plans = query_plans(counter)
+    assert any(f'INDEX {index} ' in line for _, lines in plans for line in lines), (
+        f'No statement used {index}:\n' +
+        '\n\n'.join(statement + '\n  ' + '\n  '.join(lines) for statement, lines in plans)
+    )
+
+def request(client, count_queries, method, url):
+    db.session.expunge_all()
+    g.pop('_login_user', None)
+    with count_queries() as counter:
+        response = client.open(url, method=method)
+    assert response.status_code < 400, response.get_data(as_text=True)
+    return counter
+
+@pytest.fixture
+def client(admin, add_rows, login):
+    add_rows(5)
+    return login(admin)
+
+@pytest.mark.parametrize('method, url, index', [
+    ('GET', '/finance/reports/income-expense/transactions?type=Expense&start_date=2024-01-01&end_date=2024-01-31',
+     'ix_financial_transactions_type_date'),
+    ('GET', '/dashboard', 'ix_workflows_assignee_status'),
+    ('GET', '/dashboard', 'ix_payrolls_user_period_end'),
+    ('GET', '/dashboard', 'ix_resources_status'),
+    ('GET', '/workflow/', 'ix_workflows_requester'),
+    ('GET', '/workflow/', 'ix_workflow_steps_assignee_status'),
+    ('GET', '/employee/attendance?date_from=2024-01-01&date_to=2024-01-31', 'ix_attendance_date_id'),
+])
+def test_route_uses_index(client, count_queries, method, url, index):
+    assert_uses_index(request(client, count_queries, method, url), index)
+
+def test_check_in_finds_todays_row_by_unique_key(client, count_queries):
+    # SQLite backs uq_attendance_employee_date with an automatic index
+    counter = request(client, count_queries, 'POST', '/employee/attendance/check-in')
+    assert_uses_index(counter, 'sqlite_autoindex_attendance_1')
+
+def test_hierarchy_lookups_use_closure_indexes(client, count_queries):
+    top = db.session.query(Employee.id).join(User).filter(User.username == 'admin').scalar()
+    bottom = db.session.query(Employee.id).order_by(Employee.id.desc()).limit(1).scalar()
+    counter = request(client, count_queries, 'GET', f'/employee/{top}/reports')
+    assert_uses_index(counter, 'ix_employee_hierarchy_ancestor_depth')
+    counter = request(client, count_queries, 'GET', f'/employee/{bottom}/management-chain')
+    assert_uses_index(counter, 'ix_employee_hierarchy_descendant_depth')
+
+def test_sla_sweep_walks_pending_by_age(client, count_queries):
+    db.session.execute(db.update(Workflow).values(created_at=datetime.utcnow() - timedelta(days=5)))
+    db.session.commit()
+    with count_queries() as counter:
+        sweep_overdue()
+    assert_uses_index(counter, 'ix_workflows_status_created')
@@ -0,0 +1,53 @@
+import time
+import uuid
+from app.models import ReportJob
+from app.reports.definitions import REPORTS
+from app.reports.jobs import prune_jobs, run_job
+
+def add_job(db, admin, report):
+    job = ReportJob(id=uuid.uuid4().hex, report=report, params='{}', cache_key='key', status='Pending',
+                    requested_by_id=admin.id)
+    db.session.add(job)
+    db.session.commit()
+    return job.id
+
+def job_status(db, job_id):
+    db.session.expire_all()
+    return db.session.get(ReportJob, job_id).status
+
+def test_a_running_job_is_not_failed_by_age(app, db, admin, monkeypatch):
+    app.config['REPORT_JOB_TIMEOUT'] = 0.3
+    seen = {}
+
+    def slow_report(params):
+        # Outlive the timeout, then let a submitter prune while still running
+        time.sleep(0.6)
+        prune_jobs()
+        seen['status'] = job_status(db, job_id)
+        return {'ok': True}
+
+    monkeypatch.setitem(REPORTS, 'slow', {'tables': [], 'run': slow_report})
+    job_id = add_job(db, admin, 'slow')
+    run_job(app, job_id)
+    assert seen['status'] == 'Running'
+    assert job_status(db, job_id) == 'Done'
+
+def test_a_failed_job_is_not_overwritten(app, db, admin, monkeypatch):
+    def failed_meanwhile(params):
+        db.session.query(ReportJob).filter_by(id=job_id).update({'status': 'Failed', 'error': 'Timed out'})
+        db.session.commit()
+        return {'ok': True}
+
+    monkeypatch.setitem(REPORTS, 'failed', {'tables': [], 'run': failed_meanwhile})
+    job_id = add_job(db, admin, 'failed')
+    run_job(app, job_id)
+    assert job_status(db, job_id) == 'Failed'
+    assert db.session.get(ReportJob, job_id).result is None
+
+def test_a_job_is_run_once(app, db, admin, monkeypatch):
+    runs = []
+    monkeypatch.setitem(REPORTS, 'counted', {'tables': [], 'run': lambda params: runs.append(1) or {}})
+    job_id = add_job(db, admin, 'counted')
+    run_job(app, job_id)
+    run_job(app, job_id)
+    assert runs == [1]
@@ -0,0 +1,72 @@
+from datetime import date
+import pytest
+from app.models import Employee, User, UserRole, Workflow, WorkflowStep
+
+def add_user(db, name, role, manager=None):
+    user = User(username=name, email=f'{name}@example.com', first_name=name.title(), last_name='User',
+                role=role, password='x')
+    db.session.add(Employee(user=user, manager=manager, position='Staff', hire_date=date(2020, 1, 1)))
+    db.session.commit()
+    return user
+
+@pytest.fixture
+def staff(db, admin):
+    """An HR user, a finance user and an employee, none with a manager"""
+    return {
+        'hr': add_user(db, 'hr', UserRole.HR),
+        'finance': add_user(db, 'finance', UserRole.FINANCE),
+        'employee': add_user(db, 'employee', UserRole.EMPLOYEE),
+    }
+
+def latest_workflow(db):
+    db.session.expire_all()
+    return db.session.query(Workflow).order_by(Workflow.id.desc()).first()
+
+def approvers(db, workflow):
+    return [assignee for assignee, in db.session.query(WorkflowStep.assignee_id)
+            .filter_by(workflow_id=workflow.id).order_by(WorkflowStep.id)]
+
+def test_each_step_of_a_chain_has_a_different_approver(db, login, staff):
+    client = login(staff['employee'])
+    response = client.post('/workflow/expense-claim', data={
+        'category': 'Travel', 'amount': '5000', 'expense_date': '2024-01-05', 'description': 'Conference'
+    })
+    assert response.status_code == 302
+    workflow = latest_workflow(db)
+
+    # Approve every step as whoever it is assigned to
+    while workflow.current_step:
+        assignee = db.session.get(User, workflow.assignee_id)
+        assert login(assignee).post(f'/workflow/approve/{workflow.id}').json['success']
+        workflow = latest_workflow(db)
+
+    chain = approvers(db, workflow)
+    assert len(chain) == 3
+    assert len(set(chain)) == 3
+    assert staff['employee'].id not in chain
+
+@pytest.mark.parametrize('url, data', [
+    ('/workflow/leave-request', {'leave_type': 'Annual', 'start_date': '2024-02-01', 'end_date': '2024-02-02'}),
+    ('/workflow/expense-claim', {'category': 'Meals', 'amount': '20', 'expense_date': '2024-01-05'}),
+])
+def test_nobody_approves_their_own_request(db, login, staff, url, data):
+    requester = staff['hr']
+    assert login(requester).post(url, data=data).status_code == 302
+    workflow = latest_workflow(db)
+    assert workflow.requester_id == requester.id
+    assert workflow.assignee_id is not None
+    assert workflow.assignee_id != requester.id
+
+@pytest.mark.parametrize('data, message', [
+    ({'destination': 'Berlin', 'end_date': '2024-03-02'}, b'Travel dates must be formatted as YYYY-MM-DD'),
+    ({'destination': 'Berlin', 'start_date': 'soon', 'end_date': '2024-03-02'}, b'Travel dates must be formatted'),
+    ({'destination': 'Berlin', 'start_date': '2024-03-03', 'end_date': '2024-03-02'}, b'must not end before'),
+    ({'destination': 'Berlin', 'start_date': '2024-03-01', 'end_date': '2024-03-02', 'estimated_cost': 'lots'},
+     b'Estimated cost must be a non-negative number'),
+    ({'start_date': '2024-03-01', 'end_date': '2024-03-02'}, b'Destination is required'),
+])
+def test_travel_request_form_is_validated(db, login, staff, data, message):
+    response = login(staff['employee']).post('/workflow/travel-request', data=data, follow_redirects=True)
+    assert response.status_code == 200
+    assert message in response.data
+    assert latest_workflow(db) is None